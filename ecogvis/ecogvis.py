@@ -8,7 +8,6 @@ import sys
 import os
 import numpy as np
 import datetime
-import glob
 import yaml
 from pathlib import Path
 
@@ -21,6 +20,9 @@ from PyQt5.QtWidgets import (QWidget, QLabel, QLineEdit, QMessageBox, QHBoxLayou
 import pyqtgraph as pg
 
 from ecogvis.functions.subFunctions import TimeSeriesPlotter
+from ecogvis.functions.frame_profiler import profiling_enabled
+from ecogvis.functions.session_catalog import SessionCatalog, BlockPreopener
+from ecogvis.functions.nwb_io import open_nwb
 from ecogvis.functions.misc_dialogs import (CustomIntervalDialog, SelectChannelsDialog,
                                             SpectralChoiceDialog, NoHighGammaDialog,
                                             NoPreprocessedDialog, NoTrialsDialog,
@@ -29,7 +31,9 @@ from ecogvis.functions.misc_dialogs import (CustomIntervalDialog, SelectChannels
                                             PreprocessingDialog, NoRawDialog,
                                             NoAudioDialog, ExistIntervalsDialog,
                                             ShowSurveyDialog,
-                                            ShowElectrodesDialog, ShowTranscriptionDialog)
+                                            ShowElectrodesDialog, ShowTranscriptionDialog,
+                                            PreviewPreprocessingDialog, NoDecompositionDialog,
+                                            BlocksCatalogDialog)
 from ecogvis.functions.audio_event_detection import AudioEventDetection
 from ecogvis.functions.event_related_potential import ERPDialog
 from ecogvis.functions.save_to_nwb import SaveToNWBDialog
@@ -37,6 +41,7 @@ from ecogvis.functions.nwb_copy_file import nwb_copy_file
 from ecogvis.functions.survey_data import add_survey_data
 from ecogvis.functions.transcription_data import add_transcription_data
 from ecogvis.functions.htk_to_nwb.chang2nwb import chang2nwb
+from ecogvis.signal_processing.preview import PreprocessedPreview, HighGammaPreview
 
 
 annotationAdd_ = False
@@ -59,10 +64,12 @@ class Application(QMainWindow):
     ----------
     source_path : str or path
         Path to the source of data, nwb file or htk directory.
+    follow : bool
+        Follows a NWB file while it is being written, see TimeSeriesPlotter.
     """
     keyPressed = QtCore.pyqtSignal(QtCore.QEvent)
 
-    def __init__(self, source_path=None, metafile=None, session=None):
+    def __init__(self, source_path=None, metafile=None, session=None, follow=False):
         super().__init__()
         # Enable anti-aliasing for prettier plots
         pg.setConfigOptions(antialias=True)
@@ -86,6 +93,11 @@ class Application(QMainWindow):
         self.error = None
         self.keyPressed.connect(self.on_key)
         self.active_mode = 'default'
+        self.decomposition_choice = 0   # last decomposition band chosen, 0 for the heatmap
+        self.follow = follow            # file followed while it is being written
+        self.catalog = None             # blocks of the current subject
+        self.block_preopener = BlockPreopener(open_file=self.open_block_ahead,
+                                              close_file=lambda opened: opened[0].close())
 
         self.init_gui()
         self.show()
@@ -104,18 +116,22 @@ class Application(QMainWindow):
 
         # Run the main plotting function
         if self.source_path.is_file():
-            self.model = TimeSeriesPlotter(self)
+            self.model = TimeSeriesPlotter(self, follow=self.follow)
+            self.update_blocks()
+            self.update_follow_tools()
 
     def closeEvent(self, event):
         """Before exiting, checks if there are any unsaved changes and inform the user."""
         w = ExitDialog(self)
         if w.value == -1:  # just exit
             self.model.close_nwbfile()
+            self.block_preopener.close()
             event.accept()
         elif w.value == 1:  # save and exit
             self.AnnotationSave()
             self.IntervalSave()
             self.model.close_nwbfile()
+            self.block_preopener.close()
             event.accept()
         elif w.value == 0:  # ignore
             event.ignore()
@@ -167,6 +183,15 @@ class Application(QMainWindow):
         open_tools_menu.addAction(action_open_htk)
         action_open_htk.triggered.connect(self.open_htk_dir)
 
+        action_blocks_catalog = QAction('Blocks Catalog', self)
+        fileMenu.addAction(action_blocks_catalog)
+        action_blocks_catalog.triggered.connect(self.blocks_catalog)
+
+        self.action_follow = QAction('Follow Live File', self, checkable=True)
+        self.action_follow.setChecked(self.follow)
+        fileMenu.addAction(self.action_follow)
+        self.action_follow.triggered.connect(self.follow_live_file)
+
         action_save_new_file = QAction('Save to NWB', self)
         fileMenu.addAction(action_save_new_file)
         action_save_new_file.triggered.connect(self.save_file)
@@ -194,6 +219,9 @@ class Application(QMainWindow):
         action_event_detection = QAction('CV Event Detection', self)
         toolsMenu.addAction(action_event_detection)
         action_event_detection.triggered.connect(self.audio_event_detection)
+        # Tools that write to the current file, disabled while following it
+        self.writing_tools = [action_save_new_file, channels_tools_menu,
+                              action_spectral_decomposition, action_event_detection]
 
         survey_tools_menu = toolsMenu.addMenu('Survey')
         self.action_add_survey = QAction('Add Survey', self)
@@ -223,6 +251,18 @@ class Application(QMainWindow):
         toolsMenu.addAction(self.action_vis_electrodes)
         self.action_vis_electrodes.triggered.connect(self.visualize_electrodes)
 
+        viewMenu = mainMenu.addMenu('View')
+        self.action_single_path = QAction('Single-path Traces', self, checkable=True)
+        viewMenu.addAction(self.action_single_path)
+        self.action_single_path.triggered.connect(self.single_path_traces)
+        self.action_window_scale = QAction('Per-window Scaling', self, checkable=True)
+        viewMenu.addAction(self.action_window_scale)
+        self.action_window_scale.triggered.connect(self.window_scaling)
+        self.action_profiler = QAction('Frame Profiler', self, checkable=True)
+        self.action_profiler.setChecked(profiling_enabled())
+        viewMenu.addAction(self.action_profiler)
+        self.action_profiler.triggered.connect(self.frame_profiler)
+
         helpMenu = mainMenu.addMenu('Help')
         action_about = QAction('About', self)
         helpMenu.addAction(action_about)
@@ -327,7 +367,10 @@ class Application(QMainWindow):
         self.combo3 = QComboBox()
         self.combo3.addItem('raw')
         self.combo3.addItem('preprocessed')
+        self.combo3.addItem('preprocessed (preview)')
         self.combo3.addItem('high gamma')
+        self.combo3.addItem('high gamma (preview)')
+        self.combo3.addItem('decomposition')
         self.combo3.activated.connect(self.voltage_time_series)
         qlabelStimuli = QLabel('Stimuli:')
         self.combo4 = QComboBox()
@@ -463,16 +506,50 @@ class Application(QMainWindow):
 
     def change_block(self, move):
         """Move between Block files for the same subject."""
-        fpath = os.path.split(os.path.abspath(self.source_path))[0]  # current directory
-        fname = os.path.split(os.path.abspath(self.source_path))[1]  # current file
-        pre, _ = fname.split('_B')
-        flist = glob.glob(fpath + '/' + pre + '_B*.nwb')
-        curr_ind = flist.index(self.source_path)
-        if curr_ind + move == len(flist):
-            new_file = flist[0]
+        if self.catalog is None:
+            return
+        new_file = self.catalog.neighbour(self.source_path, move)
+        if new_file is not None:
+            self.open_another_file(filename=str(new_file))
+
+    def update_blocks(self):
+        """
+        Indexes the blocks of the subject of the current file, see
+        SessionCatalog, and opens the previous and next blocks ahead, so that
+        moving to them is instant.
+        """
+        if '_B' not in self.source_path.name:
+            self.catalog = None
+        elif self.catalog is None or not self.catalog.covers(self.source_path):
+            self.catalog = SessionCatalog(self.source_path)
         else:
-            new_file = flist[curr_ind + move]
-        self.open_another_file(filename=new_file)
+            self.catalog.refresh()
+        neighbours = []
+        if self.catalog is not None:
+            neighbours = [self.catalog.neighbour(self.source_path, move) for move in [1, -1]]
+            neighbours = [p for p in neighbours if p is not None and p.name != self.source_path.name]
+        self.block_preopener.prepare(neighbours)
+        self.pushBlock_0.setEnabled(len(neighbours) > 0)
+        self.pushBlock_1.setEnabled(len(neighbours) > 0)
+
+    def open_block_ahead(self, path):
+        """
+        Opens a NWB file read-only, called by the BlockPreopener thread, so
+        that other programs can still open the blocks kept open ahead. The
+        file is re-opened for writing only if a tool writes to it, see
+        TimeSeriesPlotter.ensure_writable().
+        """
+        io = open_nwb(path, 'r')
+        return io, io.read()
+
+    def blocks_catalog(self):
+        """Opens the searchable catalog of the blocks of the current subject."""
+        if self.catalog is None:
+            return
+        self.catalog.refresh()
+        w = BlocksCatalogDialog(self.catalog)
+        if w.chosen is not None and w.chosen.name != self.source_path.name:
+            self.open_another_file(filename=str(w.chosen))
 
     def open_file(self):
         """Opens initial file."""
@@ -485,8 +562,12 @@ class Application(QMainWindow):
             filename, _ = QFileDialog.getOpenFileName(None, 'Open file', '', "(*.nwb)")
         if os.path.isfile(filename):
             if hasattr(self, 'model'):
-                self.model.io.close()
-            self.source_path = Path(filename)
+                self.model.close_nwbfile()
+            self.source_path = Path(filename).absolute()
+            preopened = self.block_preopener.take(self.source_path)
+            if preopened is not None and self.follow:
+                preopened[0].close()    # not opened in SWMR mode
+                preopened = None
             # Reset file specific variables on GUI
             self.combo3.setCurrentIndex(self.combo3.findText('raw'))
             self.combo4.clear()
@@ -502,7 +583,27 @@ class Application(QMainWindow):
             self.win2.clear()
             self.win3.clear()
             # Rebuild the model
-            self.model = TimeSeriesPlotter(self)
+            self.model = TimeSeriesPlotter(self, preopened=preopened, follow=self.follow)
+            self.update_blocks()
+            self.update_follow_tools()
+
+    def follow_live_file(self):
+        """
+        Re-opens the current file read-only in HDF5 SWMR mode, following the
+        samples appended to it while it is being written, or back to normal.
+        """
+        self.follow = self.action_follow.isChecked()
+        if hasattr(self, 'model'):
+            self.open_another_file(filename=str(self.source_path))
+
+    def update_follow_tools(self):
+        """Disables the tools that write to the file while following it, as it is opened read-only."""
+        for tool in self.writing_tools:
+            tool.setEnabled(not self.follow)
+        if self.follow:
+            for tool in [self.action_add_survey, self.transcriptionadd_tools_menu,
+                         self.push5_0, self.push6_0, self.push7_0]:
+                tool.setEnabled(False)
 
     def open_htk_dir(self):
         """
@@ -512,7 +613,7 @@ class Application(QMainWindow):
         w = LoadHTKDialog(parent=self)
         if w.value == 1 and w.htk_config:
             if hasattr(self, 'model'):
-                self.model.io.close()
+                self.model.close_nwbfile()
             htk_source_path = Path(w.htk_config['ecephys_path'])
             self.metadata = w.htk_config['metadata']
             # Run conversion
@@ -538,6 +639,7 @@ class Application(QMainWindow):
             self.win3.clear()
             # Rebuild the model
             self.model = TimeSeriesPlotter(par=self)
+            self.update_blocks()
 
     def save_file(self):
         """
@@ -574,9 +676,20 @@ class Application(QMainWindow):
 
     def load_intervals(self):
         """Loads intervals from file, calls function to paint them."""
+        global intervalsDict_
         fname, aux = QFileDialog.getOpenFileName(self, 'Open file', '', "(*.csv)")
         if fname != '':
-            self.model.IntervalLoad(fname=fname)
+            types = self.model.IntervalLoad(fname=fname)
+            # Update dictionary of interval types, new types can be chosen for new intervals
+            for int_type, (color, count) in types.items():
+                if int_type in intervalsDict_:
+                    intervalsDict_[int_type]['counts'] += count
+                else:
+                    intervalsDict_[int_type] = {'type': int_type,
+                                                'session': self.current_session,
+                                                'color': color,
+                                                'counts': count}
+                    self.combo2.insertItem(self.combo2.count() - 1, int_type)   # before 'add custom'
 
     def add_badchannel(self):
         """Opens dialog for user input of channels to mark as bad."""
@@ -620,6 +733,7 @@ class Application(QMainWindow):
 
     def spectral_decomposition(self):
         """Opens Spectral decomposition dialog."""
+        self.model.ensure_writable()
         w = SpectralChoiceDialog(self)
         if w.value == 1:       # If new data was created
             self.model.refresh_file()
@@ -646,6 +760,7 @@ class Application(QMainWindow):
         if 'TimeIntervals_speaker' not in self.model.nwb.intervals:
             # Test if file contains audio signals
             if any(name in self.model.nwb.stimulus for name in ['speaker1', 'speaker2']):
+                self.model.ensure_writable()
                 AudioEventDetection(parent=self)
             else:
                 NoAudioDialog()
@@ -657,6 +772,7 @@ class Application(QMainWindow):
         # Open file dialog
         path_file, _ = QFileDialog.getOpenFileName(None, 'Open file', '', "(*.mat)")
         if os.path.isfile(path_file):
+            self.model.ensure_writable()
             add_survey_data(nwbfile=self.model.nwb, path_survey_file=path_file)
             self.action_vis_survey.setEnabled(True)
             self.action_add_survey.setEnabled(False)
@@ -676,6 +792,7 @@ class Application(QMainWindow):
         """Add TimitSounds transcription data to current nwb file."""
         dir_path = QFileDialog.getExistingDirectory(self, 'Open TimitSounds dir', '', QtGui.QFileDialog.ShowDirsOnly)
         if os.path.isdir(dir_path):
+            self.model.ensure_writable()
             _ = add_transcription_data(
                 nwbfile=self.model.nwb,
                 path_transcription=dir_path,
@@ -691,6 +808,7 @@ class Application(QMainWindow):
         """Add Mocha transcription data to current nwb file."""
         dir_path = QFileDialog.getExistingDirectory(self, 'Open Mocha dir', '', QtGui.QFileDialog.ShowDirsOnly)
         if os.path.isdir(dir_path):
+            self.model.ensure_writable()
             nwbfile = add_transcription_data(
                 nwbfile=self.model.nwb,
                 path_transcription=dir_path,
@@ -712,6 +830,7 @@ class Application(QMainWindow):
         """Add TextGrid transcription data to current nwb file."""
         filename, _ = QFileDialog.getOpenFileName(None, 'Open file', '', "(*.TextGrid)")
         if os.path.isfile(filename):
+            self.model.ensure_writable()
             add_transcription_data(
                 nwbfile=self.model.nwb,
                 path_transcription=filename,
@@ -901,6 +1020,7 @@ class Application(QMainWindow):
                 psd_welch = self.model.nwb.modules['ecephys'].data_interfaces['Spectrum_welch_raw']
                 PeriodogramGridDialog(self)
             except:
+                self.model.ensure_writable()
                 w = NoSpectrumDialog(self, 'raw')
                 if w.val == 1:  # PSD was calculated
                     self.model.refresh_file()  # re-opens the file, now with new data
@@ -914,6 +1034,7 @@ class Application(QMainWindow):
                 psd_welch = self.model.nwb.modules['ecephys'].data_interfaces['Spectrum_welch_preprocessed']
                 PeriodogramGridDialog(self)
             except:
+                self.model.ensure_writable()
                 w = NoSpectrumDialog(self, 'preprocessed')
                 if w.val == 1:  # PSD was calculated
                     self.model.refresh_file()  # re-opens the file, now with new data
@@ -924,6 +1045,7 @@ class Application(QMainWindow):
 
     def Preprocess(self):
         """Opens Preprocessing dialog."""
+        self.model.ensure_writable()
         w = PreprocessingDialog(self)
         if w.value == 1:       # If new data was created
             self.model.refresh_file()        # re-opens the file, now with new data
@@ -932,6 +1054,7 @@ class Application(QMainWindow):
 
     def CalcHighGamma(self):
         """Opens calculate High Gamma dialog."""
+        self.model.ensure_writable()
         w = HighGammaDialog(self)
         if w.value == 1:       # If new data was created
             self.open_another_file(filename=w.new_fname)
@@ -942,6 +1065,11 @@ class Application(QMainWindow):
         - 'voltage_raw': Raw voltage traces, stored in nwb.acquisition['ElectricalSeries']
         - 'preprocessed': Preprocessed voltage traces, stored in nwb.processing['ecephys'].data_interfaces['LFP'].electrical_series['preprocessed']
         - 'high gamma': High Gamma estimation traces, stored in nwb.processing['ecephys'].data_interfaces['high_gamma']
+        - 'preprocessed (preview)': Raw voltage traces preprocessed on the fly, for the visible window only
+        - 'high gamma (preview)': High Gamma estimated on the fly from the preprocessed traces, or from
+          raw traces preprocessed on the fly, for the visible window only
+        - 'decomposition': One band of the spectral decomposition, or all bands as a heatmap, stored in
+          nwb.processing['ecephys'].data_interfaces['DecompositionSeries']
         """
         if self.combo3.currentText() == 'raw':
             lis = list(self.model.nwb.acquisition.keys())
@@ -952,10 +1080,7 @@ class Application(QMainWindow):
                     there_is_raw = True
             if there_is_raw:
                 self.model.plot_panel = 'voltage_raw'
-                self.model.plotData = self.model.source.data
-                self.model.nBins = self.model.plotData.shape[0]     # total number of bins
-                self.model.fs_signal = self.model.source.rate     # sampling frequency [Hz]
-                self.model.tbin_signal = 1 / self.model.fs_signal  # time bin duration [seconds]
+                self.model.set_source(self.model.source)
                 self.push5_0.setEnabled(True)
                 self.push6_0.setEnabled(True)
                 self.push7_0.setEnabled(False)
@@ -965,12 +1090,8 @@ class Application(QMainWindow):
                 NoRawDialog()
         elif self.combo3.currentText() == 'preprocessed':
             try:   # if preprocessed signals already exist on NWB file
-                self.model.source = self.model.nwb.processing['ecephys'].data_interfaces['LFP'].electrical_series['preprocessed']
-                self.model.plotData = self.model.source.data
+                self.model.set_source(self.model.nwb.processing['ecephys'].data_interfaces['LFP'].electrical_series['preprocessed'])
                 self.model.plot_panel = 'voltage_preprocessed'
-                self.model.nBins = self.model.source.data.shape[0]
-                self.model.fs_signal = self.model.source.rate
-                self.model.tbin_signal = 1 / self.model.fs_signal
                 self.push5_0.setEnabled(True)
                 self.push6_0.setEnabled(False)
                 self.push7_0.setEnabled(True)
@@ -978,14 +1099,27 @@ class Application(QMainWindow):
                 self.combo3.setCurrentIndex(self.combo3.findText('raw'))
                 self.voltage_time_series()
                 NoPreprocessedDialog()
+        elif self.combo3.currentText() == 'preprocessed (preview)':
+            raw = [acq for acq in self.model.nwb.acquisition.values()
+                   if type(acq).__name__ == 'ElectricalSeries']
+            if len(raw) > 0:
+                w = PreviewPreprocessingDialog(self.model.preview_config)
+                if w.config is not None:
+                    self.model.preview_config = w.config
+                preview = PreprocessedPreview(raw[-1].data, raw[-1].rate, **self.model.preview_config)
+                self.model.set_source(raw[-1], data=preview)
+                self.model.plot_panel = 'voltage_preview'
+                self.push5_0.setEnabled(True)
+                self.push6_0.setEnabled(True)
+                self.push7_0.setEnabled(False)
+            else:
+                self.combo3.setCurrentIndex(self.combo3.findText('preprocessed'))
+                self.voltage_time_series()
+                NoRawDialog()
         elif self.combo3.currentText() == 'high gamma':
             try:     # if high gamma already exists on NWB file
-                self.model.source = self.model.nwb.processing['ecephys'].data_interfaces['high_gamma']
-                self.model.plotData = self.model.source.data
+                self.model.set_source(self.model.nwb.processing['ecephys'].data_interfaces['high_gamma'])
                 self.model.plot_panel = 'spectral_power'
-                self.model.nBins = self.model.source.data.shape[0]
-                self.model.fs_signal = self.model.source.rate
-                self.model.tbin_signal = 1 / self.model.fs_signal
                 self.push5_0.setEnabled(False)
                 self.push6_0.setEnabled(False)
                 self.push7_0.setEnabled(False)
@@ -993,9 +1127,73 @@ class Application(QMainWindow):
                 self.combo3.setCurrentIndex(self.combo3.findText('preprocessed'))
                 self.voltage_time_series()
                 NoHighGammaDialog()
+        elif self.combo3.currentText() == 'high gamma (preview)':
+            raw = [acq for acq in self.model.nwb.acquisition.values()
+                   if type(acq).__name__ == 'ElectricalSeries']
+            try:   # from preprocessed signals, if they already exist on NWB file
+                source = self.model.nwb.processing['ecephys'].data_interfaces['LFP'].electrical_series['preprocessed']
+                preview = HighGammaPreview(source.data, source.rate)
+            except:
+                source = raw[-1] if len(raw) > 0 else None
+                if source is not None:
+                    preprocessed = PreprocessedPreview(source.data, source.rate, **self.model.preview_config)
+                    preview = HighGammaPreview(preprocessed, source.rate)
+            if source is not None:
+                self.model.set_source(source, data=preview)
+                self.model.plot_panel = 'spectral_power_preview'
+                self.push5_0.setEnabled(False)
+                self.push6_0.setEnabled(False)
+                self.push7_0.setEnabled(False)
+            else:
+                self.combo3.setCurrentIndex(self.combo3.findText('high gamma'))
+                self.voltage_time_series()
+                NoRawDialog()
+        elif self.combo3.currentText() == 'decomposition':
+            try:     # if spectral decomposition already exists on NWB file
+                decomposition = self.model.nwb.processing['ecephys'].data_interfaces['DecompositionSeries']
+            except:
+                decomposition = None
+            if decomposition is not None and decomposition.source_timeseries is not None:
+                bands = decomposition.bands
+                items = ['All bands (heatmap)']
+                for i in range(decomposition.data.shape[2]):
+                    if 'filter_param_0' in bands.colnames:
+                        items.append('{:.1f} Hz (sigma {:.1f} Hz)'.format(bands['filter_param_0'][i],
+                                                                         bands['filter_param_1'][i]))
+                    else:
+                        items.append('Band ' + str(i))
+                current = min(self.decomposition_choice, len(items) - 1)
+                item, ok = QInputDialog.getItem(self, 'Spectral decomposition', 'Band to show:',
+                                                items, current, False)
+                if ok:
+                    current = items.index(item)
+                self.decomposition_choice = current
+                self.model.set_decomposition(decomposition, band=None if current == 0 else current - 1)
+                self.model.plot_panel = 'spectral_decomposition'
+                self.push5_0.setEnabled(False)
+                self.push6_0.setEnabled(False)
+                self.push7_0.setEnabled(False)
+            else:  # if not, opens warning dialog
+                self.combo3.setCurrentIndex(self.combo3.findText('preprocessed'))
+                self.voltage_time_series()
+                NoDecompositionDialog()
         self.model.updateCurXAxisPosition()    # updates time points
         self.model.refreshScreen()
 
+    def single_path_traces(self):
+        """Draws all channels as a single item, faster for many channels."""
+        self.model.single_path = self.action_single_path.isChecked()
+        self.model.refreshScreen()
+
+    def window_scaling(self):
+        """Scales traces by the std of the visible window, instead of the whole recording."""
+        self.model.per_window_scale = self.action_window_scale.isChecked()
+        self.model.refreshScreen()
+
+    def frame_profiler(self):
+        """Shows frame timings on the signals plot and logs them to a file."""
+        self.model.set_profiling(self.action_profiler.isChecked())
+
     def choose_stim(self):
         """Choose stimulus."""
         stimName = self.combo4.currentText()
@@ -1135,14 +1333,14 @@ class CustomViewBox(pg.ViewBox):
 
 
 # If it is imported as a module
-def main(source_path='', metafile=None):
+def main(source_path='', metafile=None, follow=False):
     import sys
 
     # Sets up QT application
     app = QCoreApplication.instance()
     if app is None:
         app = QApplication(sys.argv)  # instantiate a QtGui (holder for the app)
-    ex = Application(source_path=source_path, metafile=metafile)
+    ex = Application(source_path=source_path, metafile=metafile, follow=follow)
     sys.exit(app.exec_())
 
 
@@ -1164,6 +1362,11 @@ def parse_arguments():
         default=None,
         help="The path to the metadata YAML file."
     )
+    parser.add_argument(
+        "--follow",
+        action='store_true',
+        help="Follow the NWB file while it is being written (HDF5 SWMR mode)."
+    )
 
     # Parse arguments
     args = parser.parse_args()
@@ -1174,14 +1377,14 @@ def parse_arguments():
     # Metadata file (.yml)
     metafile = args.metafile
 
-    return source_path, metafile
+    return source_path, metafile, args.follow
 
 
 def cmd_line_shortcut():
-    source_path, metafile = parse_arguments()
-    main(source_path=source_path, metafile=metafile)
+    source_path, metafile, follow = parse_arguments()
+    main(source_path=source_path, metafile=metafile, follow=follow)
 
 
 if __name__ == '__main__':
-    source_path, metafile = parse_arguments()
-    main(source_path=source_path, metafile=metafile)
+    source_path, metafile, follow = parse_arguments()
+    main(source_path=source_path, metafile=metafile, follow=follow)
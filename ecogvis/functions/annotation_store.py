@@ -0,0 +1,82 @@
+import numpy as np
+
+from ecogvis.functions.columnar_store import ColumnarStore
+
+
+class AnnotationStore(ColumnarStore):
+    """
+    Columnar store of user annotations, with a time-sorted index for visible
+    window queries and nearest-hit lookup.
+
+    Each annotation has a stable id, a time position x, a vertical position
+    y_va in variance units, a y_off channel offset (usually the bottom
+    channel on plot when the annotation was made), a color, a text and a
+    session name. Its vertical position on the plot is
+    (y_va + y_off - first channel on plot) * scale. Columns are kept as in
+    ColumnarStore.
+    """
+    columns = {'ids': 'int', 'x': 'float', 'y_va': 'float', 'y_off': 'float',
+               'colors': 'object', 'texts': 'object', 'sessions': 'object'}
+
+    def __init__(self):
+        super().__init__()
+        self.next_id = 0
+
+    def extend(self, x, y_va, y_off, colors, texts, sessions=''):
+        """
+        Adds annotations from whole columns at once.
+
+        Returns
+        -------
+        ids : array of int
+            Ids of the new annotations.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype='float'))
+        n_new = len(x)
+        self._reserve(n_new)
+        new = slice(self.n, self.n + n_new)
+        ids = np.arange(self.next_id, self.next_id + n_new)
+        self.ids[new] = ids
+        self.x[new] = x
+        self.y_va[new] = y_va
+        self.y_off[new] = y_off
+        self.colors[new] = colors
+        self.texts[new] = texts
+        self.sessions[new] = sessions
+        self.n += n_new
+        self.next_id += n_new
+        self.version += 1
+        return ids
+
+    def add(self, x, y_va, y_off, color, text, session=''):
+        """Adds one annotation, returns its id."""
+        return self.extend([x], y_va, y_off, color, text, session)[0]
+
+    def _build_index(self):
+        self.order = np.argsort(self.x[:self.n], kind='mergesort')
+        self.sorted_x = self.x[:self.n][self.order]
+        self._index_version = self.version
+
+    def visible(self, t0, t1):
+        """Indices of the annotations with t0 <= x <= t1, in increasing x."""
+        if self._index_version != self.version:
+            self._build_index()
+        i0 = np.searchsorted(self.sorted_x, t0, side='left')
+        i1 = np.searchsorted(self.sorted_x, t1, side='right')
+        return self.order[i0:i1]
+
+    def plot_y(self, indices, first_ch, scale):
+        """Vertical plot positions of annotations."""
+        return (self.y_va[indices] + self.y_off[indices] - first_ch) * scale
+
+    def nearest(self, x, y, t0, t1, first_ch, scale):
+        """
+        Index of the annotation in the window [t0, t1] closest to the plot
+        position (x, y), or 'None' if there are no annotations in it.
+        """
+        candidates = self.visible(t0, t1)
+        if len(candidates) == 0:
+            return None
+        y_ann = np.round(self.plot_y(candidates, first_ch, scale))
+        euclid_dist = np.sqrt((self.x[candidates] - x)**2 + (y_ann - y)**2)
+        return candidates[np.argmin(euclid_dist)]
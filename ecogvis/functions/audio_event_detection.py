@@ -1,12 +1,14 @@
 from PyQt5 import QtGui, QtCore
 from PyQt5.QtWidgets import (QGridLayout, QGroupBox, QLineEdit, QLabel, QComboBox,
-                             QPushButton, QVBoxLayout, QHBoxLayout)
+                             QPushButton, QVBoxLayout, QHBoxLayout, QCheckBox)
 import pyqtgraph as pg
-from ecogvis.signal_processing.detect_events import detect_events
+from ecogvis.signal_processing.detect_events import (detect_events, smoothing_kernel_size,
+                                                     SMOOTHING_METHODS, EnvelopeCache)
+from ecogvis.signal_processing.batch_detect_events import write_event_intervals
 
 from pynwb import NWBHDF5IO
-from pynwb.epoch import TimeIntervals
 import numpy as np
+import time
 
 
 # Creates Audio Event Detection window -----------------------------------------
@@ -26,6 +28,9 @@ class AudioEventDetection(QtGui.QDialog):
         self.red_light = (176, 58, 46, 80)
         self.gray = (33, 47, 61)
 
+        # Downsampled signals and envelopes, re-used while tuning thresholds
+        self.envelope_cache = EnvelopeCache()
+
         # Left panel - Plot Preview ------------------------------------------
         labelSpeaker = QLabel('Speaker:')
         self.combo0 = QComboBox()
@@ -79,6 +84,16 @@ class AudioEventDetection(QtGui.QDialog):
         labelWidth.setToolTip('This will affect the width of \n'
                               'the smoothing filter (seconds).\n'
                               'Typical values: .1 ~ 1')
+        labelMethod = QLabel('Smoothing\nMethod:')
+        self.combo2 = QComboBox()
+        for method in SMOOTHING_METHODS:
+            self.combo2.addItem(method)
+        self.combo2.setCurrentIndex(0)
+        labelMethod.setToolTip('Smoothing filter applied to the signal energy.\n'
+                               'median: running median (default)\n'
+                               'rms: moving RMS (faster)\n'
+                               'boxcar: moving average (fastest)\n'
+                               'medfilt: legacy running median (slow)')
         labelSpeakerThresh = QLabel('Speaker Threshold:')
         self.qline5 = QLineEdit('0.05')
         labelSpeakerThresh.setToolTip(
@@ -92,6 +107,11 @@ class AudioEventDetection(QtGui.QDialog):
             'mean).\n'
             'Typical values: .05 ~ .5')
 
+        self.check0 = QCheckBox('Refine at full rate')
+        self.check0.setToolTip('Refine start and stop times on short windows of\n'
+                               'the original signal. Allows for large\n'
+                               'downsample factors with precise boundaries.')
+
         labelRunTest = QLabel('Preview detection with\nthese settings.')
         self.push1_0 = QPushButton('Run Test')
         self.push1_0.clicked.connect(self.run_test)
@@ -105,12 +125,15 @@ class AudioEventDetection(QtGui.QDialog):
         grid1.addWidget(self.qline3, 2, 4, 1, 2)
         grid1.addWidget(labelWidth, 3, 0, 1, 4)
         grid1.addWidget(self.qline4, 3, 4, 1, 2)
-        grid1.addWidget(labelSpeakerThresh, 4, 0, 1, 4)
-        grid1.addWidget(self.qline5, 4, 4, 1, 2)
-        grid1.addWidget(labelMicThresh, 5, 0, 1, 4)
-        grid1.addWidget(self.qline6, 5, 4, 1, 2)
-        grid1.addWidget(labelRunTest, 6, 0, 1, 6)
-        grid1.addWidget(self.push1_0, 7, 0, 1, 6)
+        grid1.addWidget(labelMethod, 4, 0, 1, 3)
+        grid1.addWidget(self.combo2, 4, 3, 1, 3)
+        grid1.addWidget(labelSpeakerThresh, 5, 0, 1, 4)
+        grid1.addWidget(self.qline5, 5, 4, 1, 2)
+        grid1.addWidget(labelMicThresh, 6, 0, 1, 4)
+        grid1.addWidget(self.qline6, 6, 4, 1, 2)
+        grid1.addWidget(self.check0, 7, 0, 1, 6)
+        grid1.addWidget(labelRunTest, 8, 0, 1, 6)
+        grid1.addWidget(self.push1_0, 9, 0, 1, 6)
 
         grid1.setAlignment(QtCore.Qt.AlignTop)
         panel1 = QGroupBox('Detection - Settings')
@@ -169,14 +192,17 @@ class AudioEventDetection(QtGui.QDialog):
             self.combo0.addItem(stim)
             self.stimuli[stim] = self.parent.model.nwb.stimulus[stim]
         self.combo0.setCurrentIndex(0)
-        # Find microphone signals
+        # Find microphone signals - any analog TimeSeries (e.g. ANIN1-4)
         self.responses = {}  # Dictionary {'respName':resp.source}
         for resp in list(self.parent.model.nwb.acquisition.keys()):
-            # if type(self.parent.model.nwb.acquisition[resp]).__name__ == 'TimeSeries':
-            if resp in ['microphone', 'anin4']:
+            if type(self.parent.model.nwb.acquisition[resp]).__name__ == 'TimeSeries':
                 self.combo1.addItem(resp)
                 self.responses[resp] = self.parent.model.nwb.acquisition[resp]
         self.combo1.setCurrentIndex(0)
+        for resp in ['microphone', 'anin4']:   # preferred defaults
+            if resp in self.responses:
+                self.combo1.setCurrentIndex(self.combo1.findText(resp))
+                break
 
     def reset_draw(self):
         """Reset draw."""
@@ -328,6 +354,8 @@ class AudioEventDetection(QtGui.QDialog):
         # from the interval plotted.
         self.set_detect_interval()
 
+        smooth_method = self.combo2.currentText()
+        start = time.time()
         speakerDS, speakerEventDS, speakerFilt, micDS, micEventDS, micFilt = detect_events(
             speaker_data=self.source_stim,
             mic_data=self.source_resp,
@@ -335,8 +363,16 @@ class AudioEventDetection(QtGui.QDialog):
             dfact=self.fs / float(self.qline3.text()),
             smooth_width=float(self.qline4.text()),
             speaker_threshold=self.speakerThresh,
-            mic_threshold=self.micThresh
+            mic_threshold=self.micThresh,
+            smooth_method=smooth_method,
+            cache=self.envelope_cache,
+            refine=self.check0.isChecked()
         )
+        kernel_size = smoothing_kernel_size(float(self.qline4.text()),
+                                            float(self.qline3.text()))
+        self.plotTitle.setText(
+            f'Preview detection results ({smooth_method} smoothing, '
+            f'kernel {kernel_size} bins, {time.time() - start:.3f}s):')
 
         self.stimTimes = speakerEventDS
         self.respTimes = micEventDS
@@ -360,7 +396,10 @@ class AudioEventDetection(QtGui.QDialog):
             dfact=self.fs / float(self.qline3.text()),
             smooth_width=float(self.qline4.text()),
             speaker_threshold=float(self.qline5.text()),
-            mic_threshold=float(self.qline6.text())
+            mic_threshold=float(self.qline6.text()),
+            smooth_method=self.combo2.currentText(),
+            cache=self.envelope_cache,
+            refine=self.check0.isChecked()
         )
         self.thread.finished.connect(lambda: self.out_close(1))
         self.thread.start()
@@ -372,6 +411,8 @@ class AudioEventDetection(QtGui.QDialog):
         self.push0_2.setEnabled(False)
         self.combo0.setEnabled(False)
         self.combo1.setEnabled(False)
+        self.combo2.setEnabled(False)
+        self.check0.setEnabled(False)
         self.qline1.setEnabled(False)
         self.qline2.setEnabled(False)
         self.qline3.setEnabled(False)
@@ -389,20 +430,11 @@ class AudioEventDetection(QtGui.QDialog):
             self.stimTimes = self.thread.stimTimes
             self.respTimes = self.thread.respTimes
 
-            # Speaker stimuli times
-            ti_stim = TimeIntervals(name='TimeIntervals_speaker')
-            times = self.stimTimes.reshape((-1, 2)).astype('float')
-            for start, stop in times:
-                ti_stim.add_interval(start, stop)
-            self.parent.model.nwb.add_time_intervals(ti_stim)
-
-            # Microphone responses times
-            if self.respTimes is not None:
-                ti_resp = TimeIntervals(name='TimeIntervals_mic')
-                times = self.respTimes.reshape((-1, 2)).astype('float')
-                for start, stop in times:
-                    ti_resp.add_interval(start, stop)
-                self.parent.model.nwb.add_time_intervals(ti_resp)
+            # Speaker stimuli and microphone responses times
+            write_event_intervals(
+                nwbfile=self.parent.model.nwb,
+                events={'speaker': self.stimTimes, 'mic': self.respTimes}
+            )
 
             # Write file
             self.parent.model.io.write(self.parent.model.nwb)
@@ -417,7 +449,8 @@ class AudioEventDetection(QtGui.QDialog):
 class EventDetectionFunction(QtCore.QThread):
     def __init__(self, speaker_data, mic_data, interval, dfact,
                  smooth_width,
-                 speaker_threshold, mic_threshold):
+                 speaker_threshold, mic_threshold, smooth_method='median',
+                 cache=None, refine=False):
         super().__init__()
         self.source_stim = speaker_data
         self.source_resp = mic_data
@@ -426,6 +459,9 @@ class EventDetectionFunction(QtCore.QThread):
         self.smooth_width = smooth_width
         self.stim_threshold = speaker_threshold
         self.resp_threshold = mic_threshold
+        self.smooth_method = smooth_method
+        self.cache = cache
+        self.refine = refine
 
     def run(self):
         speakerDS, speakerEventDS, _, micDS, micEventDS, _ = detect_events(
@@ -436,7 +472,10 @@ class EventDetectionFunction(QtCore.QThread):
             smooth_width=self.smooth_width,
             speaker_threshold=self.stim_threshold,
             mic_threshold=self.resp_threshold,
-            direction='both'
+            direction='both',
+            smooth_method=self.smooth_method,
+            cache=self.cache,
+            refine=self.refine
         )
         self.stimTimes = speakerEventDS
         self.respTimes = micEventDS
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+class ColumnarStore:
+    """
+    Base of the columnar stores of the viewer: one array per column, of which
+    the first n rows are in use, grown by doubling their capacity.
+
+    Subclasses list their columns in 'columns', as name: dtype. Object
+    columns start as 'None'. 'version' is incremented on every change, so
+    that indexes built on the columns can be rebuilt lazily.
+    """
+    columns = {}
+
+    def __init__(self):
+        self.capacity = 16
+        self.n = 0
+        for name, dtype in self.columns.items():
+            setattr(self, name, np.empty(self.capacity, dtype=dtype) if dtype == 'object'
+                    else np.zeros(self.capacity, dtype=dtype))
+        self.version = 0        # incremented on every change
+        self._index_version = -1
+
+    def __len__(self):
+        return self.n
+
+    def _reserve(self, n_new):
+        """Grows the columns, doubling their capacity, to fit n_new more rows."""
+        if self.n + n_new <= self.capacity:
+            return
+        while self.capacity < self.n + n_new:
+            self.capacity *= 2
+        for name in self.columns:
+            old = getattr(self, name)
+            new = np.empty(self.capacity, dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def remove(self, indices):
+        """Removes the rows at indices."""
+        keep = np.ones(self.n, dtype='bool')
+        keep[np.asarray(indices, dtype='int')] = False
+        n_keep = int(np.sum(keep))
+        for name in self.columns:
+            column = getattr(self, name)
+            column[:n_keep] = column[:self.n][keep]
+            if column.dtype == 'object':
+                column[n_keep:self.n] = None
+        self.n = n_keep
+        self.version += 1
+
+    def column(self, name):
+        """View of the rows in use of a column, see columns."""
+        return getattr(self, name)[:self.n]
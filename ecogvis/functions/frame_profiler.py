@@ -0,0 +1,148 @@
+import os
+import csv
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+
+LOG_MAX_BYTES = 5 * 2**20   # size of the log before it is rotated
+LOG_BACKUPS = 3             # number of rotated logs kept
+
+# Columns of the frames log, times in milliseconds
+LOG_FIELDS = ['time', 'file', 'dataset', 'start', 'stop', 'n_channels', 'n_bins', 'lod_factor',
+              'read', 'std', 'decimate', 'stim_load', 'load_total',
+              'curves', 'intervals', 'annotations', 'stim_paint', 'paint_total', 'qt_paint',
+              'frame_total', 'latency']
+
+
+def profiling_enabled():
+    """True if profiling is enabled with the ECOGVIS_PROFILE environment variable."""
+    return os.environ.get('ECOGVIS_PROFILE', '0').lower() not in ['', '0', 'false', 'no']
+
+
+def default_log_path():
+    """
+    Path of the frames log. Defaults to '~/.ecogvis/frames.csv', it can be
+    changed with the ECOGVIS_PROFILE_LOG environment variable.
+    """
+    path = os.environ.get('ECOGVIS_PROFILE_LOG', None)
+    if path is None:
+        path = Path.home() / '.ecogvis' / 'frames.csv'
+    return Path(path)
+
+
+class FrameProfiler:
+    """
+    Times the phases of each frame drawn by the viewer and logs one record
+    per frame to a CSV file, rotated when it grows beyond max_bytes.
+
+    A frame record is a dict created by new_frame(), filled with the time
+    spent in each phase with the phase() context manager, on any thread,
+    and closed with end_frame().
+
+    Parameters
+    ----------
+    log_path : str or path
+        Path of the frames log. Defaults to default_log_path().
+    max_bytes : int
+        Size of the log before it is rotated.
+    backups : int
+        Number of rotated logs kept, as log_path.1, log_path.2, ...
+    """
+    def __init__(self, log_path=None, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        self.log_path = default_log_path() if log_path is None else Path(log_path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.recent = deque(maxlen=30)      # (end time, record) of the last frames
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def new_frame(**info):
+        """New frame record, with information such as the dataset and window."""
+        record = dict(info)
+        record['t0'] = time.perf_counter()
+        return record
+
+    @staticmethod
+    @contextmanager
+    def phase(record, name):
+        """Adds the time spent in the block, in milliseconds, to record[name]."""
+        if record is None:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            record[name] = record.get(name, 0.) + 1000 * (time.perf_counter() - t0)
+
+    def end_frame(self, record, latency=None):
+        """
+        Closes a frame record and logs it.
+
+        Parameters
+        ----------
+        record : dict
+            Frame record from new_frame().
+        latency : float
+            Time, in seconds, since the frame was requested. Defaults to the
+            frame duration.
+        """
+        now = time.perf_counter()
+        record['frame_total'] = 1000 * (now - record.pop('t0'))
+        record['latency'] = record['frame_total'] if latency is None else 1000 * latency
+        record['time'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            self.recent.append((now, record))
+            self.write(record)
+
+    def write(self, record):
+        """Appends a record to the log, rotating it if needed."""
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.log_path.is_file() and self.log_path.stat().st_size > self.max_bytes:
+            self.rotate()
+        new_file = not self.log_path.is_file()
+        row = {}
+        for field in LOG_FIELDS:
+            value = record.get(field, '')
+            row[field] = round(value, 3) if isinstance(value, float) else value
+        with open(str(self.log_path), 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=LOG_FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+    def rotate(self):
+        """Renames log_path to log_path.1, log_path.1 to log_path.2, ..."""
+        for i in range(self.backups, 0, -1):
+            src = self.log_path if i == 1 else Path(str(self.log_path) + '.{}'.format(i - 1))
+            dst = Path(str(self.log_path) + '.{}'.format(i))
+            if src.is_file():
+                if dst.is_file():
+                    dst.unlink()
+                src.rename(dst)
+
+    def summary(self, window=2.):
+        """
+        Frame rate and mean times of the frames drawn in the last window
+        seconds.
+
+        Returns
+        -------
+        summary : dict
+            'fps', and the mean 'latency', 'load_total', 'paint_total' and
+            'qt_paint' times, in milliseconds.
+        """
+        now = time.perf_counter()
+        with self.lock:
+            frames = [(t, r) for t, r in self.recent if now - t <= window]
+        out = {'fps': 0., 'latency': 0., 'load_total': 0., 'paint_total': 0., 'qt_paint': 0.}
+        if len(frames) == 0:
+            return out
+        if len(frames) > 1:
+            out['fps'] = (len(frames) - 1) / max(frames[-1][0] - frames[0][0], 1e-6)
+        for key in ['latency', 'load_total', 'paint_total', 'qt_paint']:
+            out[key] = sum(r.get(key, 0.) for _, r in frames) / len(frames)
+        return out
@@ -0,0 +1,131 @@
+import numpy as np
+
+from ecogvis.functions.columnar_store import ColumnarStore
+
+
+class IntervalStore(ColumnarStore):
+    """
+    Columnar store of time intervals (start, stop, type, color, session),
+    indexed for fast overlap queries.
+
+    The index is an interval tree made of the intervals sorted by start and
+    a segment tree with the maximum stop time of each node. It is rebuilt
+    lazily after changes, and answers "intervals overlapping [t0, t1]" by
+    descending only into the nodes that can contain overlapping intervals,
+    one level at a time. Columns are kept as in ColumnarStore.
+    """
+    columns = {'starts': 'float', 'stops': 'float', 'types': 'object',
+               'colors': 'object', 'sessions': 'object'}
+
+    def add(self, start, stop, int_type='', color='', session=''):
+        """
+        Adds one interval.
+
+        Returns
+        -------
+        index : int
+            Index of the new interval.
+        """
+        self._reserve(1)
+        i = self.n
+        self.starts[i] = start
+        self.stops[i] = stop
+        self.types[i] = int_type
+        self.colors[i] = color
+        self.sessions[i] = session
+        self.n += 1
+        self.version += 1
+        return i
+
+    def extend(self, starts, stops, int_types='', colors='', sessions=''):
+        """
+        Adds many intervals from whole columns at once.
+
+        Parameters
+        ----------
+        starts, stops : array of floats
+            Start and stop times.
+        int_types, colors, sessions : str or array of str
+            Type, color and session of each interval, or a single value for
+            all of them.
+        """
+        starts = np.asarray(starts, dtype='float')
+        n_new = len(starts)
+        self._reserve(n_new)
+        new = slice(self.n, self.n + n_new)
+        self.starts[new] = starts
+        self.stops[new] = np.asarray(stops, dtype='float')
+        self.types[new] = int_types
+        self.colors[new] = colors
+        self.sessions[new] = sessions
+        self.n += n_new
+        self.version += 1
+
+    def _build_index(self):
+        """Sorts intervals by start and builds the max-stop segment tree."""
+        self.order = np.argsort(self.starts[:self.n], kind='mergesort')
+        self.sorted_starts = self.starts[:self.n][self.order]
+        self.depth = max(int(np.ceil(np.log2(max(self.n, 1)))), 0)
+        self.size = 2 ** self.depth
+        self.tree = np.full(2 * self.size, -np.inf)
+        self.tree[self.size:self.size + self.n] = self.stops[:self.n][self.order]
+        lo = self.size
+        while lo > 1:
+            parents = np.arange(lo // 2, lo)
+            self.tree[parents] = np.maximum(self.tree[2 * parents], self.tree[2 * parents + 1])
+            lo //= 2
+        self._index_version = self.version
+
+    def overlapping(self, t0, t1):
+        """
+        Indices of the intervals overlapping [t0, t1], i.e. with
+        start <= t1 and stop >= t0, in increasing order of start.
+        """
+        if self.n == 0:
+            return np.array([], dtype='int')
+        if self._index_version != self.version:
+            self._build_index()
+        # Only intervals starting before t1 can overlap
+        k = np.searchsorted(self.sorted_starts, t1, side='right')
+        if k == 0:
+            return np.array([], dtype='int')
+        nodes = np.array([1])
+        nodes = nodes[self.tree[nodes] >= t0]
+        for level in range(self.depth):
+            children = np.concatenate((2 * nodes, 2 * nodes + 1))
+            first_leaf = (children << (self.depth - level - 1)) - self.size
+            nodes = children[(first_leaf < k) & (self.tree[children] >= t0)]
+        leaves = np.sort(nodes - self.size)
+        return self.order[leaves[leaves < k]]
+
+    def containing(self, x):
+        """Indices of the intervals containing the time x."""
+        return self.overlapping(x, x)
+
+    def coverage(self, t_max, n_bins, indices=None):
+        """
+        Coverage of [0, t_max] by intervals, in n_bins equal bins.
+
+        Parameters
+        ----------
+        t_max : float
+            End time of the covered range.
+        n_bins : int
+            Number of bins.
+        indices : array of int
+            Intervals considered, defaults to all.
+
+        Returns
+        -------
+        covered : array of bool
+            True for bins overlapped by at least one interval.
+        """
+        if indices is None:
+            indices = np.arange(self.n)
+        dt = t_max / n_bins
+        lo = np.clip(np.floor(self.starts[indices] / dt).astype('int'), 0, n_bins)
+        hi = np.clip(np.floor(self.stops[indices] / dt).astype('int') + 1, 0, n_bins)
+        counts = np.zeros(n_bins + 1, dtype='int')
+        np.add.at(counts, lo, 1)
+        np.add.at(counts, hi, -1)
+        return np.cumsum(counts)[:n_bins] > 0
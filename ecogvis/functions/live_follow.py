@@ -0,0 +1,225 @@
+"""
+Following of NWB files while they are being written, with HDF5 single writer
+multiple readers (SWMR) mode, and a writer of synthetic ECoG to try it out.
+
+The writer creates the file in the latest HDF5 file format, with the raw
+signal extendable along time, and appends to it in SWMR mode. The viewer
+opens it read-only with open_nwb(path, swmr=True) and polls its extent.
+"""
+import time
+import datetime
+
+import numpy as np
+import h5py
+from scipy import signal
+from pynwb import NWBFile, NWBHDF5IO
+from pynwb.ecephys import ElectricalSeries
+from hdmf.backends.hdf5 import H5DataIO
+
+
+LIVE_POLL_MS = 250          # interval between polls of the file extent
+LIVE_CHUNK_SAMPLES = 1024   # samples per chunk of the live raw signal
+
+
+class LiveFollower:
+    """
+    Polls the number of samples of a dataset of a file opened in SWMR read
+    mode, see open_nwb().
+
+    Parameters
+    ----------
+    data : h5py dataset or array
+        Signal with dimensions (nSamples, nChannels). Arrays and datasets of
+        files not opened in SWMR mode do not grow.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.n_samples = data.shape[0]
+
+    def poll(self):
+        """
+        Refreshes the extent of the dataset.
+
+        Returns
+        -------
+        n_samples : int or None
+            New number of samples, or 'None' if it did not grow.
+        """
+        if isinstance(self.data, h5py.Dataset) and self.data.file.id.get_intent() & h5py.h5f.ACC_SWMR_READ:
+            self.data.refresh()
+        n_samples = self.data.shape[0]
+        if n_samples <= self.n_samples:
+            return None
+        self.n_samples = n_samples
+        return n_samples
+
+
+class SyntheticECoG:
+    """
+    Generator of synthetic ECoG: 1/f-like background (low pass filtered
+    white noise), 60 Hz line noise and occasional high gamma bursts, in volts.
+    Consecutive blocks are continuous.
+
+    Parameters
+    ----------
+    n_channels : int
+        Number of channels.
+    rate : float
+        Sampling rate, in Hz.
+    seed : int
+        Seed of the random generator.
+    """
+    def __init__(self, n_channels, rate, seed=0):
+        self.n_channels = n_channels
+        self.rate = rate
+        self.random = np.random.RandomState(seed)
+        self.b, self.a = signal.butter(1, min(5. / (rate / 2), .99))
+        self.zi = np.zeros((1, n_channels))
+        self.n_written = 0
+
+    def next(self, n_samples):
+        """Next block of samples, with dimensions (n_samples, n_channels)."""
+        t = (self.n_written + np.arange(n_samples)) / self.rate
+        noise = self.random.randn(n_samples, self.n_channels)
+        background, self.zi = signal.lfilter(self.b, self.a, noise, axis=0, zi=self.zi)
+        X = 20 * background + noise
+        X += 5 * np.sin(2 * np.pi * 60 * t)[:, np.newaxis]
+        if self.rate > 300:
+            # bursts of 110 Hz on some channels, a fraction of a second every few seconds
+            burst = (np.floor(t) % 5 == 0) & (t % 1 < .3)
+            channels = np.arange(self.n_channels) % 4 == 0
+            X[np.ix_(burst, channels)] += 10 * np.sin(2 * np.pi * 110 * t[burst])[:, np.newaxis]
+        self.n_written += n_samples
+        return (X * 1e-6).astype('float32')
+
+
+def create_live_nwb(path, n_channels=64, rate=3051.7578125, initial_duration=1., seed=0):
+    """
+    Creates a NWB file ready to be appended in SWMR mode: latest HDF5 file
+    format and a raw ElectricalSeries extendable along time, starting with
+    initial_duration seconds of synthetic ECoG.
+
+    Parameters
+    ----------
+    path : str or path
+        Path of the new NWB file.
+    n_channels : int
+        Number of channels.
+    rate : float
+        Sampling rate, in Hz.
+    initial_duration : float
+        Seconds of signal written at creation.
+    seed : int
+        Seed of the synthetic signal.
+    """
+    nwb = NWBFile(
+        session_description='synthetic ECoG, written live',
+        identifier=str(path),
+        session_start_time=datetime.datetime.now().astimezone(),
+    )
+    device = nwb.create_device(name='synthetic')
+    group = nwb.create_electrode_group(name='grid', description='synthetic grid',
+                                       location='cortex', device=device)
+    for i in range(n_channels):
+        nwb.add_electrode(x=float(i % 8), y=float(i // 8), z=0., imp=np.nan,
+                          location='cortex', filtering='none', group=group)
+    region = nwb.create_electrode_table_region(list(range(n_channels)), 'all electrodes')
+    initial = SyntheticECoG(n_channels, rate, seed=seed).next(int(initial_duration * rate))
+    data = H5DataIO(initial, maxshape=(None, n_channels),
+                    chunks=(LIVE_CHUNK_SAMPLES, min(n_channels, 16)))
+    nwb.add_acquisition(ElectricalSeries(name='ElectricalSeries', data=data, electrodes=region,
+                                         rate=float(rate), starting_time=0.,
+                                         description='synthetic ECoG'))
+    f = h5py.File(str(path), 'w', libver='latest')
+    with NWBHDF5IO(str(path), 'w', file=f) as io:
+        io.write(nwb)
+
+
+def write_synthetic_ecog(path, duration, n_channels=64, rate=3051.7578125, block_duration=.1,
+                         realtime=True, seed=0, ready=None):
+    """
+    Writes synthetic ECoG to a new NWB file as an acquisition system would,
+    appending one block at a time in SWMR mode, so that it can be followed
+    with the viewer. See create_live_nwb().
+
+    Parameters
+    ----------
+    path : str or path
+        Path of the new NWB file.
+    duration : float
+        Seconds of signal appended after the first one.
+    n_channels : int
+        Number of channels.
+    rate : float
+        Sampling rate, in Hz.
+    block_duration : float
+        Seconds of signal per append.
+    realtime : bool
+        If True, blocks are appended at the pace they would be recorded.
+    seed : int
+        Seed of the synthetic signal.
+    ready : multiprocessing.Event
+        Set once the file can be opened by readers.
+    """
+    create_live_nwb(path, n_channels=n_channels, rate=rate, seed=seed)
+    generator = SyntheticECoG(n_channels, rate, seed=seed + 1)
+    block = max(1, int(block_duration * rate))
+    with h5py.File(str(path), 'r+', libver='latest') as f:
+        f.swmr_mode = True
+        data = f['acquisition/ElectricalSeries/data']
+        if ready is not None:
+            ready.set()
+        start = time.time()
+        n_total = int(duration * rate)
+        n_appended = 0
+        while n_appended < n_total:
+            n = min(block, n_total - n_appended)
+            n0 = data.shape[0]
+            data.resize(n0 + n, axis=0)
+            data[n0:] = generator.next(n)
+            data.flush()
+            n_appended += n
+            if realtime:
+                time.sleep(max(0., start + n_appended / rate - time.time()))
+
+
+def parse_arguments():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Writes synthetic ECoG to a new NWB file in real time, in HDF5 SWMR mode, '
+                    'to be followed with ecogvis --follow.',
+    )
+    parser.add_argument(
+        "path",
+        help="The path of the new NWB file."
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=600.,
+        help="Seconds of signal to write."
+    )
+    parser.add_argument(
+        "--n_channels",
+        type=int,
+        default=64,
+        help="Number of channels."
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=3051.7578125,
+        help="Sampling rate, in Hz."
+    )
+    return parser.parse_args()
+
+
+def cmd_line_shortcut():
+    args = parse_arguments()
+    write_synthetic_ecog(args.path, duration=args.duration, n_channels=args.n_channels,
+                         rate=args.rate)
+
+
+if __name__ == '__main__':
+    cmd_line_shortcut()
@@ -110,6 +110,27 @@ class NoRawDialog(QtGui.QDialog):
         self.accept()
 
 
+# Warning of no spectral decomposition data in the NWB file -----------------
+class NoDecompositionDialog(QtGui.QDialog):
+    def __init__(self):
+        super().__init__()
+        self.text = QLabel(
+            "There is no spectral decomposition data in the current NWB file.\n"
+            "To calculate it, use the menu:\n"
+            "Tools > Spectral Decomposition")
+        self.okButton = QtGui.QPushButton("OK")
+        self.okButton.clicked.connect(self.onAccepted)
+        vbox = QtGui.QVBoxLayout()
+        vbox.addWidget(self.text)
+        vbox.addWidget(self.okButton)
+        self.setLayout(vbox)
+        self.setWindowTitle('No spectral decomposition data')
+        self.exec_()
+
+    def onAccepted(self):
+        self.accept()
+
+
 # Warning of no Trials data in the NWB file ----------------------------------
 class NoTrialsDialog(QtGui.QDialog):
     def __init__(self):
@@ -1309,6 +1330,143 @@ class PreprocessingDialog(QtGui.QDialog, Ui_Preprocessing):
         self.pushButton_2.setEnabled(False)
 
 
+# Preprocessing preview settings ---------------------------------------------
+class PreviewPreprocessingDialog(QtGui.QDialog):
+    """
+    Settings of the preprocessing preview, see PreprocessedPreview.
+
+    Parameters
+    ----------
+    config : dict
+        Current settings: 'car' (channels per CAR block), 'notch' (Hz) and
+        'band' ((low, high) Hz), each 'None' when off.
+    """
+    def __init__(self, config):
+        super().__init__()
+        self.config = None
+
+        self.check_car = QCheckBox('CAR, channels per block:')
+        self.check_car.setChecked(config['car'] is not None)
+        self.line_car = QLineEdit(str(config['car'] or 16))
+        self.check_notch = QCheckBox('Notch, line noise (Hz):')
+        self.check_notch.setChecked(config['notch'] is not None)
+        self.line_notch = QLineEdit(str(config['notch'] or 60.))
+        self.check_band = QCheckBox('Bandpass, low - high (Hz):')
+        self.check_band.setChecked(config['band'] is not None)
+        band = config['band'] or (1., 200.)
+        self.line_low = QLineEdit(str(band[0]))
+        self.line_high = QLineEdit(str(band[1]))
+
+        grid = QGridLayout()
+        grid.addWidget(self.check_car, 0, 0, 1, 1)
+        grid.addWidget(self.line_car, 0, 1, 1, 2)
+        grid.addWidget(self.check_notch, 1, 0, 1, 1)
+        grid.addWidget(self.line_notch, 1, 1, 1, 2)
+        grid.addWidget(self.check_band, 2, 0, 1, 1)
+        grid.addWidget(self.line_low, 2, 1, 1, 1)
+        grid.addWidget(self.line_high, 2, 2, 1, 1)
+
+        self.okButton = QPushButton("OK")
+        self.okButton.clicked.connect(self.onAccepted)
+        self.cancelButton = QPushButton("Cancel")
+        self.cancelButton.clicked.connect(self.reject)
+        hbox = QHBoxLayout()
+        hbox.addStretch(1)
+        hbox.addWidget(self.okButton)
+        hbox.addWidget(self.cancelButton)
+
+        vbox = QVBoxLayout()
+        vbox.addWidget(QLabel('Preprocessing applied on the fly to the visible window:'))
+        vbox.addLayout(grid)
+        vbox.addLayout(hbox)
+        self.setLayout(vbox)
+        self.setWindowTitle('Preprocessing Preview')
+        self.exec_()
+
+    def onAccepted(self):
+        try:
+            self.config = {
+                'car': int(self.line_car.text()) if self.check_car.isChecked() else None,
+                'notch': float(self.line_notch.text()) if self.check_notch.isChecked() else None,
+                'band': ((float(self.line_low.text()), float(self.line_high.text()))
+                         if self.check_band.isChecked() else None),
+            }
+        except ValueError:
+            return
+        self.accept()
+
+
+# Searchable catalog of the blocks of the current subject -------------------
+class BlocksCatalogDialog(QtGui.QDialog):
+    """
+    Searchable table of the blocks of a subject, see SessionCatalog. The path
+    of the block chosen to open is in self.chosen, 'None' if cancelled.
+
+    Parameters
+    ----------
+    catalog : SessionCatalog
+        Catalog of the blocks.
+    """
+    def __init__(self, catalog):
+        super().__init__()
+        self.catalog = catalog
+        self.chosen = None
+        self.entries = []
+
+        self.line_search = QLineEdit()
+        self.line_search.setPlaceholderText('Search files, containers, intervals and stimuli')
+        self.line_search.textChanged.connect(self.update_table)
+        self.table = QtGui.QTableWidget()
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels(['File', 'Duration [s]', 'Rates [Hz]', 'Channels',
+                                              'Containers', 'Intervals'])
+        self.table.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QtGui.QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QtGui.QAbstractItemView.SingleSelection)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.cellDoubleClicked.connect(lambda row, column: self.onAccepted())
+        self.update_table('')
+
+        self.okButton = QPushButton("Open")
+        self.okButton.clicked.connect(self.onAccepted)
+        self.cancelButton = QPushButton("Cancel")
+        self.cancelButton.clicked.connect(self.reject)
+        hbox = QHBoxLayout()
+        hbox.addStretch(1)
+        hbox.addWidget(self.okButton)
+        hbox.addWidget(self.cancelButton)
+
+        vbox = QVBoxLayout()
+        vbox.addWidget(self.line_search)
+        vbox.addWidget(self.table)
+        vbox.addLayout(hbox)
+        self.setLayout(vbox)
+        self.resize(900, 400)
+        self.setWindowTitle('Blocks Catalog')
+        self.exec_()
+
+    def update_table(self, text):
+        """Shows the blocks matching the search text."""
+        self.entries = self.catalog.search(text)
+        self.table.setRowCount(len(self.entries))
+        for i, entry in enumerate(self.entries):
+            series = entry['series'].values()
+            rates = sorted(set(round(s['rate'], 1) for s in series))
+            channels = sorted(set(s['n_channels'] for s in series if s['type'] != 'TimeSeries'))
+            intervals = ['{} ({})'.format(name, n) for name, n in entry['intervals'].items()]
+            values = [entry['file'], '{:.1f}'.format(entry['duration']),
+                      ', '.join(str(r) for r in rates), ', '.join(str(c) for c in channels),
+                      ', '.join(entry['containers']), ', '.join(intervals)]
+            for j, value in enumerate(values):
+                self.table.setItem(i, j, QTableWidgetItem(value))
+
+    def onAccepted(self):
+        row = self.table.currentRow()
+        if 0 <= row < len(self.entries):
+            self.chosen = self.catalog.directory / self.entries[row]['file']
+            self.accept()
+
+
 # Creates Periodogram Grid window --------------------------------------------
 class PeriodogramGridDialog(QMainWindow):
     def __init__(self, parent):
@@ -15,6 +15,8 @@ from pynwb.misc import DecompositionSeries
 import string
 import random
 
+from ecogvis.functions.nwb_io import open_nwb
+
 
 def id_generator(size=6, chars=string.ascii_uppercase + string.digits):
     return ''.join(random.choice(chars) for _ in range(size))
@@ -56,7 +58,7 @@ def nwb_copy_file(old_file, new_file, cp_objs={}, save_to_file=True):
         nwb_old = old_file
         io1 = False
     else:
-        io1 = NWBHDF5IO(str(old_file), 'r', manager=manager, load_namespaces=True)
+        io1 = open_nwb(old_file, 'r', access='sweep', manager=manager)
         nwb_old = io1.read()
 
     # Creates new file
@@ -0,0 +1,235 @@
+"""
+Opening of NWB files with the HDF5 raw data chunk cache sized from the chunk
+geometry of their signals and from the way they are going to be read.
+
+The default chunk cache (1 MB) holds few chunks of typical ECoG recordings,
+so reading them one channel at a time decompresses every chunk once per
+channel it holds.
+"""
+import itertools
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import h5py
+from pynwb import NWBHDF5IO
+
+
+MIN_CACHE_BYTES = 2**20             # HDF5 default
+WINDOW_CACHE_BYTES = 64 * 2**20     # maximum cache for viewer windows
+SWEEP_CACHE_BYTES = 512 * 2**20     # maximum cache for whole recording sweeps
+WINDOW_ROWS = 4                     # rows of chunks kept for viewer windows
+SLOTS_PER_CHUNK = 100               # hash table slots per cached chunk, as advised by HDF5
+
+
+def chunk_layout(path, swmr=False):
+    """
+    Chunk geometry of the signals in a file: its chunked datasets with two
+    or more dimensions.
+
+    Parameters
+    ----------
+    path : str or path
+        Path of the HDF5 file.
+    swmr : bool
+        Opens the file in SWMR read mode, for files being written.
+
+    Returns
+    -------
+    layout : list of dict
+        'name', 'shape', 'chunks', 'chunk_bytes' (uncompressed, as cached)
+        and 'compression' of each dataset.
+    """
+    layout = []
+
+    def visit(name, obj):
+        if isinstance(obj, h5py.Dataset) and obj.ndim >= 2 and obj.chunks is not None:
+            layout.append({
+                'name': obj.name,
+                'shape': obj.shape,
+                'chunks': obj.chunks,
+                'chunk_bytes': int(np.prod(obj.chunks)) * obj.dtype.itemsize,
+                'compression': obj.compression,
+            })
+
+    kwargs = {'libver': 'latest', 'swmr': True} if swmr else {}
+    with h5py.File(str(path), 'r', **kwargs) as f:
+        f.visititems(visit)
+    return layout
+
+
+def _next_prime(n):
+    """Smallest prime number larger than or equal to n."""
+    n = max(int(n), 2)
+    while any(n % d == 0 for d in range(2, int(np.sqrt(n)) + 1)):
+        n += 1
+    return n
+
+
+def chunk_cache_settings(layout, access='window'):
+    """
+    Raw data chunk cache settings for the signals of a file.
+
+    Parameters
+    ----------
+    layout : list of dict
+        Chunk geometry of the signals, from chunk_layout().
+    access : str
+        How the signals are read:
+        - 'window': windows of all channels moving along time, as in the
+          viewer. The cache holds WINDOW_ROWS rows of chunks (all the channel
+          chunks of a time chunk), up to WINDOW_CACHE_BYTES.
+        - 'sweep': whole recordings one channel at a time, as in processing.
+          The cache holds a whole column of chunks (all the time chunks of a
+          channel chunk), so the next channels of the same chunks are read
+          from it, up to SWEEP_CACHE_BYTES. Chunks read in full are evicted
+          first, as they are not read again.
+
+    Returns
+    -------
+    settings : dict
+        'rdcc_nbytes', 'rdcc_nslots' and 'rdcc_w0', the h5py.File arguments.
+    """
+    nbytes = MIN_CACHE_BYTES
+    chunk_bytes = MIN_CACHE_BYTES
+    for dset in layout:
+        n_chunks = [int(np.ceil(s / c)) for s, c in zip(dset['shape'], dset['chunks'])]
+        if access == 'sweep':
+            needed = n_chunks[0] * dset['chunk_bytes']
+        else:
+            needed = WINDOW_ROWS * int(np.prod(n_chunks[1:])) * dset['chunk_bytes']
+        if needed > nbytes:
+            nbytes = needed
+            chunk_bytes = dset['chunk_bytes']
+    max_bytes = SWEEP_CACHE_BYTES if access == 'sweep' else WINDOW_CACHE_BYTES
+    nbytes = int(min(nbytes, max_bytes))
+    n_cached = max(1, nbytes // max(chunk_bytes, 1))
+    return {
+        'rdcc_nbytes': nbytes,
+        'rdcc_nslots': _next_prime(SLOTS_PER_CHUNK * n_cached),
+        'rdcc_w0': 1. if access == 'sweep' else .75,
+    }
+
+
+def open_nwb(path, mode='r', access='window', swmr=False, **kwargs):
+    """
+    Opens a NWB file with the chunk cache set for its signals, see
+    chunk_cache_settings(). Open in 'r' mode when nothing is written.
+
+    Parameters
+    ----------
+    path : str or path
+        Path of the NWB file.
+    mode : str
+        'r' or 'r+'.
+    access : str
+        'window' or 'sweep', see chunk_cache_settings().
+    swmr : bool
+        Opens a file being written in HDF5 SWMR mode (single writer, multiple
+        readers), in 'r' mode only. The extent of its datasets is updated
+        with their refresh() method, see LiveFollower.
+    kwargs
+        Other NWBHDF5IO arguments, e.g. manager.
+
+    Returns
+    -------
+    io : NWBHDF5IO
+        Namespaces are loaded from the file. Closing it closes the file.
+    """
+    path = str(Path(path))
+    settings = chunk_cache_settings(chunk_layout(path, swmr=swmr), access=access)
+    if swmr:
+        if mode != 'r':
+            raise ValueError("Files being written can only be opened in 'r' mode.")
+        settings.update(libver='latest', swmr=True)
+    f = h5py.File(path, mode, **settings)
+    try:
+        return NWBHDF5IO(path, mode, file=f, load_namespaces=True, **kwargs)
+    except Exception:
+        f.close()
+        raise
+
+
+def cache_settings(h5file):
+    """Chunk cache settings of an open h5py file, as 'rdcc_nbytes', 'rdcc_nslots' and 'rdcc_w0'."""
+    _, nslots, nbytes, w0 = h5file.id.get_access_plist().get_cache()
+    return {'rdcc_nbytes': nbytes, 'rdcc_nslots': nslots, 'rdcc_w0': w0}
+
+
+class ChunkAccessStats:
+    """
+    Estimated chunk cache hits and misses of the reads of a chunked dataset,
+    which HDF5 does not report. Reads are replayed on a least recently used
+    cache of the same size, holding whole chunks.
+
+    Parameters
+    ----------
+    chunks : tuple of int
+        Chunk shape of the dataset.
+    chunk_bytes : int
+        Size of an uncompressed chunk.
+    cache_bytes : int
+        Size of the chunk cache.
+    """
+    def __init__(self, chunks, chunk_bytes, cache_bytes):
+        self.chunks = tuple(chunks)
+        self.capacity = cache_bytes // max(chunk_bytes, 1)   # chunks larger than the cache are not cached
+        self.cached = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_dataset(cls, dataset):
+        """Statistics for a chunked h5py dataset, with the cache settings of its file."""
+        chunk_bytes = int(np.prod(dataset.chunks)) * dataset.dtype.itemsize
+        return cls(dataset.chunks, chunk_bytes, cache_settings(dataset.file)['rdcc_nbytes'])
+
+    def record(self, shape, key):
+        """
+        Records a read.
+
+        Parameters
+        ----------
+        shape : tuple of int
+            Shape of the dataset.
+        key : tuple of slices and ints
+            Selection read, e.g. (slice(None), 3) for a channel.
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        key = key + (slice(None),) * (len(shape) - len(key))
+        ranges = []
+        for k, size, chunk in zip(key, shape, self.chunks):
+            if isinstance(k, slice):
+                start, stop, _ = k.indices(size)
+            else:
+                start, stop = int(k), int(k) + 1
+            if stop <= start:
+                return
+            ranges.append(range(start // chunk, (stop - 1) // chunk + 1))
+        for index in itertools.product(*ranges):
+            if index in self.cached:
+                self.hits += 1
+                self.cached.move_to_end(index)
+            else:
+                self.misses += 1
+                if self.capacity > 0:
+                    self.cached[index] = True
+                    while len(self.cached) > self.capacity:
+                        self.cached.popitem(last=False)
+
+    def hit_rate(self):
+        """Fraction of the chunk reads served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.
+
+    def __str__(self):
+        return '{} chunk reads, {:.0f}% from cache (estimated)'.format(
+            self.hits + self.misses, 100 * self.hit_rate())
+
+
+def chunk_stats(data):
+    """ChunkAccessStats of a dataset, or 'None' if it is not a chunked h5py dataset."""
+    if isinstance(data, h5py.Dataset) and data.chunks is not None:
+        return ChunkAccessStats.for_dataset(data)
+    return None
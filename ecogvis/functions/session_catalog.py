@@ -0,0 +1,291 @@
+import re
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+import h5py
+
+from ecogvis.signal_processing.lod_pyramid import sidecar_dir
+
+
+# Series summarized in the catalog, by neurodata type
+SERIES_TYPES = ['ElectricalSeries', 'DecompositionSeries', 'TimeSeries']
+
+
+def block_number(path):
+    """Block number of a file named '<subject>_B<block>.nwb', 'None' if it has none."""
+    match = re.search(r'_B(\d+)', Path(path).stem)
+    return int(match.group(1)) if match else None
+
+
+def _attr(obj, name):
+    """String attribute of an HDF5 object, decoded if stored as bytes."""
+    value = obj.attrs.get(name, None)
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def block_summary(path):
+    """
+    Summary of a NWB file, read directly with h5py without building the NWB
+    containers.
+
+    Parameters
+    ----------
+    path : str or path
+        Path of the NWB file.
+
+    Returns
+    -------
+    summary : dict
+        'file', 'block', 'size' and 'mtime' of the file, 'duration' (seconds,
+        of the longest series), 'series' (path: dict with 'type', 'rate',
+        'n_samples' and 'n_channels'), 'containers' (names of the
+        acquisition series and of the processed data interfaces),
+        'intervals' (table name: number of intervals) and 'stimuli' (names).
+    """
+    path = Path(path)
+    stat = path.stat()
+    summary = {'file': path.name, 'block': block_number(path),
+               'size': stat.st_size, 'mtime': stat.st_mtime,
+               'duration': 0., 'series': {}, 'containers': [], 'intervals': {}, 'stimuli': []}
+    with h5py.File(str(path), 'r') as f:
+        def visit(name, obj):
+            if not isinstance(obj, h5py.Group) or _attr(obj, 'neurodata_type') not in SERIES_TYPES:
+                return
+            if 'data' not in obj or 'starting_time' not in obj:
+                return
+            shape = obj['data'].shape
+            rate = float(obj['starting_time'].attrs['rate'])
+            summary['series'][obj.name] = {
+                'type': _attr(obj, 'neurodata_type'),
+                'rate': rate,
+                'n_samples': int(shape[0]),
+                'n_channels': int(shape[1]) if len(shape) > 1 else 1,
+            }
+            summary['duration'] = max(summary['duration'], shape[0] / rate)
+
+        for group in ['acquisition', 'processing', 'stimulus']:
+            if group in f:
+                f[group].visititems(visit)
+        if 'acquisition' in f:
+            summary['containers'] += list(f['acquisition'].keys())
+        if 'processing' in f:
+            for module in f['processing'].values():
+                summary['containers'] += list(module.keys())
+                if 'LFP' in module:
+                    summary['containers'] += ['LFP/' + name for name in module['LFP'].keys()]
+        if 'intervals' in f:
+            for name, table in f['intervals'].items():
+                if 'id' in table:
+                    summary['intervals'][name] = int(table['id'].shape[0])
+        if 'stimulus/presentation' in f:
+            summary['stimuli'] = list(f['stimulus/presentation'].keys())
+    return summary
+
+
+class SessionCatalog:
+    """
+    Index of all the blocks of a subject, files named '<subject>_B<block>.nwb'
+    in the same directory, with a summary of each one, see block_summary().
+
+    The index is kept in a JSON file in the sidecar directory, and only the
+    files that are new or changed since it was saved are read again.
+
+    Parameters
+    ----------
+    nwb_path : str or path
+        Path of any block of the subject.
+    """
+    def __init__(self, nwb_path):
+        nwb_path = Path(nwb_path).absolute()
+        self.directory = nwb_path.parent
+        self.prefix = nwb_path.name.split('_B')[0]
+        digest = hashlib.sha1(str(self.directory).encode('utf-8')).hexdigest()[:10]
+        self.index_path = sidecar_dir() / 'catalog_{}_{}.json'.format(self.prefix, digest)
+        self.entries = {}
+        if self.index_path.is_file():
+            try:
+                with open(str(self.index_path), 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):   # unreadable index, it is rebuilt
+                self.entries = {}
+        self.refresh()
+
+    def covers(self, nwb_path):
+        """True if a file is one of the blocks of this catalog."""
+        nwb_path = Path(nwb_path).absolute()
+        return nwb_path.parent == self.directory and nwb_path.name.split('_B')[0] == self.prefix
+
+    def files(self):
+        """Paths of the blocks, sorted by block number."""
+        paths = [p for p in self.directory.glob(self.prefix + '_B*.nwb')
+                 if p.name.split('_B')[0] == self.prefix]
+        return sorted(paths, key=lambda p: (block_number(p) is None, block_number(p) or 0, p.name))
+
+    def refresh(self):
+        """Summarizes new or changed blocks, forgets removed ones, and saves the index."""
+        changed = False
+        files = self.files()
+        names = set(p.name for p in files)
+        for name in [name for name in self.entries if name not in names]:
+            del self.entries[name]
+            changed = True
+        for path in files:
+            entry = self.entries.get(path.name, None)
+            stat = path.stat()
+            if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+                try:
+                    self.entries[path.name] = block_summary(path)
+                except OSError:     # e.g. a file being written
+                    continue
+                changed = True
+        if changed:
+            self.save()
+
+    def save(self):
+        """Writes the index, replacing the previous one at once."""
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(str(tmp_path), 'w') as f:
+            json.dump(self.entries, f, indent=1)
+        tmp_path.replace(self.index_path)
+
+    def neighbour(self, nwb_path, move):
+        """
+        Block move positions away from a block, wrapping around at both
+        ends, or 'None' if the block is not in the catalog.
+        """
+        files = self.files()
+        names = [p.name for p in files]
+        name = Path(nwb_path).name
+        if name not in names:
+            return None
+        return files[(names.index(name) + move) % len(files)]
+
+    def search(self, text='', containers=(), min_duration=0.):
+        """
+        Blocks matching all the criteria.
+
+        Parameters
+        ----------
+        text : str
+            Case insensitive text, searched in the file name, containers,
+            interval tables and stimuli names.
+        containers : list of str
+            Containers the blocks must have, e.g. ['high_gamma'].
+        min_duration : float
+            Minimum duration, in seconds.
+
+        Returns
+        -------
+        entries : list of dict
+            Summaries of the matching blocks, sorted by block number.
+        """
+        text = text.lower()
+        out = []
+        for path in self.files():
+            entry = self.entries.get(path.name, None)
+            if entry is None:
+                continue
+            words = [entry['file']] + entry['containers'] + list(entry['intervals']) + entry['stimuli']
+            if text and not any(text in w.lower() for w in words):
+                continue
+            if not all(c in entry['containers'] for c in containers):
+                continue
+            if entry['duration'] < min_duration:
+                continue
+            out.append(entry)
+        return out
+
+
+class BlockPreopener:
+    """
+    Keeps some NWB files opened ahead of time, e.g. the blocks before and
+    after the current one, so that switching to them is instant. Files are
+    opened one at a time in a background thread.
+
+    Parameters
+    ----------
+    open_file : callable
+        Opens a path and returns what take() hands back, e.g. a pynwb IO
+        and the NWB file read from it. It is called on the background thread.
+    close_file : callable
+        Closes what open_file returned.
+    """
+    def __init__(self, open_file, close_file):
+        self.open_file = open_file
+        self.close_file = close_file
+        self.wanted = []
+        self.opened = {}        # path: opened file
+        self.opening = None     # path being opened
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def prepare(self, paths):
+        """Opens paths in the background, and closes the opened files not in them."""
+        paths = [Path(p).absolute() for p in paths]
+        with self.condition:
+            self.wanted = paths
+            stale = [p for p in self.opened if p not in paths]
+            closing = [self.opened.pop(p) for p in stale]
+            self.condition.notify_all()
+        for opened in closing:
+            self.close_file(opened)
+
+    def take(self, path):
+        """
+        Hands over an opened file, waiting for it if it is being opened.
+
+        Returns
+        -------
+        opened : object or None
+            What open_file returned, or 'None' if the path is not opened
+            ahead. The caller is responsible for closing it.
+        """
+        path = Path(path).absolute()
+        with self.condition:
+            if path in self.wanted:
+                self.wanted.remove(path)
+            while self.opening == path:
+                self.condition.wait()
+            return self.opened.pop(path, None)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not [p for p in self.wanted if p not in self.opened]:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                path = [p for p in self.wanted if p not in self.opened][0]
+                self.opening = path
+            try:
+                opened = self.open_file(path)
+            except Exception as error:   # e.g. a file being written
+                print('Could not open ' + str(path) + ' ahead: ' + str(error))
+                opened = None
+            with self.condition:
+                self.opening = None
+                if opened is not None and self.running and path in self.wanted:
+                    self.opened[path] = opened
+                    opened = None
+                elif path in self.wanted:
+                    self.wanted.remove(path)   # failed, not tried again
+                self.condition.notify_all()
+            if opened is not None:
+                self.close_file(opened)
+
+    def close(self):
+        """Stops the background thread and closes all opened files."""
+        with self.condition:
+            self.running = False
+            self.wanted = []
+            closing = list(self.opened.values())
+            self.opened = {}
+            self.condition.notify_all()
+        self.thread.join()
+        for opened in closing:
+            self.close_file(opened)
@@ -4,22 +4,61 @@ from scipy import signal
 import numpy as np
 import pandas as pd
 from PyQt5.QtWidgets import QMessageBox
-from PyQt5 import QtGui
+from PyQt5 import QtGui, QtCore
 import pyqtgraph as pg
 import datetime
-import pynwb
+import time
+import h5py
 import ndx_ecog
 
+from ecogvis.signal_processing.decimation import minmax_decimate, interleave_minmax
+from ecogvis.signal_processing.audio_overview import AudioOverview
+from ecogvis.signal_processing.lod_pyramid import open_pyramid, build_pyramid, pyramid_factors
+from ecogvis.signal_processing.scale_stats import robust_scale_stats, robust_sigma
+from ecogvis.signal_processing.decomposition_bands import DecompositionBands, band_power_image
+from ecogvis.functions.tile_cache import TileCache, TilePrefetcher
+from ecogvis.functions.interval_store import IntervalStore
+from ecogvis.functions.annotation_store import AnnotationStore
+from ecogvis.functions.frame_profiler import FrameProfiler
+from ecogvis.functions.nwb_io import open_nwb
+from ecogvis.functions.live_follow import LiveFollower, LIVE_POLL_MS
+
+
+# Annotations colors, RGBA
+annotation_colors = {
+    'yellow': (250, 250, 150, 200),
+    'red': (250, 0, 0, 200),
+    'green': (0, 255, 0, 200),
+    'blue': (0, 0, 255, 200),
+}
+
+# Intervals colors, RGBA
+interval_colors = {
+    'yellow': (250, 250, 150, 180),
+    'red': (250, 0, 0, 100),
+    'green': (0, 255, 0, 130),
+    'blue': (0, 0, 255, 100),
+}
+
 
 class TimeSeriesPlotter:
     """
     This class holds the 3 time series subplots in the main window.
     It also holds information of the currently open NWB file, as well as user
     annotations and intervals.
+
+    The NWB file can be opened ahead of time and passed as preopened, a tuple
+    (NWBHDF5IO, NWBFile), see BlockPreopener. If it is opened read-only, it
+    is re-opened for writing before tools write to it, see ensure_writable().
+
+    With follow, a file being written is opened read-only in HDF5 SWMR mode
+    and the samples appended to the shown signal are polled every
+    LIVE_POLL_MS, see follow_poll().
     """
-    def __init__(self, par):
+    def __init__(self, par, preopened=None, follow=False):
         self.parent = par
         self.source_path = Path(par.source_path)
+        self.follow = follow
 
         # Makes nwbfile object from nwb file
         if self.source_path.is_file():
@@ -29,13 +68,18 @@ class TimeSeriesPlotter:
             else:
                 self.subject_id = ''
                 self.block = ''
-            self.io = pynwb.NWBHDF5IO(str(self.source_path), 'r+', load_namespaces=True)
-            self.nwb = self.io.read()      # reads NWB file
+            if preopened is not None:
+                self.io, self.nwb = preopened
+            else:
+                self.io = self.open_io()
+                self.nwb = self.io.read()      # reads NWB file
         else:
             raise TypeError("Invalid file type")
 
         title = ' '.join(['EcogVIS -', self.parent.current_session,
                           self.source_path.name, '-', self.block])
+        if self.follow:
+            title += ' (live)'
         self.parent.setWindowTitle(title)
 
         # Tries to load Raw data
@@ -67,11 +111,22 @@ class TimeSeriesPlotter:
         except:
             print("No 'high_gamma' data in 'processing' group.")
 
-        self.plotData = self.source.data
-        self.fs_signal = self.source.rate     # sampling frequency [Hz]
-        self.tbin_signal = 1 / self.fs_signal  # time bin duration [seconds]
-        self.nBins = self.source.data.shape[0]     # total number of bins
         self.min_window_bins = 10                   # minimum number of bins to plot
+        self.min_plot_bins = 500                    # minimum number of decimation bins
+        self.lod = None             # level of detail pyramid of plotData
+        self.lod_builder = None
+        self.stim_builder = None    # builds the stimuli overviews, see load_stimuli()
+        self.scale_stats = None     # robust scale statistics of plotData channels
+        self.preview_config = {'car': 16, 'notch': 60., 'band': None}   # see PreprocessedPreview
+        self.decomposition = None   # DecompositionBands of the source, when browsing a decomposition
+        self.heatmap = False        # all bands of the decomposition as a heatmap
+        self.per_window_scale = self.parent.action_window_scale.isChecked()
+        self.tile_cache = TileCache()
+        self.single_path = self.parent.action_single_path.isChecked()
+        self.prefetcher = TilePrefetcher(self.tile_cache)
+        self.profiler = FrameProfiler() if self.parent.action_profiler.isChecked() else None
+        self.refresh_scheduler = RefreshScheduler(state=self.window_state, load=self.load_window,
+                                                  paint=self.TimeSeries_plotter)
         # Electrodes table - bipolar or regular table
         self.electrodes_table = self.source.electrodes.table
         # all electricalseries channels ids
@@ -79,18 +134,19 @@ class TimeSeriesPlotter:
         self.electrical_series_channel_ids = np.array(self.all_channels_ids)[self.source.electrodes.data[:]].tolist()
         self.n_channels_total = len(self.electrical_series_channel_ids)     # total number of channels
 
-        # Get Brain regions present in current file
-        self.all_regions = list(self.electrodes_table['location'][self.electrical_series_channel_ids])
+        # Get Brain regions present in current file, from the whole column, read once
+        locations = np.asarray(self.electrodes_table['location'][:])[self.electrical_series_channel_ids]
+        self.all_regions = list(locations)
         self.all_regions.sort()
         self.regions_mask = [True] * len(self.all_regions)
 
-        self.channels_mask = np.ones(len(list(self.electrodes_table['location'][self.electrical_series_channel_ids])))
+        self.channels_mask = np.ones(len(locations))
         self.channels_mask_ind = np.where(self.channels_mask)[0]
 
         self.h = []
         self.text = []
-        self.AnnotationsList = []
-        self.AnnotationsPosAV = np.array([])    # (x, y_va, y_off)
+        self.annotations = AnnotationStore()
+        self.annotation_items = {}      # id:TextItem, for annotations in view
         self.unsaved_changes_annotation = False
         self.unsaved_changes_interval = False
 
@@ -101,47 +157,23 @@ class TimeSeriesPlotter:
         self.nChToShow = self.lastCh - self.firstCh + 1
         self.selectedChannels = np.arange(self.firstCh - 1, self.lastCh)
 
-        self.current_rect = []
-
         # List of bad channels
         if 'bad' in self.electrodes_table:
-            aux_mask = self.electrodes_table[self.electrical_series_channel_ids]['bad']
-            self.bad_channels_ids = list(self.electrodes_table[self.electrical_series_channel_ids][aux_mask].index)
+            aux_mask = np.asarray(self.electrodes_table['bad'][:], dtype='bool')[self.electrical_series_channel_ids]
+            self.bad_channels_ids = list(np.asarray(self.all_channels_ids)[self.electrical_series_channel_ids][aux_mask])
         else:
             self.bad_channels_ids = []
 
+        self.set_source(self.source)
+
         # Load invalid intervals from NWB file
-        self.allIntervals = []
+        self.intervals = IntervalStore()
         if self.nwb.invalid_times is not None:
-            self.nBI = self.nwb.invalid_times.columns[0][:].shape[0]  # number of BI
-            for ii in np.arange(self.nBI):
-                # create new interval
-                obj = CustomInterval()
-                obj.start = self.nwb.invalid_times.columns[0][ii]
-                obj.stop = self.nwb.invalid_times.columns[1][ii]
-                obj.type = 'invalid'
-                obj.color = 'red'
-                obj.session = ''
-                self.allIntervals.append(obj)
-
-        # Plot interval rectangles at upper and middle pannels
-        self.IntRects1 = np.array([], dtype='object')
-        self.IntRects2 = np.array([], dtype='object')
-        for i, obj in enumerate(self.allIntervals):
-            start = obj.start
-            stop = obj.stop
-            # on timeline
-            c = pg.QtGui.QGraphicsRectItem(start, -1, max(stop - start, 0.01), 2)
-            self.IntRects1 = np.append(self.IntRects1, c)
-            c.setPen(pg.mkPen(color='r'))
-            c.setBrush(QtGui.QColor(255, 0, 0, 120))
-            self.parent.win2.addItem(c)
-            # on signals plot
-            c = pg.QtGui.QGraphicsRectItem(start, -1, max(stop - start, 0.01), 2)
-            self.IntRects2 = np.append(self.IntRects2, c)
-            c.setPen(pg.mkPen(color='r'))
-            c.setBrush(QtGui.QColor(255, 0, 0, 120))
-            self.parent.win1.addItem(c)
+            # whole columns, one read each
+            starts = self.nwb.invalid_times['start_time'].data[:]
+            stops = self.nwb.invalid_times['stop_time'].data[:]
+            self.intervals.extend(starts, stops, 'invalid', 'red', '')
+            self.nBI = len(self.intervals)  # number of BI
 
         # Test if current nwb file contains Survey table
         if 'behavior' in self.nwb.processing:
@@ -171,38 +203,266 @@ class TimeSeriesPlotter:
             self.parent.transcriptionadd_tools_menu.setEnabled(True)
             self.parent.action_vis_transcription.setEnabled(False)
 
+        # Persistent plot items, updated on each refresh
+        self.init_plots()
+
         # Add Speaker and Mic Intervals if they exist
         self.SpeakerAndMicIntervalAdd()
 
         # Load stimuli signals (audio)
         self.load_stimuli()
 
-        # Initiate plots
+        # Initiate plots, drawn right away
         self.updateCurXAxisPosition()
-        self.refreshScreen()
+        self.refresh_scheduler.flush()
+
+        # Polls of the samples appended to a file being written
+        self.live_timer = QtCore.QTimer()
+        self.live_timer.setInterval(LIVE_POLL_MS)
+        self.live_timer.timeout.connect(self.follow_poll)
+        if self.follow:
+            self.live_timer.start()
+
+    def open_io(self):
+        """Opens the NWB file, read-only in SWMR mode when following it."""
+        if self.follow:
+            return open_nwb(self.source_path, 'r', swmr=True)
+        return open_nwb(self.source_path, 'r+')
+
+    def init_plots(self):
+        """
+        Creates the plot items that are kept for the whole session and only
+        have their data updated on each refresh, and sets the plots style.
+        """
+        plt1 = self.parent.win2     # upper horizontal bar
+        plt2 = self.parent.win1     # middle signals plot
+        plt3 = self.parent.win3     # bottom stimuli plot
+        self.pens = {
+            'even': pg.mkPen((0, 0, 200), width=1.2),
+            'odd': pg.mkPen((0, 120, 0), width=1.2),
+            'bad': pg.mkPen((220, 0, 0), width=1.2),
+        }
+        # Ranges are always set explicitly on refresh
+        for plt in [plt1, plt2, plt3]:
+            plt.disableAutoRange()
+        # Signals plot: channels reference lines and one curve per channel
+        self.ref_lines = pg.PlotDataItem(pen='k', connect='pairs')
+        plt2.addItem(self.ref_lines)
+        self.curves = []
+        # Alternative renderer, all channels as a few paths in a single item
+        self.trace_item = MultiTraceItem(pens=self.pens)
+        plt2.addItem(self.trace_item)
+        # Decomposition heatmap: bands of each channel stacked, low to high
+        # frequencies, power relative to each band median in log2 units
+        self.heatmap_item = pg.ImageItem()
+        colormap = pg.ColorMap([0., .5, 1.], [(0, 0, 200, 255), (255, 255, 255, 255), (220, 0, 0, 255)])
+        self.heatmap_item.setLookupTable(colormap.getLookupTable(nPts=256))
+        self.heatmap_item.setVisible(False)
+        plt2.addItem(self.heatmap_item)
+        # Intervals: rectangles reused for the visible intervals on the signals
+        # plot, and coverage bars per color on the timeline
+        self.interval_pens = {}
+        self.interval_brushes = {}
+        for color, bc in interval_colors.items():
+            self.interval_pens[color] = pg.mkPen(color=QtGui.QColor(bc[0], bc[1], bc[2], 255))
+            self.interval_brushes[color] = pg.mkBrush(QtGui.QColor(*bc))
+        self.interval_rects = []
+        self.coverage_bars = {}
+        self.coverage_key = None
+        # Frame rate and latency, shown when profiling
+        self.profiler_overlay = pg.TextItem(anchor=(0, 0), color=(0, 0, 0),
+                                            fill=pg.mkBrush(255, 255, 255, 200))
+        self.profiler_overlay.setParentItem(plt2.getViewBox())
+        self.profiler_overlay.setPos(5, 5)
+        self.profiler_overlay.setZValue(3)
+        self.profiler_overlay.setVisible(self.profiler is not None)
+        plt2.setLabel('bottom', 'Time', units='sec')
+        plt2.setLabel('left', 'Channel #')
+        plt2.getAxis('left').setWidth(w=53)
+
+        # Upper horizontal bar: timeline and visualization window rectangle
+        self.timeline = pg.PlotDataItem(pen=pg.mkPen('k', width=2))
+        plt1.addItem(self.timeline)
+        self.current_rect = CustomBox(self, 0, -1000, 1, 2000)
+        self.current_rect.setPen(pg.mkPen(color=(0, 0, 0, 50)))
+        self.current_rect.setBrush(QtGui.QColor(0, 0, 0, 50))
+        self.current_rect.setFlags(QtGui.QGraphicsItem.ItemIsMovable)
+        plt1.addItem(self.current_rect)
+        plt1.setLabel('left', 'Span')
+        plt1.getAxis('left').setWidth(w=53)
+        plt1.getAxis('left').setStyle(showValues=False)
+        plt1.getAxis('left').setTicks([])
+
+        # Bottom plot: stimuli
+        self.stim_curve = pg.PlotDataItem(pen='k')
+        plt3.addItem(self.stim_curve)
+        plt3.setXLink(plt2)
+        plt3.setLabel('left', 'Stim')
+        plt3.getAxis('left').setWidth(w=53)
+        plt3.getAxis('left').setStyle(showValues=False)
+        plt3.getAxis('left').setTicks([])
+
+        # set colors
+        plt1.getAxis('left').setPen(pg.mkPen(color=(50, 50, 50)))
+        plt2.getAxis('left').setPen(pg.mkPen(color=(50, 50, 50)))
+        plt2.getAxis('bottom').setPen(pg.mkPen(color=(50, 50, 50)))
+        plt3.getAxis('left').setPen(pg.mkPen(color=(50, 50, 50)))
 
     def load_stimuli(self):
-        """Loads stimuli signals (speaker audio)."""
+        """
+        Loads stimuli signals (speaker audio), and starts computing their
+        min/max overviews in the background. Stimuli are shown once their
+        overview is ready.
+        """
+        self.stop_stim_builder()
         self.nStim = len(self.nwb.stimulus)
         self.stimList = list(self.nwb.stimulus.keys())
-        self.stimX = []
         self.stimY = {}
+        self.stim_overviews = {}    # min/max pyramids, filled on the GUI thread
         self.parent.combo4.clear()
         for stim in self.stimList:
             self.parent.combo4.addItem(stim)   # add stimulus name to dropdown button
-            dt_stim = 1. / self.nwb.stimulus[stim].rate
-            nb_stim = self.nwb.stimulus[stim].data.shape[0]
-            self.stimX = np.linspace(dt_stim, nb_stim * dt_stim, nb_stim)
             self.stimY[stim] = self.nwb.stimulus[stim].data
+        if len(self.stimList) > 0:
+            self.stim_builder = StimOverviewBuilder({stim: self.nwb.stimulus[stim] for stim in self.stimList})
+            self.stim_builder.overview_ready.connect(self.stim_overview_ready)
+            self.stim_builder.start()
         else:
             self.disp_audio = 0
 
+    def set_source(self, source, data=None):
+        """
+        Sets the time series shown in the signals plot.
+
+        Parameters
+        ----------
+        source : ElectricalSeries
+            Raw, preprocessed or high gamma signals.
+        data : dataset-like
+            Shown instead of source.data, with the same dimensions, e.g. a
+            PreprocessedPreview of the source.
+        """
+        self.source = source
+        self.plotData = self.source.data if data is None else data
+        self.heatmap = False
+        self.fs_signal = self.source.rate      # sampling frequency [Hz]
+        self.tbin_signal = 1 / self.fs_signal  # time bin duration [seconds]
+        self.nBins = self.plotData.shape[0]     # total number of bins
+        self.follower = LiveFollower(self.plotData)
+        self.update_channel_maps()
+        self.load_lod_pyramid()
+
+    def set_decomposition(self, source, band=None):
+        """
+        Browses a decomposition, one band at a time or all bands as a
+        heatmap.
+
+        Parameters
+        ----------
+        source : DecompositionSeries
+            Spectral decomposition, with data dimensions (nSamples,
+            nChannels, nBands). Its electrodes and rate are the ones of its
+            source_timeseries.
+        band : int or None
+            Index of the band to show as traces. 'None' for the heatmap of
+            all bands.
+        """
+        if self.decomposition is None or self.decomposition.data is not source.data:
+            self.decomposition = DecompositionBands(source.data)
+        self.set_source(source.source_timeseries, data=self.decomposition.band(0 if band is None else band))
+        self.heatmap = band is None
+
+    def update_channel_maps(self):
+        """
+        Updates the electrode id and the bad channel flag of each channel of
+        the current source, used on every refresh.
+        """
+        all_ids = np.asarray(self.source.electrodes.table.id[:])
+        self.channel_elec_ids = all_ids[self.source.electrodes.data[:]]
+        self.bad_channels_mask = np.isin(self.channel_elec_ids, self.bad_channels_ids)
+
+    def load_lod_pyramid(self):
+        """
+        Opens the level of detail pyramid of the current plotData from its
+        sidecar file or, if there is none yet, starts building it in the
+        background. Until it is ready, windows are decimated from the data
+        and scaled by their own standard deviation.
+
+        The robust scale statistics of the channels are read from the
+        pyramid, or computed right away for recordings too short for one.
+
+        Recordings being followed keep growing, so they have neither, and
+        windows are scaled by their own standard deviation.
+        """
+        self.stop_lod_builder()
+        self.scale_stats = None
+        if self.lod is not None:
+            self.refresh_scheduler.wait()
+            self.lod.close()
+            self.lod = None
+        if self.follow:
+            return
+        if len(pyramid_factors(self.nBins)) == 0:
+            self.scale_stats = robust_scale_stats(self.plotData)
+            return
+        if not isinstance(self.plotData, h5py.Dataset):
+            return
+        self.lod = open_pyramid(self.source_path, self.plotData.name, data=self.plotData)
+        if self.lod is not None:
+            self.scale_stats = self.lod.scale_stats
+        else:
+            self.lod_builder = LODPyramidBuilder(data=self.plotData, nwb_path=self.source_path)
+            self.lod_builder.finished.connect(self.lod_pyramid_ready)
+            self.lod_builder.start()
+
+    def lod_pyramid_ready(self):
+        """Starts using the level of detail pyramid once it is built."""
+        builder = self.lod_builder
+        if builder is None or builder.data is not self.plotData or builder.pyramid is None:
+            return
+        self.lod = builder.pyramid
+        self.scale_stats = self.lod.scale_stats
+        self.lod_builder = None
+        print('Level of detail pyramid ready: ' + str(self.lod.path))
+        self.refreshScreen()
+
+    def stim_overview_ready(self, stimName):
+        """Starts showing a stimulus once its overview is computed."""
+        if self.stim_builder is None:
+            return
+        self.stim_overviews[stimName] = self.stim_builder.overviews[stimName]
+        if stimName == self.parent.combo4.currentText():
+            self.refreshScreen()
+
+    def stop_stim_builder(self):
+        """Stops computing the stimuli overviews, if it is running."""
+        if self.stim_builder is not None:
+            self.stim_builder.overview_ready.disconnect(self.stim_overview_ready)
+            self.stim_builder.cancel()
+            self.stim_builder.wait()
+            self.stim_builder = None
+
+    def stop_lod_builder(self):
+        """Stops the level of detail pyramid builder, if it is running."""
+        if self.lod_builder is not None:
+            self.lod_builder.finished.disconnect(self.lod_pyramid_ready)
+            self.lod_builder.cancel()
+            self.lod_builder.wait()
+            if self.lod_builder.pyramid is not None:
+                self.lod_builder.pyramid.close()
+            self.lod_builder = None
+
     def refresh_file(self):
         """Re-opens the current file, for when new data is included"""
+        self.refresh_scheduler.stop()
+        self.stop_lod_builder()
+        self.stop_stim_builder()
+        self.prefetcher.cancel()
+        self.tile_cache.clear()
         if hasattr(self, 'io'):
             self.io.close()   # closes current NWB file
 
-        self.io = pynwb.NWBHDF5IO(str(self.source_path), 'r+', load_namespaces=True)
+        self.io = self.open_io()
         self.nwb = self.io.read()      # reads NWB file
 
         # Searches for signal source on file
@@ -224,33 +484,213 @@ class TimeSeriesPlotter:
             self.parent.combo3.setCurrentIndex(self.parent.combo3.findText('high gamma'))
         except:
             None
-        self.plotData = self.source.data
-        self.fs_signal = self.source.rate      # sampling frequency [Hz]
-        self.tbin_signal = 1 / self.fs_signal  # time bin duration [seconds]
-        self.nBins = self.source.data.shape[0]     # total number of bins
+        self.electrodes_table = self.source.electrodes.table   # of the re-opened file
+        self.set_source(self.source)
         self.load_stimuli()  # load stimuli signals (audio)
         self.updateCurXAxisPosition()
 
+    def ensure_writable(self):
+        """
+        Re-opens the file in 'r+' mode if it is open read-only, e.g. opened
+        ahead by the BlockPreopener, before a tool writes to it. Files being
+        followed stay read-only.
+        """
+        if self.io.mode == 'r' and not self.follow:
+            self.refresh_file()
+
+    def follow_poll(self):
+        """
+        Extends the timeline with the samples appended to the file since the
+        last poll. If the window was showing the newest samples, it is moved
+        to the new end, so that the signals are drawn at most LIVE_POLL_MS
+        plus one refresh after being written.
+        """
+        n_samples = self.follower.poll()
+        if n_samples is None:
+            return
+        at_end = self.intervalEndSamples >= self.nBins - self.min_window_bins
+        self.nBins = n_samples
+        if at_end:
+            self.intervalStartSamples = max(self.nBins - self.intervalLengthSamples, 0)
+            self.time_scroll(scroll=0)
+        else:
+            self.refreshScreen()    # timeline only
+
     def refreshScreen(self):
-        """Re-draws all plots"""
-        self.TimeSeries_plotter()
-
-    def TimeSeries_plotter(self):
-        """Plots time series signals"""
-        startSamp = self.intervalStartSamples
-        endSamp = self.intervalEndSamples
-
-        # Bins to plot - subsample for too big arrays
-        maxBins = 1000
-        ratio_to_max = (endSamp - startSamp) / maxBins
-        if ratio_to_max > 1:
-            bins_to_plot = np.linspace(startSamp, endSamp, maxBins, dtype='int')
+        """
+        Re-draws all plots. Requests are coalesced and the data is loaded in
+        the background, see RefreshScheduler.
+        """
+        self.refresh_scheduler.request()
+
+    def window_state(self):
+        """
+        Snapshot of what has to be shown, taken on the GUI thread, with all
+        load_window() needs.
+        """
+        stimName = self.parent.combo4.currentText()
+        return {
+            'start': self.intervalStartSamples,
+            'stop': self.intervalEndSamples,
+            'channels': np.array(self.selectedChannels),
+            # Number of bins to plot - one min/max pair per pixel of the plot width
+            'n_bins': max(int(self.parent.win1.getViewBox().width()), self.min_plot_bins),
+            'data': self.plotData,
+            'lod': self.lod,
+            # Scale statistics, 'None' to scale by the std of the window
+            'scale_stats': None if self.per_window_scale else self.scale_stats,
+            'stim': stimName if stimName in self.stimY else None,
+            'heatmap': self.decomposition if self.heatmap else None,
+        }
+
+    def load_window(self, state, superseded=None):
+        """
+        Reads and decimates the data of a window. It does not touch the GUI,
+        so it can run in a background thread.
+
+        Parameters
+        ----------
+        state : dict
+            Window to load, from window_state().
+        superseded : callable
+            Returns True if the window is not needed anymore, in which case
+            loading is abandoned.
+
+        Returns
+        -------
+        frame : dict or None
+            Decimated data to draw with TimeSeries_plotter(), or 'None' if
+            loading was abandoned.
+        """
+        startSamp, endSamp = state['start'], state['stop']
+        channels = state['channels']
+        maxBins = state['n_bins']
+        # Frame timings, when profiling
+        record = None
+        if self.profiler is not None:
+            record = self.profiler.new_frame(file=self.source_path.name,
+                                             dataset=getattr(state['data'], 'name', ''),
+                                             start=startSamp, stop=endSamp,
+                                             n_channels=len(channels), n_bins=maxBins)
+        phase = FrameProfiler.phase
+
+        # Zoomed-out windows are read from the level of detail pyramid, if ready
+        factor = None
+        lod = state['lod']
+        if lod is not None:
+            factor = lod.level_for(endSamp - startSamp, maxBins)
+        if state['heatmap'] is not None:
+            # All bands, each through the tile cache
+            bands = state['heatmap']
+            with phase(record, 'read'):
+                power = np.stack([self.tile_cache.get(bands.band(i), startSamp, endSamp, channels)
+                                  for i in range(bands.n_bands)], axis=2)
+            if superseded is not None and superseded():
+                return None
+            with phase(record, 'decimate'):
+                bin_size, image = band_power_image(power, n_bins=maxBins)
+            bins_to_plot = np.array([startSamp, startSamp + image.shape[0] * bin_size])
+            data, means, scaleFac = image, None, None
+        elif factor is not None:
+            with phase(record, 'read'):
+                offset, (mins, maxs, means) = lod.read(factor, startSamp, endSamp, channels,
+                                                       stats=('min', 'max', 'mean'))
+            with phase(record, 'decimate'):
+                bins_to_plot, data = interleave_minmax(mins, maxs, factor, offset)
+            with phase(record, 'std'):
+                means = np.reshape(np.mean(means, 0), (-1, 1))
+                if state['scale_stats'] is None:
+                    scaleFac = 2 * np.std(data, axis=0)
         else:
-            bins_to_plot = np.arange(startSamp, endSamp, dtype='int')
+            # Single read of the window, through the tile cache
+            with phase(record, 'read'):
+                data = self.tile_cache.get(state['data'], startSamp, endSamp, channels)
+            # Load the windows likely to be shown next in the background
+            self.prefetcher.navigate(state['data'], startSamp, endSamp, channels)
+            if superseded is not None and superseded():
+                return None
+            with phase(record, 'std'):
+                means = np.reshape(np.mean(data, 0), (-1, 1))  # to align each trace around its reference trace
+                if state['scale_stats'] is None:
+                    scaleFac = 2 * np.std(data, axis=0)
+            # min/max decimation for too big arrays, keeps peaks and artifacts visible
+            with phase(record, 'decimate'):
+                bins_to_plot, data = minmax_decimate(data, n_bins=maxBins, offset=startSamp)
+        if state['scale_stats'] is not None and state['heatmap'] is None:
+            # Stable scaling, from the robust statistics of the whole recording
+            scaleFac = 2 * robust_sigma(state['scale_stats'])[channels]
+        timebaseGuiUnits = bins_to_plot * self.tbin_signal
+        frame = {'channels': channels, 'x': timebaseGuiUnits, 'data': data.T,
+                 'means': means, 'scale': scaleFac, 'stim': None, 'record': record,
+                 'heatmap': state['heatmap'] is not None}
+
+        # Stimuli, once their overview is computed, see load_stimuli()
+        overview = self.stim_overviews.get(state['stim'])
+        if overview is not None:
+            with phase(record, 'stim_load'):
+                x, y = overview.window(timebaseGuiUnits[0], timebaseGuiUnits[-1], maxBins)
+            frame['stim'] = (x, y, overview.min, overview.max)
+        if record is not None:
+            record['lod_factor'] = factor or 1
+            record['load_total'] = 1000 * (time.perf_counter() - record['t0'])
+        return frame
+
+    def TimeSeries_plotter(self, frame=None):
+        """
+        Plots time series signals.
+
+        Parameters
+        ----------
+        frame : dict
+            Data loaded by load_window(). If 'None', the current window is
+            loaded first, on the calling thread.
+        """
+        if frame is None:
+            frame = self.load_window(self.window_state())
+        record = frame['record']
+        phase = FrameProfiler.phase
+        with phase(record, 'paint_total'):
+            with phase(record, 'curves'):
+                if frame['heatmap']:
+                    scale_va, timebaseGuiUnits = self.plot_heatmap(frame)
+                else:
+                    scale_va, timebaseGuiUnits = self.plot_signals(frame)
+            with phase(record, 'intervals'):
+                self.plot_intervals(timebaseGuiUnits)
+            with phase(record, 'annotations'):
+                self.update_annotation_items(timebaseGuiUnits[0], timebaseGuiUnits[-1], scale_va)
+            with phase(record, 'stim_paint'):
+                self.plot_stimuli(frame)
+        if record is not None and self.profiler is not None:
+            # Paint the plots right away, to time it
+            with phase(record, 'qt_paint'):
+                for plt in [self.parent.win1, self.parent.win2, self.parent.win3]:
+                    plt.viewport().repaint()
+            requested = self.refresh_scheduler.requested_at
+            latency = None if requested is None else time.perf_counter() - requested
+            self.profiler.end_frame(record, latency=latency)
+            self.update_profiler_overlay()
+
+    def plot_signals(self, frame):
+        """
+        Draws the signals of a loaded frame on the middle plot.
+
+        Returns
+        -------
+        scale_va : float
+            Scale of the variance units, for annotations.
+        timebaseGuiUnits : array
+            Time of the plotted points.
+        """
+        data = frame['data']
+        means = frame['means']
+        scaleFac = frame['scale']
+        selectedChannels = frame['channels']
+        timebaseGuiUnits = frame['x']
 
         # Use the same scaling factor for all channels, to keep things comparable
         self.verticalScaleFactor = float(self.parent.qline4.text())
-        scaleFac = 2 * np.std(self.plotData[startSamp:endSamp, self.selectedChannels - 1], axis=0) / self.verticalScaleFactor
+        scaleFac = scaleFac / self.verticalScaleFactor
 
         # Scale variance_units, offset for each channel
         scale_va = np.max(scaleFac)
@@ -259,123 +699,193 @@ class TimeSeriesPlotter:
         scaleV = np.zeros([len(self.scaleVec), 1])
         scaleV[:, 0] = self.scaleVec
 
-        # constrains the plotData to the chosen interval (and transpose matix)
         # plotData dims=[self.nChToShow, plotInterval]
-        data = self.plotData[startSamp:endSamp, self.selectedChannels].T
-        data = data[:, bins_to_plot - startSamp - 1]
-        means = np.reshape(np.mean(data, 1), (-1, 1))  # to align each trace around its reference trace
         plotData = data + scaleV - means  # data + offset
 
         # Middle signals plot
         # A line indicating reference for every channel
-        timebaseGuiUnits = bins_to_plot * self.tbin_signal
-        # timebaseGuiUnits = np.arange(startSamp, endSamp)*self.tbin_signal
         plt2 = self.parent.win1  # middle signal plot
-        plt2.clear()
-        # Channels reference lines
-        for l in range(len(self.scaleVec)):
-            plt2.plot([timebaseGuiUnits[0], timebaseGuiUnits[-1]],
-                      [self.scaleVec[l], self.scaleVec[l]],
-                      pen='k')
-
-        # Iterate over chosen channels, plot one at a time
+        self.heatmap_item.setVisible(False)
+        # Channels reference lines, drawn as a single item
+        ref_x = np.tile([timebaseGuiUnits[0], timebaseGuiUnits[-1]], len(self.scaleVec))
+        ref_y = np.repeat(self.scaleVec, 2)
+        self.ref_lines.setData(ref_x, ref_y)
+
+        # Colour class of each chosen channel
         nrows, ncols = np.shape(plotData)
+        pen_keys = np.array(['even', 'odd'] * (nrows // 2 + 1))[:nrows]
+        pen_keys[self.bad_channels_mask[selectedChannels]] = 'bad'
+
+        if self.single_path:
+            # All channels drawn by one item, as one path per colour
+            nrows = 0
+            self.trace_item.setData(timebaseGuiUnits, plotData, pen_keys)
+        else:
+            self.trace_item.setData(None, None, None)
+
+        # Update the persistent curves, one per chosen channel
+        while len(self.curves) < nrows:
+            curve = pg.PlotDataItem(pen=self.pens['even'])
+            curve.pen_key = 'even'
+            plt2.addItem(curve)
+            self.curves.append(curve)
+        while len(self.curves) > nrows:
+            plt2.removeItem(self.curves.pop())
         for i in range(nrows):
-            elec_index = self.source.electrodes[int(self.selectedChannels[i])].index[0]
-            if elec_index in self.bad_channels_ids:
-                plt2.plot(timebaseGuiUnits, plotData[i], pen=pg.mkPen((220, 0, 0), width=1.2))
-            else:
-                c = pg.mkPen((0, 120, 0), width=1.2)
-                if i % 2 == 0:
-                    c = pg.mkPen((0, 0, 200), width=1.2)
-                plt2.plot(timebaseGuiUnits, plotData[i], pen=c)
-        plt2.setLabel('bottom', 'Time', units='sec')
-        plt2.setLabel('left', 'Channel #')
-        labels = [str(self.electrical_series_channel_ids[ch]) for ch in self.selectedChannels]
+            pen_key = pen_keys[i]
+            curve = self.curves[i]
+            if curve.pen_key != pen_key:
+                curve.setPen(self.pens[pen_key])
+                curve.pen_key = pen_key
+            curve.setData(timebaseGuiUnits, plotData[i])
+        labels = self.channel_elec_ids[selectedChannels].astype('str')
         ticks = list(zip(self.scaleVec, labels))
         plt2.getAxis('left').setTicks([ticks])
         plt2.setXRange(timebaseGuiUnits[0], timebaseGuiUnits[-1], padding=0.003)
         plt2.setYRange(self.scaleVec[0], self.scaleVec[-1], padding=0.06)
-        plt2.getAxis('left').setWidth(w=53)
 
+        return scale_va, timebaseGuiUnits
+
+    def plot_heatmap(self, frame):
+        """
+        Draws the band power heatmap of a loaded frame on the middle plot,
+        each channel as a row of bands centered on its tick.
+
+        Returns
+        -------
+        scale_va : float
+            Scale of the variance units, for annotations.
+        timebaseGuiUnits : array
+            Time limits of the heatmap.
+        """
+        image = frame['data'].T      # (nBins, nChannels * nBands)
+        selectedChannels = frame['channels']
+        timebaseGuiUnits = frame['x']
+        plt2 = self.parent.win1
+        self.scaleVec = np.arange(1, self.nChToShow + 1).astype('float')
+
+        # Traces hidden while the heatmap is shown
+        self.ref_lines.setData([], [])
+        self.trace_item.setData(None, None, None)
+        while len(self.curves) > 0:
+            plt2.removeItem(self.curves.pop())
+
+        self.heatmap_item.setImage(image, levels=(-2, 2), autoLevels=False)
+        self.heatmap_item.setRect(QtCore.QRectF(timebaseGuiUnits[0], 0.5,
+                                                timebaseGuiUnits[-1] - timebaseGuiUnits[0],
+                                                len(selectedChannels)))
+        self.heatmap_item.setVisible(True)
+        labels = self.channel_elec_ids[selectedChannels].astype('str')
+        ticks = list(zip(self.scaleVec, labels))
+        plt2.getAxis('left').setTicks([ticks])
+        plt2.setXRange(timebaseGuiUnits[0], timebaseGuiUnits[-1], padding=0.003)
+        plt2.setYRange(0.5, len(selectedChannels) + 0.5, padding=0.01)
+        return 1., timebaseGuiUnits
+
+    def plot_intervals(self, timebaseGuiUnits):
+        """Draws the intervals in view, the timeline and the visualization window rectangle."""
         # Show Intervals
-        for i in range(len(self.IntRects2)):
-            plt2.removeItem(self.IntRects2[i])
-        for i in range(len(self.IntRects2)):
-            plt2.addItem(self.IntRects2[i])
-
-        # Show Annotations
-        for i in range(len(self.AnnotationsList)):
-            plt2.removeItem(self.AnnotationsList[i])
-        for i in range(len(self.AnnotationsList)):
-            aux = self.AnnotationsList[i].pg_item
-            x = self.AnnotationsPosAV[i, 0]
-            # Y to plot = (Y_va + Channel offset)*scale_variance
-            y_va = self.AnnotationsPosAV[i, 1]
-            y = (y_va + self.AnnotationsPosAV[i, 2] - self.firstCh) * scale_va
-            aux.setPos(x, y)
-            plt2.addItem(aux)
+        self.update_interval_items(timebaseGuiUnits[0], timebaseGuiUnits[-1])
 
         # Upper horizontal bar
         plt1 = self.parent.win2
-        plt1.clear()
         max_dur = self.nBins * self.tbin_signal
-        plt1.plot([0, max_dur], [0, 0], pen=pg.mkPen('k', width=2))
+        self.timeline.setData([0, max_dur], [0, 0])
         plt1.setXRange(0, max_dur)
         plt1.setYRange(-1, 1)
 
-        if self.current_rect != []:
-            plt1.removeItem(self.current_rect)
+        # Intervals coverage
+        n_bins = max(int(plt1.getViewBox().width()), self.min_plot_bins)
+        self.update_interval_coverage(max_dur, n_bins)
 
         # Rectangle Plot
         x = float(self.parent.qline2.text())
         w = float(self.parent.qline3.text())
-        self.current_rect = CustomBox(self, x, -1000, w, 2000)
-        self.current_rect.setPen(pg.mkPen(color=(0, 0, 0, 50)))
-        self.current_rect.setBrush(QtGui.QColor(0, 0, 0, 50))
-        self.current_rect.setFlags(QtGui.QGraphicsItem.ItemIsMovable)
-        plt1.addItem(self.current_rect)
-        plt1.setLabel('left', 'Span')
-        plt1.getAxis('left').setWidth(w=53)
-        plt1.getAxis('left').setStyle(showValues=False)
-        plt1.getAxis('left').setTicks([])
-
-        # Show Intervals
-        for i in range(len(self.IntRects1)):
-            plt1.removeItem(self.IntRects1[i])
-        for i in range(len(self.IntRects1)):
-            plt1.addItem(self.IntRects1[i])
+        self.current_rect.setPos(0, 0)
+        self.current_rect.setRect(x, -1000, w, 2000)
 
+    def plot_stimuli(self, frame):
+        """Draws the stimulus of a loaded frame on the bottom plot."""
         # Bottom plot - Stimuli
         plt3 = self.parent.win3
-        plt3.clear()
-        stimData = None
-        if self.parent.combo4.currentText() != '':
-            try:
-                xmask = (self.stimX > timebaseGuiUnits[0]) * (self.stimX < timebaseGuiUnits[-1])
-                stimName = self.parent.combo4.currentText()
-                stimData = self.stimY[stimName]
-                plt3.plot(self.stimX[xmask], stimData[xmask], pen='k', width=1)
-                plt3.setYRange(np.min(stimData), np.max(stimData))
-                plt3.setXLink(plt2)
-            except:  # THIS IS MOMENTARY TO PLOT ARTIFICIAL DATA-- REMOVE LATER
-                stimName = self.parent.combo4.currentText()
-                stimData = self.stimY[stimName]
-                plt3.plot(stimData, pen='k', width=1)
-                # remove this later -------------------------------------------
-
-        if stimData is not None:
-            plt3.setYRange(np.min(stimData), np.max(stimData))
-        plt3.setLabel('left', 'Stim')
-        plt3.getAxis('left').setWidth(w=53)
-        plt3.getAxis('left').setStyle(showValues=False)
-        plt3.getAxis('left').setTicks([])
+        if frame['stim'] is not None:
+            x, y, stim_min, stim_max = frame['stim']
+            self.stim_curve.setData(x, y)
+            plt3.setYRange(stim_min, stim_max)
+        else:
+            self.stim_curve.clear()
 
-        # set colors
-        plt1.getAxis('left').setPen(pg.mkPen(color=(50, 50, 50)))
-        plt2.getAxis('left').setPen(pg.mkPen(color=(50, 50, 50)))
-        plt2.getAxis('bottom').setPen(pg.mkPen(color=(50, 50, 50)))
-        plt3.getAxis('left').setPen(pg.mkPen(color=(50, 50, 50)))
+    def set_profiling(self, enabled):
+        """
+        Turns the frame profiler on or off. Frame timings are logged to
+        '~/.ecogvis/frames.csv', see FrameProfiler.
+        """
+        if enabled and self.profiler is None:
+            self.profiler = FrameProfiler()
+            print('Logging frame timings to ' + str(self.profiler.log_path))
+        elif not enabled:
+            self.profiler = None
+        self.profiler_overlay.setVisible(enabled)
+        self.refreshScreen()
+
+    def update_profiler_overlay(self):
+        """Shows the frame rate and mean times of the last frames."""
+        summary = self.profiler.summary()
+        text = '{:.1f} fps | latency {:.0f} ms | load {:.0f} ms | draw {:.0f} ms | paint {:.0f} ms'.format(
+            summary['fps'], summary['latency'], summary['load_total'],
+            summary['paint_total'], summary['qt_paint'])
+        stats = self.tile_cache.chunk_stats(self.plotData)
+        if stats is not None and stats.hits + stats.misses > 0:
+            text += ' | chunk cache {:.0f}% (estimated)'.format(100 * stats.hit_rate())
+        self.profiler_overlay.setText(text)
+
+    def update_interval_items(self, t0, t1):
+        """Shows the intervals overlapping [t0, t1] on the signals plot."""
+        visible = self.intervals.overlapping(t0, t1)
+        starts = self.intervals.column('starts')[visible]
+        stops = self.intervals.column('stops')[visible]
+        colors = self.intervals.column('colors')[visible]
+        while len(self.interval_rects) < len(visible):
+            c = pg.QtGui.QGraphicsRectItem(0, -1, 0.01, 2)
+            c.setZValue(1)
+            c.color = None
+            self.parent.win1.addItem(c)
+            self.interval_rects.append(c)
+        for c, start, stop, color in zip(self.interval_rects, starts, stops, colors):
+            c.setRect(start, -1, max(stop - start, 0.01), 2)
+            if c.color != color:
+                c.setPen(self.interval_pens[color])
+                c.setBrush(self.interval_brushes[color])
+                c.color = color
+            c.setVisible(True)
+        for c in self.interval_rects[len(visible):]:
+            c.setVisible(False)
+
+    def update_interval_coverage(self, max_dur, n_bins):
+        """
+        Shows on the timeline which of n_bins equal bins are covered by
+        intervals, one bar per run of covered bins and color. Only updated
+        when intervals change.
+        """
+        key = (self.intervals.version, max_dur, n_bins)
+        if key == self.coverage_key:
+            return
+        self.coverage_key = key
+        dt = max_dur / n_bins
+        colors = self.intervals.column('colors')
+        for color in interval_colors:
+            covered = self.intervals.coverage(max_dur, n_bins, indices=np.where(colors == color)[0])
+            edges = np.diff(np.concatenate(([0], covered.astype('int'), [0])))
+            run_starts = np.where(edges == 1)[0]
+            run_stops = np.where(edges == -1)[0]
+            if color not in self.coverage_bars:
+                bars = pg.BarGraphItem(x0=[], width=[], y0=-1, height=2,
+                                       pen=self.interval_pens[color],
+                                       brush=self.interval_brushes[color])
+                bars.setZValue(1)
+                self.parent.win2.addItem(bars)
+                self.coverage_bars[color] = bars
+            self.coverage_bars[color].setOpts(x0=run_starts * dt, width=(run_stops - run_starts) * dt)
 
     def drag_window(self, dt):
         """Updates upper visualization window position when dragged by the user."""
@@ -526,35 +1036,10 @@ class TimeSeriesPlotter:
         text : str
             Annotation text
         """
-        if color == 'yellow':
-            bgcolor = pg.mkBrush(250, 250, 150, 200)
-        elif color == 'red':
-            bgcolor = pg.mkBrush(250, 0, 0, 200)
-        elif color == 'green':
-            bgcolor = pg.mkBrush(0, 255, 0, 200)
-        elif color == 'blue':
-            bgcolor = pg.mkBrush(0, 0, 255, 200)
-        c = pg.TextItem(anchor=(.5, .5), border=pg.mkPen(100, 100, 100), fill=bgcolor)
-        c.setText(text=text, color=(0, 0, 0))
         # Y coordinate transformed to variance_units (for plot control)
         y_va = np.round(y / self.scaleVec[0]).astype('int')
-        c.setPos(x, y_va)
-        # create annotation object and add it to the list
-        obj = CustomAnnotation()
-        obj.pg_item = c
-        obj.x = x
-        obj.y_va = y_va
-        obj.y_off = self.firstCh
-        obj.color = color
-        obj.text = text
-        obj.session = self.parent.current_session
-        self.AnnotationsList = np.append(self.AnnotationsList, obj)
-        # List of positions (to calculate distances)
-        if len(self.AnnotationsPosAV) > 0:
-            self.AnnotationsPosAV = np.concatenate((self.AnnotationsPosAV,
-                                                    np.array([x, y_va, self.firstCh]).reshape(1, 3)))
-        else:
-            self.AnnotationsPosAV = np.array([x, y_va, self.firstCh]).reshape(1, 3)
+        self.annotations.add(x=x, y_va=y_va, y_off=self.firstCh, color=color, text=text,
+                             session=self.parent.current_session)
         self.refreshScreen()
         self.unsaved_changes_annotation = True
 
@@ -569,19 +1054,18 @@ class TimeSeriesPlotter:
         y : float
             y position
         """
-        x_ann = self.AnnotationsPosAV[:, 0]
-        y_ann = np.round((self.AnnotationsPosAV[:, 1] + self.AnnotationsPosAV[:, 2] - self.firstCh) * self.scaleVec[0])
-        # Calculates euclidian distance from click
-        euclid_dist = np.sqrt((x_ann - x)**2 + (y_ann - y)**2)
-        indmin = np.argmin(euclid_dist)
+        indmin = self.annotations.nearest(x=x, y=y, t0=self.intervalStartGuiUnits,
+                                          t1=self.intervalStartGuiUnits + self.intervalLengthGuiUnits,
+                                          first_ch=self.firstCh, scale=self.scaleVec[0])
+        if indmin is None:
+            return
         # Checks if user intends to delete annotation
-        text = self.AnnotationsList[indmin].text
+        text = self.annotations.column('texts')[indmin]
         buttonReply = QMessageBox.question(None,
                                            'Delete Annotation', "Delete the annotation: \n\n" + text + ' ?',
                                            QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if buttonReply == QMessageBox.Yes:
-            self.AnnotationsList = np.delete(self.AnnotationsList, indmin, axis=0)
-            self.AnnotationsPosAV = np.delete(self.AnnotationsPosAV, indmin, axis=0)
+            self.annotations.remove([indmin])
             self.refreshScreen()
             self.unsaved_changes_annotation = True
 
@@ -590,13 +1074,14 @@ class TimeSeriesPlotter:
         buttonReply = QMessageBox.question(None, ' ', 'Save annotations on external file?',
                                            QMessageBox.No | QMessageBox.Yes)
         if buttonReply == QMessageBox.Yes:
-            c0 = self.AnnotationsPosAV[:, 0]     # x
-            c1 = self.AnnotationsPosAV[:, 1]     # y_va
-            c2 = self.AnnotationsPosAV[:, 2]     # y_off
-            c3 = [self.AnnotationsList[i].color for i in range(len(self.AnnotationsList))]
-            c4 = [self.AnnotationsList[i].text for i in range(len(self.AnnotationsList))]
-            c5 = [self.AnnotationsList[i].session for i in range(len(self.AnnotationsList))]
-            d = {'x': c0, 'y_va': c1, 'y_off': c2, 'color': c3, 'text': c4, 'session': c5}
+            d = {
+                'x': self.annotations.column('x'),
+                'y_va': self.annotations.column('y_va'),
+                'y_off': self.annotations.column('y_off'),
+                'color': self.annotations.column('colors'),
+                'text': self.annotations.column('texts'),
+                'session': self.annotations.column('sessions'),
+            }
             df = pd.DataFrame(data=d)
             fullfile = os.path.join('annotations_' +
                                     datetime.datetime.today().strftime('%Y-%m-%d') +
@@ -607,43 +1092,34 @@ class TimeSeriesPlotter:
     def AnnotationLoad(self, fname=''):
         """Loads annotations from an external CSV file."""
         df = pd.read_csv(fname)
-        all_x = df['x'].values
-        all_y_va = df['y_va'].values
-        all_y_off = df['y_off'].values
-        texts = df['text'].tolist()
-        colors = df['color'].tolist()
-        session = df['session'].tolist()
-        for i, txt in enumerate(texts):    # Add loaded annotations to graph
-            if colors[i] == 'yellow':
-                bgcolor = pg.mkBrush(250, 250, 150, 200)
-            elif colors[i] == 'red':
-                bgcolor = pg.mkBrush(250, 0, 0, 200)
-            elif colors[i] == 'green':
-                bgcolor = pg.mkBrush(0, 255, 0, 200)
-            elif colors[i] == 'blue':
-                bgcolor = pg.mkBrush(0, 0, 255, 200)
-            c = pg.TextItem(anchor=(.5, .5), border=pg.mkPen(100, 100, 100), fill=bgcolor)
-            c.setText(text=txt, color=(0, 0, 0))
-            # Y coordinate transformed to variance_units (for plot control)
-            y_va = all_y_va[i]
-            x = all_x[i]
-            c.setPos(x, y_va)
-            obj = CustomAnnotation()
-            obj.pg_item = c
-            obj.x = all_x[i]
-            obj.y_va = all_y_va[i]
-            obj.y_off = all_y_off[i]
-            obj.color = colors[i]
-            obj.text = txt
-            obj.session = session[i]
-            self.AnnotationsList.append(obj)
-            if len(self.AnnotationsPosAV) > 0:
-                self.AnnotationsPosAV = np.concatenate((self.AnnotationsPosAV,
-                                                        np.array([x, y_va, all_y_off[i]]).reshape(1, 3)))
-            else:
-                self.AnnotationsPosAV = np.array([x, y_va, all_y_off[i]]).reshape(1, 3)
+        # Add loaded annotations to graph
+        self.annotations.extend(x=df['x'].values, y_va=df['y_va'].values, y_off=df['y_off'].values,
+                                colors=df['color'].values, texts=df['text'].values,
+                                sessions=df['session'].values)
         self.refreshScreen()
 
+    def update_annotation_items(self, t0, t1, scale_va):
+        """
+        Shows the annotations in [t0, t1] on the signals plot. Graphics items
+        are only created for annotations in view, and removed when they
+        leave it.
+        """
+        visible = self.annotations.visible(t0, t1)
+        ids = self.annotations.column('ids')[visible]
+        for id in set(self.annotation_items) - set(ids):
+            self.parent.win1.removeItem(self.annotation_items.pop(id))
+        # Y to plot = (Y_va + Channel offset)*scale_variance
+        ys = self.annotations.plot_y(visible, self.firstCh, scale_va)
+        for i, id, y in zip(visible, ids, ys):
+            if id not in self.annotation_items:
+                bgcolor = pg.mkBrush(*annotation_colors[self.annotations.colors[i]])
+                c = pg.TextItem(anchor=(.5, .5), border=pg.mkPen(100, 100, 100), fill=bgcolor)
+                c.setText(text=self.annotations.texts[i], color=(0, 0, 0))
+                c.setZValue(2)
+                self.parent.win1.addItem(c)
+                self.annotation_items[id] = c
+            self.annotation_items[id].setPos(self.annotations.x[i], y)
+
     # Interval functions ------------------------------------------------------
     def IntervalAdd(self, interval, int_type, color, session):
         """
@@ -660,70 +1136,38 @@ class TimeSeriesPlotter:
         session : str
             Session name.
         """
-        if color == 'yellow':
-            bc = [250, 250, 150, 180]
-        elif color == 'red':
-            bc = [250, 0, 0, 100]
-        elif color == 'green':
-            bc = [0, 255, 0, 130]
-        elif color == 'blue':
-            bc = [0, 0, 255, 100]
-        x = interval[0]
-        w = np.diff(np.array(interval))[0]
-        # add rectangle to upper plot
-        c = pg.QtGui.QGraphicsRectItem(x, -1, w, 2)
-        c.setPen(pg.mkPen(color=QtGui.QColor(bc[0], bc[1], bc[2], 255)))
-        c.setBrush(QtGui.QColor(bc[0], bc[1], bc[2], bc[3]))
-        self.IntRects1 = np.append(self.IntRects1, [c])
-        # add rectangle to middle signal plot
-        c = pg.QtGui.QGraphicsRectItem(x, -1, w, 2)
-        c.setPen(pg.mkPen(color=QtGui.QColor(bc[0], bc[1], bc[2], 255)))
-        c.setBrush(QtGui.QColor(bc[0], bc[1], bc[2], bc[3]))
-        self.IntRects2 = np.append(self.IntRects2, [c])
-        # new Interval object
-        obj = CustomInterval()
-        obj.start = interval[0]
-        obj.stop = interval[1]
-        obj.type = int_type
-        obj.color = color
-        obj.session = session
-        self.allIntervals.append(obj)
-        self.nBI = len(self.allIntervals)
+        self.intervals.add(interval[0], interval[1], int_type, color, session)
+        self.nBI = len(self.intervals)
         self.unsaved_changes_interval = True
 
     def IntervalDel(self, x):
         """
-        Deletes from plot scene the interval passing by the x position.
+        Deletes from plot scene the intervals passing by the x position.
 
         Parameters
         ----------
         x : float
             x position.
         """
-        for i, obj in enumerate(self.allIntervals):
-            if (x >= obj.start) & (x <= obj.stop):   # interval of the click
-                self.parent.win2.removeItem(self.IntRects1[i])
-                self.IntRects1 = np.delete(self.IntRects1, i, axis=0)
-                self.parent.win1.removeItem(self.IntRects2[i])
-                self.IntRects2 = np.delete(self.IntRects2, i, axis=0)
-                del self.allIntervals[i]
-                self.nBI = len(self.allIntervals)
-                self.refreshScreen()
-                self.unsaved_changes_interval = True
+        clicked = self.intervals.containing(x)
+        if len(clicked) > 0:
+            self.intervals.remove(clicked)
+            self.nBI = len(self.intervals)
+            self.refreshScreen()
+            self.unsaved_changes_interval = True
 
     def IntervalSave(self):
         """Saves intervals in an external CSV file."""
         buttonReply = QMessageBox.question(None, ' ', 'Save intervals on external file?',
                                            QMessageBox.No | QMessageBox.Yes)
         if buttonReply == QMessageBox.Yes:
-            c0, c1, c2, c3, c4 = [], [], [], [], []
-            for i, obj in enumerate(self.allIntervals):
-                c0.append(obj.start)     # start
-                c1.append(obj.stop)      # stop
-                c2.append(obj.type)      # type
-                c3.append(obj.color)     # color
-                c4.append(obj.session)   # session
-            d = {'start': c0, 'stop': c1, 'type': c2, 'color': c3, 'session': c4}
+            d = {
+                'start': self.intervals.column('starts'),
+                'stop': self.intervals.column('stops'),
+                'type': self.intervals.column('types'),
+                'color': self.intervals.column('colors'),
+                'session': self.intervals.column('sessions'),
+            }
             df = pd.DataFrame(data=d)
             fullfile = os.path.join('intervals_' +
                                     datetime.datetime.today().strftime('%Y-%m-%d') +
@@ -732,17 +1176,24 @@ class TimeSeriesPlotter:
             self.unsaved_changes_interval = False
 
     def IntervalLoad(self, fname):
-        """Loads intervals from an external CSV file."""
+        """
+        Loads intervals from an external CSV file.
+
+        Returns
+        -------
+        types : dict
+            Type:Value pairs of the loaded interval types and their color and
+            number of intervals, as (color, count).
+        """
         df = pd.read_csv(fname)
-        for index, row in df.iterrows():    # Add loaded intervals to graph
-            interval = [row.start, row.stop]
-            int_type = row.type
-            color = row.color
-            session = row.session
-            self.IntervalAdd(interval, int_type, color, session)
-            # Update dictionary of interval types
-            # TO-DO
+        # Add loaded intervals to graph
+        self.intervals.extend(df['start'].values, df['stop'].values, df['type'].values,
+                              df['color'].values, df['session'].values)
+        self.nBI = len(self.intervals)
+        self.unsaved_changes_interval = True
         self.refreshScreen()
+        groups = df.groupby('type', sort=False)['color']
+        return {int_type: (colors.iloc[0], len(colors)) for int_type, colors in groups}
 
     def SpeakerAndMicIntervalAdd(self):
         if self.nwb.intervals is not None:
@@ -751,13 +1202,11 @@ class TimeSeriesPlotter:
             for name, color in zip(keys, colors):
                 if name in self.nwb.intervals:
                     ti = self.nwb.intervals[name]
-                    nI = len(ti)
-                    for ii in np.arange(nI):
-                        interval = [ti['start_time'][ii], ti['stop_time'][ii]]
-                        int_type = name
-                        color = color
-                        session = ''
-                        self.IntervalAdd(interval, int_type, color, session)
+                    # whole columns, one read each
+                    self.intervals.extend(ti['start_time'].data[:], ti['stop_time'].data[:],
+                                          name, color, '')
+                    self.nBI = len(self.intervals)
+                    self.unsaved_changes_interval = True
 
     # Channels functions -------------------------------------------------------
     def BadChannelAdd(self, ch_list):
@@ -769,6 +1218,7 @@ class TimeSeriesPlotter:
         ch_list : list of integers
             List of indices of channels to be marked as 'bad'.
         """
+        self.ensure_writable()
         # Update list of bad electrodes ids
         for ch in ch_list:
             if ch not in self.bad_channels_ids:
@@ -784,6 +1234,7 @@ class TimeSeriesPlotter:
         ch_list : list of integers
             List of indices of channels to be un-marked as 'bad'.
         """
+        self.ensure_writable()
         # Update list of bad electrodes ids
         for ch in ch_list:
             if ch in self.bad_channels_ids:
@@ -793,11 +1244,8 @@ class TimeSeriesPlotter:
     def update_bad_channels(self):
         """Updates list of bad channels after add or del"""
         # List of electrodes IDs
-        elecs_ids = list(self.electrodes_table.id[:])
-        is_bad_list = [False] * len(elecs_ids)
-        for i, id in enumerate(elecs_ids):
-            if id in self.bad_channels_ids:
-                is_bad_list[i] = True
+        elecs_ids = self.electrodes_table.id[:]
+        is_bad_list = np.isin(elecs_ids, self.bad_channels_ids).tolist()
 
         if 'bad' not in self.electrodes_table:
             self.electrodes_table.add_column(
@@ -807,6 +1255,7 @@ class TimeSeriesPlotter:
             )
         else:
             self.electrodes_table['bad'].data[:] = is_bad_list
+        self.bad_channels_mask = np.isin(self.channel_elec_ids, self.bad_channels_ids)
 
         # Refresh screen
         self.refreshScreen()
@@ -826,64 +1275,252 @@ class TimeSeriesPlotter:
 
     def close_nwbfile(self):
         """Close current nwbfile"""
+        self.live_timer.stop()
+        self.refresh_scheduler.stop()
+        self.stop_lod_builder()
+        self.stop_stim_builder()
+        self.prefetcher.stop()
+        self.tile_cache.clear()
+        if self.lod is not None:
+            self.lod.close()
+            self.lod = None
         if hasattr(self, 'io'):
             self.io.close()
 
 
-class CustomInterval:
+class LODPyramidBuilder(QtCore.QThread):
     """
-    Stores information about individual Intervals.
+    Builds the level of detail pyramid of a dataset in the background.
 
     Parameters
     ----------
-    start : float
-        Start time position.
-    stop : float
-        Stop time position.
-    type : str
-        Interval type (e.g. 'invalid').
-    color : str
-        Interval color: 'yellow', 'red', 'green' or 'blue'.
-    session: str
-        Session name.
+    data : h5py dataset
+        Signal with dimensions (nSamples, nChannels).
+    nwb_path : str or path
+        Path of the NWB file the data belongs to.
     """
-    def __init__(self):
-        self.start = -999
-        self.stop = -999
-        self.type = ''
-        self.color = ''
-        self.session = ''
+    def __init__(self, data, nwb_path):
+        super().__init__()
+        self.data = data
+        self.nwb_path = nwb_path
+        self.pyramid = None
+        self.cancelled = False
+
+    def run(self):
+        self.pyramid = build_pyramid(data=self.data, nwb_path=self.nwb_path,
+                                     stop=lambda: self.cancelled)
 
+    def cancel(self):
+        self.cancelled = True
 
-class CustomAnnotation:
+
+class StimOverviewBuilder(QtCore.QThread):
     """
-    Stores information about individual Annotations.
+    Computes the min/max overviews of stimuli in the background, see
+    AudioOverview. overview_ready is emitted with the name of each stimulus
+    done.
 
     Parameters
     ----------
-    pg_item :
-        pyqtgraph TextItem object.
-    x : float
-        X position (time).
-    y_va : int
-        Y coordinate transformed to variance_units (for plot control).
-    y_off : int
-        Y offset, usually the bottom channel on plot when annotation is saved.
-    color : str
-        Interval color: 'yellow', 'red', 'green' or 'blue'.
-    text : str
-        Annotation text.
-    session: str
-        Session name.
+    stimuli : dict
+        Name:Value pairs of stimulus names and TimeSeries.
     """
-    def __init__(self):
-        self.pg_item = None
-        self.x = 0
-        self.y_va = 0
-        self.y_off = 0
-        self.color = ''
-        self.text = ''
-        self.session = ''
+    overview_ready = QtCore.pyqtSignal(str)
+
+    def __init__(self, stimuli):
+        super().__init__()
+        self.stimuli = stimuli
+        self.overviews = {}
+        self.cancelled = False
+
+    def run(self):
+        for name, stim in self.stimuli.items():
+            if self.cancelled:
+                return
+            print('Computing overview of stimulus ' + name + '...')
+            self.overviews[name] = AudioOverview(stim.data, stim.rate)
+            self.overview_ready.emit(name)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class RefreshScheduler(QtCore.QObject):
+    """
+    Schedules the refreshes of the viewer. Bursts of requests (e.g. fast
+    scrolling or dragging) are coalesced into a single refresh, the data is
+    loaded in a background thread and only the latest requested state is
+    painted: loads superseded by newer requests are abandoned or discarded.
+
+    Parameters
+    ----------
+    state : callable
+        Returns a snapshot of the state to show, called on the GUI thread.
+    load : callable
+        load(state, superseded) loads the data of a state, called on the
+        background thread. It returns 'None' if it was abandoned.
+    paint : callable
+        paint(frame) draws the loaded data, called on the GUI thread.
+    delay : int
+        Time, in milliseconds, during which requests are coalesced.
+    """
+    def __init__(self, state, load, paint, delay=15):
+        super().__init__()
+        self.state = state
+        self.load = load
+        self.paint = paint
+        self.generation = 0     # incremented on every request
+        self.requested_at = None    # time of the oldest request not painted yet
+        self.loader = None
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.start_load)
+
+    def request(self):
+        """Requests a refresh."""
+        self.generation += 1
+        if self.requested_at is None:
+            self.requested_at = time.perf_counter()
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def start_load(self):
+        """Starts loading the latest requested state, unless a load is running."""
+        if self.loader is not None:
+            return  # restarted when the running load finishes
+        generation = self.generation
+        self.loader = WindowLoader(self.load, self.state(),
+                                   superseded=lambda: generation != self.generation)
+        self.loader.generation = generation
+        self.loader.finished.connect(self.load_finished)
+        self.loader.start()
+
+    def load_finished(self):
+        """Paints the loaded frame if it is still the latest, or loads the latest one."""
+        loader = self.loader
+        self.loader = None
+        if loader is None:
+            return
+        if loader.error is not None:
+            print('Error loading window: ' + repr(loader.error))
+        if loader.generation == self.generation:
+            if loader.frame is not None:
+                self.paint(loader.frame)
+            self.requested_at = None
+        elif not self.timer.isActive():
+            self.start_load()
+
+    def wait(self):
+        """Waits for the running load to finish, e.g. before closing its data source."""
+        if self.loader is not None:
+            self.loader.wait()
+
+    def drop_loader(self):
+        """Waits for the running load to finish, without painting it or loading again."""
+        if self.loader is not None:
+            self.loader.finished.disconnect(self.load_finished)
+            self.loader.wait()
+            self.loader = None
+
+    def flush(self):
+        """Loads and paints the latest requested state right away, on the calling thread."""
+        self.timer.stop()
+        self.drop_loader()
+        self.generation += 1
+        self.paint(self.load(self.state()))
+        self.requested_at = None
+
+    def stop(self):
+        """Cancels pending requests and waits for the running load to finish."""
+        self.timer.stop()
+        self.generation += 1
+        self.requested_at = None
+        self.drop_loader()
+
+
+class WindowLoader(QtCore.QThread):
+    """
+    Loads the data of a window in the background, for RefreshScheduler.
+
+    Parameters
+    ----------
+    load : callable
+        load(state, superseded) returns the loaded frame.
+    state : dict
+        Window to load.
+    superseded : callable
+        Returns True if the window is not needed anymore.
+    """
+    def __init__(self, load, state, superseded):
+        super().__init__()
+        self.load = load
+        self.state = state
+        self.superseded = superseded
+        self.frame = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.frame = self.load(self.state, self.superseded)
+        except Exception as error:  # e.g. the file was closed meanwhile
+            self.error = error
+
+
+class MultiTraceItem(pg.GraphicsObject):
+    """
+    Draws many traces sharing the same time base as one QPainterPath per
+    pen, instead of one plot item per trace, so that redraw time barely
+    depends on the number of traces.
+
+    Parameters
+    ----------
+    pens : dict
+        Key:Value pairs of pen names and QPen objects.
+    """
+    def __init__(self, pens):
+        pg.GraphicsObject.__init__(self)
+        self.pens = pens
+        self.paths = []
+        self.bounds = QtCore.QRectF()
+
+    def setData(self, x, y, pen_keys):
+        """
+        Parameters
+        ----------
+        x : 1D array
+            Time base, common to all traces, with nBins points.
+        y : 2D array
+            Traces, with dimensions (nTraces, nBins), already offset.
+            If 'None', the item is emptied.
+        pen_keys : array of str
+            Pen name of each trace.
+        """
+        self.prepareGeometryChange()
+        self.paths = []
+        self.bounds = QtCore.QRectF()
+        if y is not None and y.size > 0:
+            n_bins = len(x)
+            for key, pen in self.pens.items():
+                rows = np.where(pen_keys == key)[0]
+                if len(rows) == 0:
+                    continue
+                # Concatenate traces, without connecting the end of each to the next
+                connect = np.ones(len(rows) * n_bins, dtype='int32')
+                connect[n_bins - 1::n_bins] = 0
+                path = pg.arrayToQPath(np.tile(x, len(rows)), y[rows].ravel(), connect=connect)
+                self.paths.append((pen, path))
+            y_min, y_max = np.min(y), np.max(y)
+            self.bounds = QtCore.QRectF(x[0], y_min, x[-1] - x[0], y_max - y_min)
+        self.update()
+
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, p, *args):
+        for pen, path in self.paths:
+            p.setPen(pen)
+            p.drawPath(path)
 
 
 class CustomBox(pg.QtGui.QGraphicsRectItem):
@@ -0,0 +1,33 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+from ecogvis.functions.annotation_store import AnnotationStore
+
+
+def test_annotation_store_visible_and_nearest():
+    np.random.seed(0)
+    store = AnnotationStore()
+    assert len(store.visible(0, 10)) == 0
+    assert store.nearest(1, 1, 0, 10, first_ch=0, scale=1.) is None
+    x = np.random.uniform(0, 100, 500)
+    ids = store.extend(x=x, y_va=np.arange(500) % 7, y_off=0, colors='red',
+                       texts=['a{}'.format(i) for i in range(500)])
+    assert_array_equal(ids, np.arange(500))
+    new_id = store.add(x=50.05, y_va=3, y_off=2, color='blue', text='new')
+    assert new_id == 500 and len(store) == 501
+
+    visible = store.visible(40, 60)
+    assert set(visible) == set(np.where((store.column('x') >= 40) & (store.column('x') <= 60))[0])
+    assert np.all(np.diff(store.column('x')[visible]) >= 0)
+
+    # Plot position of the new annotation, with channel 1 at the bottom
+    assert store.plot_y([500], first_ch=1, scale=2.) == (3 + 2 - 1) * 2.
+    i = store.nearest(50.05, 8., 40, 60, first_ch=1, scale=2.)
+    assert store.texts[i] == 'new'
+
+    # Removal keeps the columns aligned and the ids stable
+    store.remove([i, 0])
+    assert len(store) == 499
+    assert 500 not in store.column('ids') and 0 not in store.column('ids')
+    assert_array_equal(store.column('x'), x[1:])
+    assert_array_equal(store.column('texts'), ['a{}'.format(k) for k in range(1, 500)])
+    assert store.add(x=1., y_va=0, y_off=0, color='red', text='b') == 501
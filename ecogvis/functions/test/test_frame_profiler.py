@@ -0,0 +1,30 @@
+import csv
+from ecogvis.functions.frame_profiler import FrameProfiler, LOG_FIELDS
+
+
+def test_frame_profiler_log_and_rotation(tmpdir):
+    log_path = tmpdir.join('frames.csv')
+    profiler = FrameProfiler(log_path=str(log_path), max_bytes=2000, backups=2)
+    for i in range(60):
+        record = profiler.new_frame(file='EC1_B1.nwb', start=i, stop=i + 100)
+        with FrameProfiler.phase(record, 'read'):
+            pass
+        with FrameProfiler.phase(record, 'read'):
+            pass
+        profiler.end_frame(record, latency=0.01)
+
+    # Rotated logs, each with its header
+    assert log_path.check() and tmpdir.join('frames.csv.1').check()
+    assert tmpdir.join('frames.csv.2').check() and not tmpdir.join('frames.csv.3').check()
+    with open(str(log_path)) as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0].keys()) == LOG_FIELDS
+    assert rows[-1]['start'] == '59' and float(rows[-1]['latency']) == 10.
+    assert float(rows[-1]['read']) >= 0 and rows[-1]['qt_paint'] == ''
+
+    summary = profiler.summary()
+    assert summary['fps'] > 0 and summary['latency'] == 10.
+
+    # Phases are not timed without a record
+    with FrameProfiler.phase(None, 'read'):
+        pass
@@ -0,0 +1,57 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+from ecogvis.functions.interval_store import IntervalStore
+
+
+def brute_force(starts, stops, t0, t1):
+    return set(np.where((starts <= t1) & (stops >= t0))[0])
+
+
+def test_interval_store_overlapping():
+    np.random.seed(0)
+    store = IntervalStore()
+    assert len(store.overlapping(0, 10)) == 0
+    starts = np.random.uniform(0, 1000, 3000)
+    stops = starts + np.random.exponential(2, 3000)
+    stops[10] = starts[10] + 500     # a long interval
+    for start, stop in zip(starts, stops):
+        store.add(start, stop, 'invalid', 'red', '')
+    assert len(store) == 3000
+    for t0, t1 in [(0, 5), (100, 100), (499.5, 520), (998, 2000), (-10, -1)]:
+        found = store.overlapping(t0, t1)
+        assert set(found) == brute_force(starts, stops, t0, t1)
+        assert np.all(np.diff(store.column('starts')[found]) >= 0)
+    assert 10 in store.containing(starts[10] + 400)
+
+    # Removal keeps the columns aligned and the index up to date
+    removed = store.containing(starts[10] + 1)
+    store.remove(removed)
+    keep = np.setdiff1d(np.arange(3000), removed)
+    assert_array_equal(store.column('starts'), starts[keep])
+    assert set(store.overlapping(300, 310)) == brute_force(starts[keep], stops[keep], 300, 310)
+
+
+def test_interval_store_single_and_coverage():
+    store = IntervalStore()
+    store.add(1., 2., 'TimeIntervals_speaker', 'blue', '')
+    assert_array_equal(store.overlapping(1.5, 1.6), [0])
+    assert len(store.overlapping(2.1, 3.)) == 0
+    store.add(5.5, 5.6, 'TimeIntervals_mic', 'green', '')
+    covered = store.coverage(t_max=10., n_bins=10)
+    assert_array_equal(np.where(covered)[0], [1, 2, 5])
+    covered = store.coverage(t_max=10., n_bins=10, indices=[1])
+    assert_array_equal(np.where(covered)[0], [5])
+
+
+def test_interval_store_extend():
+    store = IntervalStore()
+    store.add(0., 1., 'invalid', 'red', '')
+    starts = np.arange(100.)
+    store.extend(starts, starts + 0.5, 'TimeIntervals_speaker', 'blue', '')
+    store.extend([200.], [201.], np.array(['custom']), np.array(['yellow']), np.array(['s1']))
+    assert len(store) == 102
+    assert store.capacity >= 102
+    assert store.column('types')[1] == 'TimeIntervals_speaker'
+    assert store.column('sessions')[-1] == 's1'
+    assert_array_equal(store.overlapping(50.2, 50.3), [51])
+    assert_array_equal(store.containing(0.5), [0, 1])
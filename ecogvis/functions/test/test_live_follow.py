@@ -0,0 +1,56 @@
+import time
+import multiprocessing
+import numpy as np
+from ecogvis.functions.live_follow import LiveFollower, SyntheticECoG, write_synthetic_ecog
+from ecogvis.functions.nwb_io import open_nwb
+from ecogvis.functions.tile_cache import TileCache
+
+
+def test_synthetic_ecog():
+    generator = SyntheticECoG(n_channels=4, rate=1000., seed=1)
+    blocks = np.concatenate([generator.next(300), generator.next(700)])
+    whole = SyntheticECoG(n_channels=4, rate=1000., seed=1).next(1000)
+    assert blocks.shape == (1000, 4) and blocks.dtype == np.float32
+    np.testing.assert_allclose(blocks, whole, rtol=1e-5, atol=1e-12)
+
+
+def test_live_follow(tmp_path):
+    path = tmp_path / 'live_B1.nwb'
+    rate = 1000.
+    ready = multiprocessing.Event()
+    writer = multiprocessing.Process(
+        target=write_synthetic_ecog, args=(str(path), 3.),
+        kwargs={'n_channels': 8, 'rate': rate, 'block_duration': .1, 'ready': ready})
+    writer.start()
+    try:
+        assert ready.wait(30)
+        with open_nwb(path, 'r', swmr=True) as io:
+            nwb = io.read()
+            data = nwb.acquisition['ElectricalSeries'].data
+            follower = LiveFollower(data)
+            cache = TileCache()
+            first = cache.get(data, 0, data.shape[0], np.arange(8))
+            assert data.shape[0] == follower.n_samples >= rate
+
+            # Samples appended by the writer are seen while it writes
+            sizes = [follower.n_samples]
+            t0 = time.time()
+            while writer.is_alive() and time.time() - t0 < 30:
+                n_samples = follower.poll()
+                if n_samples is not None:
+                    sizes.append(n_samples)
+                time.sleep(.05)
+            writer.join(30)
+            n_samples = follower.poll()
+            if n_samples is not None:
+                sizes.append(n_samples)
+            assert len(sizes) > 2 and sizes == sorted(sizes)
+            assert sizes[-1] == 4 * rate
+
+            # The last tile, cached before the data grew, is read again
+            window = cache.get(data, 0, sizes[-1], np.arange(8))
+            np.testing.assert_array_equal(window[:len(first)], first)
+            np.testing.assert_array_equal(window, data[:, :])
+            assert np.all(np.std(window[-100:], axis=0) > 0)
+    finally:
+        writer.join(30)
@@ -0,0 +1,47 @@
+import h5py
+import numpy as np
+from ecogvis.functions.nwb_io import (chunk_layout, chunk_cache_settings, cache_settings,
+                                      ChunkAccessStats, chunk_stats, MIN_CACHE_BYTES)
+
+
+def test_chunk_cache_settings(tmp_path):
+    path = tmp_path / 'block.nwb'
+    with h5py.File(str(path), 'w') as f:
+        f.create_dataset('acquisition/raw/data', shape=(100000, 64), dtype='float32',
+                         chunks=(1000, 16), compression='gzip')
+        f.create_dataset('acquisition/raw/timestamps', data=np.arange(10.))
+    layout = chunk_layout(path)
+    assert [d['name'] for d in layout] == ['/acquisition/raw/data']
+    assert layout[0]['chunk_bytes'] == 1000 * 16 * 4 and layout[0]['compression'] == 'gzip'
+
+    # Sweeps keep a column of 100 time chunks, windows 4 rows of 4 channel chunks
+    sweep = chunk_cache_settings(layout, access='sweep')
+    assert sweep['rdcc_nbytes'] == 100 * 64000 and sweep['rdcc_w0'] == 1.
+    assert sweep['rdcc_nslots'] >= 100 * 100
+    window = chunk_cache_settings(layout, access='window')
+    assert window['rdcc_nbytes'] == MIN_CACHE_BYTES and window['rdcc_w0'] == .75
+    assert chunk_cache_settings([], access='sweep')['rdcc_nbytes'] == MIN_CACHE_BYTES
+
+    with h5py.File(str(path), 'r', **sweep) as f:
+        assert cache_settings(f) == sweep
+        stats = chunk_stats(f['acquisition/raw/data'])
+        assert stats.capacity == 100
+        assert chunk_stats(f['acquisition/raw/timestamps']) is None
+
+
+def test_chunk_access_stats():
+    shape = (10000, 64)
+    # Cache of a column of chunks: channels of the same chunks are read from it
+    stats = ChunkAccessStats(chunks=(1000, 16), chunk_bytes=64000, cache_bytes=10 * 64000)
+    for ch in range(32):
+        stats.record(shape, (slice(None), ch))
+    assert stats.misses == 20 and stats.hits == 31 * 10 - 10
+
+    # Cache smaller than a column: every chunk is read again for each channel
+    stats = ChunkAccessStats(chunks=(1000, 16), chunk_bytes=64000, cache_bytes=9 * 64000)
+    for ch in range(2):
+        stats.record(shape, (slice(None), ch))
+    assert stats.misses == 20 and stats.hits == 0 and stats.hit_rate() == 0.
+
+    stats.record(shape, (slice(500, 500), 0))
+    assert stats.misses == 20
@@ -0,0 +1,79 @@
+import os
+import time
+import h5py
+import numpy as np
+from ecogvis.functions.session_catalog import SessionCatalog, BlockPreopener, block_summary
+
+
+def write_block(path, n_samples, rate=400., high_gamma=False, n_invalid=0):
+    """Writes the groups of a NWB file the catalog reads."""
+    with h5py.File(str(path), 'w') as f:
+        raw = f.create_group('acquisition/ElectricalSeries')
+        raw.attrs['neurodata_type'] = 'ElectricalSeries'
+        raw.create_dataset('data', data=np.zeros((n_samples, 4)))
+        raw.create_dataset('starting_time', data=0.).attrs['rate'] = rate
+        module = f.create_group('processing/ecephys')
+        if high_gamma:
+            hg = module.create_group('high_gamma')
+            hg.attrs['neurodata_type'] = 'ElectricalSeries'
+            hg.create_dataset('data', data=np.zeros((n_samples // 4, 4)))
+            hg.create_dataset('starting_time', data=0.).attrs['rate'] = rate / 4
+        invalid = f.create_group('intervals/invalid_times')
+        invalid.create_dataset('id', data=np.arange(n_invalid))
+
+
+def test_session_catalog(tmp_path, monkeypatch):
+    monkeypatch.setenv('ECOGVIS_SIDECAR_DIR', str(tmp_path / 'sidecar'))
+    for block in [1, 2, 10]:
+        write_block(tmp_path / 'EC1_B{}.nwb'.format(block), 4000 * block,
+                    high_gamma=block == 2, n_invalid=block)
+    write_block(tmp_path / 'EC2_B1.nwb', 100)
+
+    summary = block_summary(tmp_path / 'EC1_B2.nwb')
+    assert summary['block'] == 2 and summary['duration'] == 20.
+    assert summary['series']['/processing/ecephys/high_gamma']['rate'] == 100.
+    assert 'high_gamma' in summary['containers'] and summary['intervals'] == {'invalid_times': 2}
+
+    catalog = SessionCatalog(tmp_path / 'EC1_B2.nwb')
+    assert [p.name for p in catalog.files()] == ['EC1_B1.nwb', 'EC1_B2.nwb', 'EC1_B10.nwb']
+    assert catalog.index_path.is_file()
+    assert catalog.neighbour(tmp_path / 'EC1_B2.nwb', 1).name == 'EC1_B10.nwb'
+    assert catalog.neighbour(tmp_path / 'EC1_B10.nwb', 1).name == 'EC1_B1.nwb'
+    assert catalog.neighbour(tmp_path / 'EC1_B1.nwb', -1).name == 'EC1_B10.nwb'
+    assert [e['file'] for e in catalog.search(containers=['high_gamma'])] == ['EC1_B2.nwb']
+    assert [e['file'] for e in catalog.search('B1')] == ['EC1_B1.nwb', 'EC1_B10.nwb']
+    assert [e['file'] for e in catalog.search(min_duration=30.)] == ['EC1_B10.nwb']
+    assert not catalog.covers(tmp_path / 'EC2_B1.nwb')
+
+    # Reloaded from the index, only changed blocks are summarized again
+    write_block(tmp_path / 'EC1_B1.nwb', 400, high_gamma=True)
+    os.remove(str(tmp_path / 'EC1_B10.nwb'))
+    catalog = SessionCatalog(tmp_path / 'EC1_B1.nwb')
+    assert sorted(catalog.entries) == ['EC1_B1.nwb', 'EC1_B2.nwb']
+    assert catalog.entries['EC1_B1.nwb']['duration'] == 1.
+
+
+def test_block_preopener():
+    opened, closed = [], []
+
+    def open_file(path):
+        opened.append(path.name)
+        return path.name
+
+    def wait_opened(n):
+        t0 = time.time()
+        while len(preopener.opened) < n and time.time() - t0 < 5:
+            time.sleep(0.01)
+
+    preopener = BlockPreopener(open_file=open_file, close_file=closed.append)
+    preopener.prepare(['/data/EC1_B1.nwb', '/data/EC1_B3.nwb'])
+    wait_opened(2)
+    assert preopener.take('/data/EC1_B3.nwb') == 'EC1_B3.nwb'
+    assert preopener.take('/data/EC1_B3.nwb') is None
+    assert preopener.take('/data/EC1_B1.nwb') == 'EC1_B1.nwb'
+    preopener.prepare(['/data/EC1_B4.nwb', '/data/EC1_B2.nwb'])
+    wait_opened(2)
+    assert preopener.take('/data/EC1_B2.nwb') == 'EC1_B2.nwb'
+    preopener.close()
+    assert sorted(opened) == ['EC1_B1.nwb', 'EC1_B2.nwb', 'EC1_B3.nwb', 'EC1_B4.nwb']
+    assert closed == ['EC1_B4.nwb']
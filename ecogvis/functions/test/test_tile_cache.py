@@ -0,0 +1,84 @@
+import time
+import numpy as np
+from numpy.testing import assert_array_equal
+from ecogvis.functions.tile_cache import TileCache, TilePrefetcher
+
+
+class CountingData:
+    """Array wrapper that counts reads and rejects fancy indexing."""
+    def __init__(self, array, chunks=None):
+        self.array = array
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self.chunks = chunks
+        self.name = 'data'
+        self.reads = 0
+
+    def __getitem__(self, item):
+        assert all(isinstance(i, slice) for i in item)
+        self.reads += 1
+        return self.array[item]
+
+
+def test_tile_cache():
+    array = np.random.randn(50000, 40)
+    data = CountingData(array, chunks=(4096, 16))
+    cache = TileCache(max_bytes=2**30)
+    assert cache.tile_shape(data) == (8192, 16)
+
+    channels = np.array([0, 3, 17, 39])
+    assert_array_equal(cache.get(data, 1000, 20000, channels), array[1000:20000, channels])
+    # 3 time tiles x 3 channel tiles
+    assert data.reads == 9
+    assert cache.contains(data, 1000, 20000, channels)
+
+    # Scrolling forward only reads the new tiles
+    assert_array_equal(cache.get(data, 7000, 26000, channels), array[7000:26000, channels])
+    assert data.reads == 12
+    assert_array_equal(cache.get(data, 49000, 50000, np.array([39])), array[49000:, [39]])
+
+    cache.clear(data)
+    assert cache.nbytes == 0
+    assert not cache.contains(data, 1000, 20000, channels)
+
+
+def test_tile_cache_eviction():
+    array = np.random.randn(40000, 16)
+    data = CountingData(array)
+    tile_bytes = 8192 * 16 * 8
+    cache = TileCache(max_bytes=2 * tile_bytes)
+    cache.get(data, 0, 8192 * 3, np.arange(16))
+    assert len(cache.tiles) == 2
+    assert cache.nbytes <= 2 * tile_bytes
+    # The first tile was evicted, the last ones are still cached
+    assert not cache.contains(data, 0, 100, [0])
+    assert cache.contains(data, 8192 * 2, 8192 * 3, [0])
+
+
+def test_tile_prefetcher():
+    array = np.random.randn(100000, 48)
+    data = CountingData(array, chunks=(4096, 16))
+    cache = TileCache(max_bytes=2**30)
+    prefetcher = TilePrefetcher(cache, max_ahead=2)
+    channels = np.arange(16)
+    # Two steps forward, the next two windows are loaded
+    for start in [0, 8192, 16384]:
+        cache.get(data, start, start + 8192, channels)
+        prefetcher.navigate(data, start, start + 8192, channels)
+    for _ in range(100):
+        if cache.contains(data, 16384 + 2 * 8192, 16384 + 3 * 8192, channels):
+            break
+        time.sleep(0.02)
+    assert cache.contains(data, 16384 + 8192, 16384 + 3 * 8192, channels)
+    assert not cache.contains(data, 16384 + 3 * 8192, 16384 + 4 * 8192, channels)
+    # Moving to other channels changes the direction, channels are predicted too
+    cache.get(data, 16384, 16384 + 8192, channels + 16)
+    prefetcher.navigate(data, 16384, 16384 + 8192, channels + 16)
+    for _ in range(100):
+        if len(prefetcher.pending) == 0 and cache.contains(data, 16384, 16384 + 8192, channels + 32):
+            break
+        time.sleep(0.02)
+    assert cache.contains(data, 16384, 16384 + 8192, channels + 32)
+    assert not cache.contains(data, 16384 + 3 * 8192, 16384 + 4 * 8192, channels + 32)
+    prefetcher.stop()
+    assert not prefetcher.thread.is_alive()
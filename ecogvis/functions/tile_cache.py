@@ -0,0 +1,290 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ecogvis.functions.nwb_io import chunk_stats
+
+
+DEFAULT_CACHE_MB = 512          # memory budget, see ECOGVIS_TILE_CACHE_MB
+DEFAULT_TIME_BLOCK = 8192       # samples per tile, for datasets without chunks
+DEFAULT_CHANNEL_BLOCK = 16      # channels per tile, for datasets without chunks
+
+
+def default_cache_bytes():
+    """
+    Memory budget of the tile cache, in bytes. Defaults to DEFAULT_CACHE_MB,
+    it can be changed with the ECOGVIS_TILE_CACHE_MB environment variable.
+    """
+    return int(float(os.environ.get('ECOGVIS_TILE_CACHE_MB', DEFAULT_CACHE_MB)) * 2**20)
+
+
+class TileCache:
+    """
+    Least recently used cache of (time block x channel block) tiles of 2D
+    datasets, e.g. h5py datasets with dimensions (nSamples, nChannels).
+
+    Each tile is read with a single contiguous hyperslab selection, aligned
+    to the chunks of the dataset when it has them. Windows are assembled
+    from the tiles in memory, so overlapping windows (e.g. when scrolling)
+    only read the tiles not seen yet. The reads of chunked h5py datasets are
+    also replayed on an estimate of the HDF5 chunk cache, see chunk_stats().
+
+    Datasets may grow along time, e.g. files followed while they are being
+    written: the last tile, read when it was not full, is read again once
+    there is more data for it.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory budget. Least recently used tiles are evicted beyond it.
+        Defaults to default_cache_bytes().
+    """
+    def __init__(self, max_bytes=None):
+        self.max_bytes = default_cache_bytes() if max_bytes is None else max_bytes
+        self.tiles = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.access_stats = {}      # data key: ChunkAccessStats or None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def data_key(data):
+        """Identifies a dataset in the cache keys."""
+        return getattr(data, 'name', None) or id(data)
+
+    @staticmethod
+    def tile_shape(data):
+        """Number of samples and channels of the tiles of a dataset."""
+        chunks = getattr(data, 'chunks', None)
+        if chunks is None:
+            return DEFAULT_TIME_BLOCK, min(DEFAULT_CHANNEL_BLOCK, data.shape[1])
+        time_block = chunks[0] * max(1, DEFAULT_TIME_BLOCK // chunks[0])
+        return time_block, chunks[1]
+
+    def tile(self, data, ti, ci, tile_shape=None):
+        """
+        Returns a tile, reading it from data if it is not in the cache.
+
+        Parameters
+        ----------
+        data : h5py dataset or array
+            Dataset with dimensions (nSamples, nChannels).
+        ti, ci : int
+            Time and channel indices of the tile.
+        tile_shape : tuple of int
+            Tile dimensions, defaults to tile_shape(data).
+        """
+        key = (self.data_key(data), ti, ci)
+        tb, cb = tile_shape or self.tile_shape(data)
+        n_rows = min(tb, data.shape[0] - ti * tb)
+        with self.lock:
+            tile = self.tiles.get(key, None)
+            if tile is not None and tile.shape[0] >= n_rows:
+                self.tiles.move_to_end(key)
+                self.hits += 1
+                return tile
+            self.misses += 1
+        tile = np.asarray(data[ti * tb:(ti + 1) * tb, ci * cb:(ci + 1) * cb])
+        stats = self.chunk_stats(data)
+        with self.lock:
+            if stats is not None:
+                stats.record(data.shape, (slice(ti * tb, (ti + 1) * tb), slice(ci * cb, (ci + 1) * cb)))
+            cached = self.tiles.get(key, None)
+            if cached is None or cached.shape[0] < tile.shape[0]:
+                if cached is not None:
+                    self.nbytes -= cached.nbytes
+                self.tiles[key] = tile
+                self.nbytes += tile.nbytes
+                while self.nbytes > self.max_bytes and len(self.tiles) > 1:
+                    _, evicted = self.tiles.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+        return tile
+
+    def chunk_stats(self, data):
+        """
+        Estimated HDF5 chunk cache hits and misses of the tiles read from a
+        dataset, see nwb_io.ChunkAccessStats, or 'None' if it is not a
+        chunked h5py dataset.
+        """
+        key = self.data_key(data)
+        with self.lock:
+            if key not in self.access_stats:
+                self.access_stats[key] = chunk_stats(data)
+            return self.access_stats[key]
+
+    def tiles_for(self, data, start, stop, channels):
+        """Time and channel indices of the tiles covering a window."""
+        tb, cb = self.tile_shape(data)
+        time_tiles = range(start // tb, (max(stop, start + 1) - 1) // tb + 1)
+        channel_tiles = np.unique(np.asarray(channels) // cb)
+        return time_tiles, channel_tiles
+
+    def get(self, data, start, stop, channels):
+        """
+        Reads a window of data through the cache.
+
+        Parameters
+        ----------
+        data : h5py dataset or array
+            Dataset with dimensions (nSamples, nChannels).
+        start, stop : int
+            Window limits, in samples.
+        channels : array of int
+            Indices of the channels.
+
+        Returns
+        -------
+        out : array
+            Data with dimensions (stop - start, len(channels)).
+        """
+        stop = min(stop, data.shape[0])
+        channels = np.asarray(channels, dtype='int')
+        tb, cb = self.tile_shape(data)
+        time_tiles, channel_tiles = self.tiles_for(data, start, stop, channels)
+        out = np.empty((stop - start, len(channels)), dtype=data.dtype)
+        for ci in channel_tiles:
+            cols = np.where(channels // cb == ci)[0]
+            sel = channels[cols] - ci * cb
+            for ti in time_tiles:
+                tile = self.tile(data, ti, ci, (tb, cb))
+                t0 = max(start, ti * tb)
+                t1 = min(stop, (ti + 1) * tb)
+                out[t0 - start:t1 - start, cols] = tile[t0 - ti * tb:t1 - ti * tb][:, sel]
+        return out
+
+    def contains(self, data, start, stop, channels):
+        """True if all tiles covering a window are in the cache."""
+        key = self.data_key(data)
+        tb, _ = self.tile_shape(data)
+        time_tiles, channel_tiles = self.tiles_for(data, start, stop, channels)
+        with self.lock:
+            tiles = [self.tiles.get((key, ti, ci), None) for ti in time_tiles for ci in channel_tiles]
+        return all(tile is not None and tile.shape[0] >= min(tb, data.shape[0] - ti * tb)
+                   for tile, ti in zip(tiles, np.repeat(time_tiles, len(channel_tiles))))
+
+    def clear(self, data=None):
+        """Removes all tiles, or only the tiles of data."""
+        with self.lock:
+            if data is None:
+                self.tiles.clear()
+                self.access_stats.clear()
+                self.nbytes = 0
+                return
+            key = self.data_key(data)
+            self.access_stats.pop(key, None)
+            for k in [k for k in self.tiles if k[0] == key]:
+                self.nbytes -= self.tiles.pop(k).nbytes
+
+
+class TilePrefetcher:
+    """
+    Loads the tiles of the windows likely to be shown next into a TileCache,
+    in a background thread.
+
+    Next windows are predicted from the last navigation step: the same step
+    (in time and channels) is repeated ahead of the current window, further
+    ahead the longer the user keeps moving in the same direction. Each new
+    navigation cancels the pending predictions.
+
+    Parameters
+    ----------
+    cache : TileCache
+        Cache the tiles are loaded into.
+    max_ahead : int
+        Maximum number of windows predicted ahead.
+    """
+    def __init__(self, cache, max_ahead=4):
+        self.cache = cache
+        self.max_ahead = max_ahead
+        self.generation = 0
+        self.pending = []
+        self.last = None
+        self.streak = 0
+        self.direction = (0, 0)
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def navigate(self, data, start, stop, channels):
+        """
+        Records that a window is being shown and schedules the prediction of
+        the next ones.
+
+        Parameters
+        ----------
+        data : h5py dataset or array
+            Dataset with dimensions (nSamples, nChannels).
+        start, stop : int
+            Window limits, in samples.
+        channels : array of int
+            Indices of the channels.
+        """
+        channels = np.asarray(channels, dtype='int')
+        windows = []
+        last = self.last
+        if last is not None and last[0] is data and last[2] - last[1] == stop - start:
+            dt = start - last[1]
+            dch = channels[0] - last[3][0] if len(channels) == len(last[3]) else 0
+            if dt != 0 or dch != 0:
+                same_direction = (np.sign(dt), np.sign(dch)) == self.direction
+                self.streak = self.streak + 1 if same_direction else 1
+                self.direction = (np.sign(dt), np.sign(dch))
+                # Predicted windows must fit in half the cache budget
+                window_bytes = (stop - start) * len(channels) * np.dtype(data.dtype).itemsize
+                n_ahead = min(self.streak + 1, self.max_ahead,
+                              self.cache.max_bytes // 2 // max(window_bytes, 1))
+                for k in range(1, n_ahead + 1):
+                    t0 = min(max(start + k * dt, 0), data.shape[0] - (stop - start))
+                    ch = channels + k * dch
+                    ch = ch[(ch >= 0) & (ch < data.shape[1])]
+                    if len(ch) > 0:
+                        windows.append((data, t0, t0 + stop - start, ch))
+        else:
+            self.streak = 0
+            self.direction = (0, 0)
+        self.last = (data, start, stop, channels)
+
+        with self.condition:
+            self.generation += 1
+            self.pending = windows
+            self.condition.notify()
+
+    def cancel(self):
+        """Cancels all pending predictions."""
+        with self.condition:
+            self.generation += 1
+            self.pending = []
+            self.last = None
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and len(self.pending) == 0:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                generation = self.generation
+                data, start, stop, channels = self.pending.pop(0)
+            tb, cb = self.cache.tile_shape(data)
+            time_tiles, channel_tiles = self.cache.tiles_for(data, start, stop, channels)
+            for ti in time_tiles:
+                for ci in channel_tiles:
+                    if generation != self.generation or not self.running:
+                        break
+                    try:
+                        self.cache.tile(data, ti, ci, (tb, cb))
+                    except Exception:   # e.g. the file was closed meanwhile
+                        break
+
+    def stop(self):
+        """Stops the background thread."""
+        with self.condition:
+            self.running = False
+            self.generation += 1
+            self.pending = []
+            self.condition.notify()
+        self.thread.join()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory min/max overview pyramid of audio signals, for the stimuli plot.
+"""
+import numpy as np
+
+from ecogvis.signal_processing.decimation import minmax_decimate, interleave_minmax
+from ecogvis.signal_processing.lod_pyramid import pyramid_factors, _reduce_block
+
+
+BLOCK_SAMPLES = 2**20   # samples read at a time while building
+
+
+class AudioOverview:
+    """
+    Min/max pyramid of a 1D audio signal, computed once with a single pass
+    over the data. Each level halves the resolution of the previous one.
+
+    Windows are looked up by index arithmetic on the coarsest level that
+    still has enough bins for display, and the global limits of the signal
+    are kept for the plot range.
+
+    Parameters
+    ----------
+    data : h5py dataset or array
+        Audio signal, dimensions (nSamples,).
+    rate : float
+        Sampling rate, in Hz.
+    """
+    def __init__(self, data, rate):
+        self.data = data
+        self.rate = rate
+        self.n_samples = data.shape[0]
+        self.factors = pyramid_factors(self.n_samples)
+        self.mins = {}
+        self.maxs = {}
+        if len(self.factors) > 0:
+            # Finest level from the data, in blocks
+            block_size = BLOCK_SAMPLES // self.factors[0] * self.factors[0]
+            mins, maxs = [], []
+            for start in range(0, self.n_samples, block_size):
+                block = np.asarray(data[start:start + block_size])
+                block_mins, block_maxs, _ = _reduce_block(block, self.factors[0])
+                mins.append(block_mins)
+                maxs.append(block_maxs)
+            self.mins[self.factors[0]] = np.concatenate(mins)
+            self.maxs[self.factors[0]] = np.concatenate(maxs)
+            # Each following level from the previous one
+            for previous, factor in zip(self.factors[:-1], self.factors[1:]):
+                self.mins[factor] = _reduce_block(self.mins[previous], 2)[0]
+                self.maxs[factor] = _reduce_block(self.maxs[previous], 2)[1]
+            self.min = float(np.min(self.mins[self.factors[-1]]))
+            self.max = float(np.max(self.maxs[self.factors[-1]]))
+        else:
+            values = np.asarray(data[:])
+            self.min = float(np.min(values)) if self.n_samples > 0 else 0.
+            self.max = float(np.max(values)) if self.n_samples > 0 else 0.
+
+    def window(self, t0, t1, n_bins):
+        """
+        Signal to display in a time window.
+
+        Parameters
+        ----------
+        t0, t1 : float
+            Window limits, in seconds.
+        n_bins : int
+            Number of bins, usually the width in pixels of the plot.
+
+        Returns
+        -------
+        x : 1D array of floats
+            Times of the points, in seconds.
+        y : 1D array of floats
+            Audio values, min/max decimated if the window has more than
+            2 * n_bins samples.
+        """
+        start = min(max(int(np.floor(t0 * self.rate)), 0), self.n_samples)
+        stop = min(max(int(np.ceil(t1 * self.rate)) + 1, start), self.n_samples)
+        factors = [f for f in self.factors if (stop - start) / f >= n_bins]
+        if len(factors) > 0:
+            factor = factors[-1]
+            b0 = start // factor
+            b1 = int(np.ceil(stop / factor))
+            x, y = interleave_minmax(self.mins[factor][b0:b1], self.maxs[factor][b0:b1],
+                                     factor, b0 * factor)
+        else:
+            x, y = minmax_decimate(np.asarray(self.data[start:stop]), n_bins=n_bins, offset=start)
+        return x / self.rate, y
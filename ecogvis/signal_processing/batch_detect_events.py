@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Batch detection of audio events over many NWB files, without the GUI.
+"""
+import os
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import yaml
+from hdmf.common import VectorData, ElementIdentifiers
+from pynwb.epoch import TimeIntervals
+
+from ecogvis.functions.nwb_io import open_nwb
+from ecogvis.signal_processing.detect_events import detect_events_multichannel
+
+
+# Default parameters, same as in the Audio Event Detection dialog
+default_config = {
+    'signals': {'speaker': 'speaker1', 'mic': 'microphone'},
+    'thresholds': {'speaker': 0.05, 'mic': 0.1},
+    'masks': {'mic': ['speaker']},
+    'downsample_rate': 800.,
+    'smooth_width': 0.4,
+    'smooth_method': 'median',
+    'refine': False,
+    'histogram_bins': [0., 0.1, 0.2, 0.3, 0.4, 0.5, 0.75, 1., 1.5, 2., 5.],
+}
+
+
+def load_config(config_file=None):
+    """
+    Loads detection parameters from a YAML file. Missing fields take the
+    values of default_config, also within nested fields: a file that only
+    sets thresholds: {speaker: 0.1} keeps the default mic threshold.
+
+    Parameters
+    ----------
+    config_file : str or path
+        Path to the YAML file. If 'None', default_config is returned.
+
+    Returns
+    -------
+    config : dict
+        Detection parameters.
+    """
+    config = {key: dict(value) if isinstance(value, dict) else value
+              for key, value in default_config.items()}
+    if config_file is not None:
+        with open(config_file) as f:
+            user_config = yaml.safe_load(f) or {}
+        for key, value in user_config.items():
+            if isinstance(config.get(key, None), dict) and isinstance(value, dict):
+                config[key].update(value)
+            else:
+                config[key] = value
+    return config
+
+
+def write_event_intervals(nwbfile, events):
+    """
+    Adds detected events to the nwbfile as TimeIntervals tables named
+    'TimeIntervals_<signal name>' (e.g. 'TimeIntervals_speaker'). Each table
+    is built from whole columns at once.
+
+    Parameters
+    ----------
+    nwbfile : nwbfile object
+        NWB file the tables are added to. It still has to be written.
+    events : dict
+        Name:Value pairs of signal names and event times, as
+        [start_0, stop_0, start_1, stop_1, ...].
+    """
+    for name, times in events.items():
+        if times is None:
+            continue
+        times = np.asarray(times, dtype='float').reshape((-1, 2))
+        ti = TimeIntervals(
+            name='TimeIntervals_' + name,
+            id=ElementIdentifiers('id', data=np.arange(times.shape[0])),
+            columns=[
+                VectorData(name='start_time', description='Start time of epoch, in seconds',
+                           data=times[:, 0]),
+                VectorData(name='stop_time', description='Stop time of epoch, in seconds',
+                           data=times[:, 1]),
+            ]
+        )
+        nwbfile.add_time_intervals(ti)
+
+
+def find_signal(nwbfile, name):
+    """Finds a TimeSeries by name in the stimulus or acquisition groups."""
+    if name in nwbfile.stimulus:
+        return nwbfile.stimulus[name]
+    if name in nwbfile.acquisition:
+        return nwbfile.acquisition[name]
+    return None
+
+
+def detect_events_file(block_path, config):
+    """
+    Runs audio event detection on one NWB file and saves the resulting
+    TimeIntervals tables in it. Files that already contain any of the
+    tables are skipped.
+
+    Parameters
+    ----------
+    block_path : str or path
+        Path to the NWB file.
+    config : dict
+        Detection parameters, see default_config.
+
+    Returns
+    -------
+    summary : list of dict
+        One entry per signal, with number of events, durations statistics
+        and a histogram of durations.
+    """
+    start = time.time()
+    summary = []
+    with open_nwb(block_path, 'r+', access='sweep') as io:
+        nwb = io.read()
+        signals = {}
+        for name, signal_name in config['signals'].items():
+            signal = find_signal(nwb, signal_name)
+            if signal is not None:
+                signals[name] = signal
+        existing = [name for name in signals
+                    if nwb.intervals is not None and 'TimeIntervals_' + name in nwb.intervals]
+        if len(signals) == 0 or len(existing) > 0:
+            status = 'no signals' if len(signals) == 0 else 'intervals exist'
+            return [{'file': str(block_path), 'signal': '', 'status': status}]
+
+        results = detect_events_multichannel(
+            signals=signals,
+            thresholds=config['thresholds'],
+            masks=config['masks'],
+            # Each signal is downsampled to the same rate, whatever its own
+            dfact={name: signal.rate / float(config['downsample_rate'])
+                   for name, signal in signals.items()},
+            smooth_width=config['smooth_width'],
+            smooth_method=config['smooth_method'],
+            refine=config['refine']
+        )
+        events = {name: out[1] for name, out in results.items()}
+        write_event_intervals(nwb, events)
+        io.write(nwb)
+
+    bins = np.append(config['histogram_bins'], np.inf)
+    for name, times in events.items():
+        durations = np.diff(np.asarray(times).reshape((-1, 2)), axis=1)[:, 0]
+        counts, _ = np.histogram(durations, bins=bins)
+        row = {
+            'file': str(block_path),
+            'signal': name,
+            'status': 'ok',
+            'n_events': len(durations),
+            'total_duration': np.sum(durations),
+            'mean_duration': np.mean(durations) if len(durations) else np.nan,
+            'median_duration': np.median(durations) if len(durations) else np.nan,
+            'run_time': time.time() - start,
+        }
+        for b0, b1, count in zip(bins[:-1], bins[1:], counts):
+            row['dur_{}-{}s'.format(b0, b1)] = count
+        summary.append(row)
+    return summary
+
+
+def failed_file(block_path, error):
+    """Summary of a file whose detection failed."""
+    print('Failed ' + str(block_path) + ': ' + repr(error))
+    return [{'file': str(block_path), 'signal': '', 'status': 'failed', 'error': repr(error)}]
+
+
+def try_detect_events_file(block_path, config):
+    """detect_events_file(), with errors reported in the summary instead of raised."""
+    try:
+        return detect_events_file(block_path, config)
+    except Exception as error:
+        return failed_file(block_path, error)
+
+
+def batch_detect_events(sources, config=None, n_jobs=1, report_path=None):
+    """
+    Runs audio event detection over many NWB files in parallel, saving the
+    TimeIntervals tables in each file. A file that fails (e.g. unreadable)
+    is reported with status 'failed' and the error, and the others go on.
+
+    Parameters
+    ----------
+    sources : list of str or path
+        NWB files, or directories with NWB files.
+    config : dict or str
+        Detection parameters, or path to a YAML file with them. If 'None',
+        default_config is used.
+    n_jobs : int
+        Number of files processed in parallel, each in its own process.
+    report_path : str or path
+        If given, the summary report is saved to this CSV file.
+
+    Returns
+    -------
+    report : pandas.DataFrame
+        Summary report, one row per file and signal.
+    """
+    if config is None or isinstance(config, (str, os.PathLike)):
+        config = load_config(config)
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            files.extend(sorted(glob.glob(os.path.join(source, '*.nwb'))))
+        else:
+            files.append(str(source))
+
+    outs = {}
+    if n_jobs == 1:
+        for block_path in files:
+            outs[block_path] = try_detect_events_file(block_path, config)
+            print('Finished ' + block_path)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = {executor.submit(try_detect_events_file, block_path, config): block_path
+                       for block_path in files}
+            for future in as_completed(futures):
+                block_path = futures[future]
+                try:
+                    outs[block_path] = future.result()
+                except Exception as error:   # e.g. the worker process died
+                    outs[block_path] = failed_file(block_path, error)
+                print('Finished ' + block_path)
+
+    # Report rows in the order of the files
+    summary = [row for block_path in files for row in outs[block_path]]
+    report = pd.DataFrame(summary)
+    if report_path is not None:
+        report.to_csv(report_path, header=True, index=False)
+        print('Summary report saved in ' + str(report_path))
+    return report
+
+
+def parse_arguments():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Detects audio events (speaker and microphone) in NWB files and saves '
+                    'them as TimeIntervals tables.',
+    )
+    parser.add_argument(
+        "sources",
+        nargs='+',
+        help="NWB files or directories containing NWB files."
+    )
+    parser.add_argument(
+        "--config",
+        default=None,
+        help="The path to the detection parameters YAML file."
+    )
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        default=1,
+        help="Number of files processed in parallel."
+    )
+    parser.add_argument(
+        "--report",
+        default='event_detection_report.csv',
+        help="The path to the summary report CSV file."
+    )
+    return parser.parse_args()
+
+
+def cmd_line_shortcut():
+    args = parse_arguments()
+    report = batch_detect_events(
+        sources=args.sources,
+        config=args.config,
+        n_jobs=args.n_jobs,
+        report_path=args.report
+    )
+    print(report.reindex(columns=['file', 'signal', 'status', 'n_events']).to_string(index=False))
+
+
+if __name__ == '__main__':
+    cmd_line_shortcut()
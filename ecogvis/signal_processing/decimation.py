@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Peak-preserving decimation of signals for display.
+"""
+import numpy as np
+
+
+def minmax_decimate(data, n_bins, offset=0):
+    """
+    Decimates a signal keeping the minimum and maximum values of each bin,
+    so that peaks and artifacts remain visible in zoomed-out views.
+
+    Parameters
+    ----------
+    data : array of floats
+        Signal with dimensions (nSamples,) or (nSamples, nChannels).
+    n_bins : int
+        Number of bins, usually the width in pixels of the plot. Each bin
+        contributes two points to the output.
+    offset : int
+        Sample index of the first element of data, added to the output
+        positions.
+
+    Returns
+    -------
+    x : 1D array of floats
+        Sample positions of the decimated points.
+    out : array of floats
+        Decimated signal, dimensions (2 * n_bins,) or (2 * n_bins, nChannels).
+        Within each bin, the extreme that occurs first comes first. If data
+        has less than 2 * n_bins samples, it is returned as it is.
+    """
+    nSamples = data.shape[0]
+    if nSamples <= 2 * n_bins:
+        return np.arange(nSamples) + offset, data
+
+    one_dim = data.ndim == 1
+    if one_dim:
+        data = data[:, np.newaxis]
+    bin_size = int(np.ceil(nSamples / n_bins))
+    n_full = nSamples // bin_size
+
+    # Pad the last, partial, bin with its own last value
+    extra = (n_full + 1) * bin_size - nSamples if n_full * bin_size < nSamples else 0
+    if extra > 0:
+        data = np.concatenate((data, np.repeat(data[-1:], extra, axis=0)), axis=0)
+    binned = data.reshape((-1, bin_size, data.shape[1]))
+
+    argmin = np.argmin(binned, axis=1)
+    argmax = np.argmax(binned, axis=1)
+    mins = np.take_along_axis(binned, argmin[:, np.newaxis, :], axis=1)[:, 0, :]
+    maxs = np.take_along_axis(binned, argmax[:, np.newaxis, :], axis=1)[:, 0, :]
+    min_first = argmin <= argmax
+
+    out = np.empty((2 * binned.shape[0], data.shape[1]), dtype=data.dtype)
+    out[0::2] = np.where(min_first, mins, maxs)
+    out[1::2] = np.where(min_first, maxs, mins)
+    x = interleaved_positions(binned.shape[0], bin_size, offset)
+    if one_dim:
+        out = out[:, 0]
+    return x, out
+
+
+def interleave_minmax(mins, maxs, bin_size, offset=0):
+    """
+    Combines precomputed per-bin minima and maxima (e.g. from a level of
+    detail pyramid) into a single signal for display.
+
+    Parameters
+    ----------
+    mins : array of floats
+        Minimum of each bin, dimensions (nBins,) or (nBins, nChannels).
+    maxs : array of floats
+        Maximum of each bin, same dimensions as mins.
+    bin_size : int
+        Number of original samples in each bin.
+    offset : int
+        Sample index of the first bin.
+
+    Returns
+    -------
+    x : 1D array of floats
+        Sample positions of the points.
+    out : array of floats
+        Interleaved minima and maxima, dimensions (2 * nBins, ...).
+    """
+    out = np.empty((2 * mins.shape[0],) + mins.shape[1:], dtype=mins.dtype)
+    out[0::2] = mins
+    out[1::2] = maxs
+    return interleaved_positions(mins.shape[0], bin_size, offset), out
+
+
+def interleaved_positions(n_bins, bin_size, offset=0):
+    """Sample positions of the two points drawn for each decimated bin."""
+    starts = np.arange(n_bins) * bin_size + offset
+    x = np.empty(2 * n_bins)
+    x[0::2] = starts
+    x[1::2] = starts + bin_size / 2
+    return x
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Band by band access to spectral decompositions (DecompositionSeries data),
+for browsing them in the viewer.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+SLAB_CACHE_BYTES = 64 * 2**20   # memory budget of the slabs shared between bands
+
+
+class DecompositionBands:
+    """
+    Access to the bands of a 3D dataset with dimensions (nSamples, nChannels,
+    nBands), such as the data of a DecompositionSeries.
+
+    Each band is exposed as a 2D dataset-like object, see band(). Reads
+    select only the requested bands. When the dataset is chunked along the
+    bands axis, all the bands sharing a chunk are read at once anyway, so
+    the whole slab is kept in a small least recently used cache: switching
+    to another band of the same chunk does not read the file again.
+
+    Parameters
+    ----------
+    data : h5py dataset or array
+        Decomposition, dimensions (nSamples, nChannels, nBands).
+    max_bytes : int
+        Memory budget of the cached slabs.
+    """
+    def __init__(self, data, max_bytes=SLAB_CACHE_BYTES):
+        self.data = data
+        self.shape = tuple(data.shape)
+        self.n_bands = self.shape[2]
+        chunks = getattr(data, 'chunks', None)
+        # Bands read together, one per read if they are not chunked together
+        self.band_block = chunks[2] if chunks is not None else 1
+        self.max_bytes = max_bytes
+        self.slabs = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def band(self, index):
+        """2D dataset-like view of one band, see DecompositionBand."""
+        if index not in self.views:
+            self.views[index] = DecompositionBand(self, index)
+        return self.views[index]
+
+    def read(self, start, stop, c0, c1, band):
+        """
+        Reads a window of one band.
+
+        Parameters
+        ----------
+        start, stop : int
+            Window limits, in samples.
+        c0, c1 : int
+            Channels limits.
+        band : int
+            Index of the band.
+
+        Returns
+        -------
+        out : array
+            Data with dimensions (stop - start, c1 - c0).
+        """
+        if self.band_block == 1:
+            return np.asarray(self.data[start:stop, c0:c1, band])
+        b0 = band // self.band_block * self.band_block
+        key = (start, stop, c0, c1, b0)
+        with self.lock:
+            slab = self.slabs.get(key, None)
+            if slab is not None:
+                self.slabs.move_to_end(key)
+        if slab is None:
+            b1 = min(b0 + self.band_block, self.n_bands)
+            slab = np.asarray(self.data[start:stop, c0:c1, b0:b1])
+            with self.lock:
+                if key not in self.slabs:
+                    self.slabs[key] = slab
+                    self.nbytes += slab.nbytes
+                    while self.nbytes > self.max_bytes and len(self.slabs) > 1:
+                        _, evicted = self.slabs.popitem(last=False)
+                        self.nbytes -= evicted.nbytes
+        return slab[:, :, band - b0]
+
+
+class DecompositionBand:
+    """
+    One band of a decomposition, behaving like a read-only 2D h5py dataset
+    with dimensions (nSamples, nChannels): it has shape, dtype, name and
+    chunks attributes and can be sliced with [start:stop, c0:c1].
+
+    Parameters
+    ----------
+    bands : DecompositionBands
+        Decomposition the band belongs to.
+    index : int
+        Index of the band.
+    """
+    def __init__(self, bands, index):
+        self.bands = bands
+        self.index = index
+        self.shape = bands.shape[:2]
+        self.dtype = np.dtype(bands.data.dtype)
+        self.ndim = 2
+        chunks = getattr(bands.data, 'chunks', None)
+        self.chunks = None if chunks is None else tuple(chunks[:2])
+        # Identifies the data and band, e.g. in TileCache keys
+        self.name = '{}?band={}'.format(getattr(bands.data, 'name', id(bands.data)), index)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        rows, cols = key
+        start, stop, step = rows.indices(self.shape[0])
+        c0, c1, c_step = cols.indices(self.shape[1])
+        if step != 1 or c_step != 1:
+            raise ValueError('Only contiguous reads are supported.')
+        if stop <= start or c1 <= c0:
+            return np.zeros((max(stop - start, 0), max(c1 - c0, 0)), dtype=self.dtype)
+        return self.bands.read(start, stop, c0, c1, self.index)
+
+
+def band_power_image(power, n_bins):
+    """
+    Image of the band power of several channels, for a heatmap with the
+    bands of each channel stacked on top of each other.
+
+    Each band is averaged in time bins and normalized by its median over the
+    window and channels, so that all bands are comparable despite the fall
+    of power with frequency.
+
+    Parameters
+    ----------
+    power : array
+        Band power, dimensions (nSamples, nChannels, nBands).
+    n_bins : int
+        Maximum number of time bins, usually the width in pixels of the
+        plot.
+
+    Returns
+    -------
+    bin_size : int
+        Number of samples averaged in each time bin.
+    image : array
+        Base 2 logarithm of the normalized power, dimensions
+        (nBins, nChannels * nBands), channel by channel with the bands in
+        increasing order.
+    """
+    nSamples, nChannels, nBands = power.shape
+    bin_size = max(1, int(np.ceil(nSamples / n_bins)))
+    starts = np.arange(0, nSamples, bin_size)
+    binned = np.add.reduceat(power.astype('float64'), starts, axis=0)
+    binned /= np.diff(np.append(starts, nSamples))[:, np.newaxis, np.newaxis]
+    median = np.median(binned.reshape(-1, nBands), axis=0)
+    median[median <= 0] = 1.
+    image = np.log2(np.maximum(binned / median, 1e-6))
+    return bin_size, image.reshape(len(starts), nChannels * nBands).astype('float32')
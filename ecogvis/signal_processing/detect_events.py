@@ -4,14 +4,26 @@ Detect CV (consonant-vowel) pair events in speaker and microphone channels.
 """
 
 # Third party libraries
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import scipy.signal as sgn
+import scipy.ndimage as ndi
 from process_nwb.resample import resample
 
+# Available smoothing methods for the detection envelope
+SMOOTHING_METHODS = ['median', 'rms', 'boxcar', 'medfilt']
+
 
 def detect_events(speaker_data, mic_data=None, interval=None, dfact=30,
                   smooth_width=0.4, speaker_threshold=0.05, mic_threshold=0.05,
-                  direction='both'):
+                  direction='both', smooth_method='median', verbose=False,
+                  cache=None, refine=False, refine_window=None,
+                  refine_threshold=0.1, n_jobs=None):
     """
     Automatically detects events in audio signals.
 
@@ -36,6 +48,30 @@ def detect_events(speaker_data, mic_data=None, interval=None, dfact=30,
         'Up' detects events start times. 'Down' detects events stop times.
         'Both'
         detects both start and stop times.
+    smooth_method : str
+        Smoothing filter applied to the signal energy, one of
+        SMOOTHING_METHODS. Default 'median'.
+    verbose : bool
+        If True, prints the smoothing kernel size and its run time.
+    cache : EnvelopeCache
+        If given, downsampled signals and smoothed envelopes are stored in
+        and re-used from this cache. Changing only the thresholds then
+        skips the resampling and smoothing steps.
+    refine : bool
+        If True, start and stop times found on the downsampled signals are
+        refined at the full sampling rate, see refine_events(). This allows
+        for large downsampling factors with sample-accurate boundaries.
+        Only used with direction='both'.
+    refine_window : float
+        Half-width (seconds) of the full-rate windows read around each
+        boundary. If 'None', it is set to smooth_width plus two
+        downsampled bins.
+    refine_threshold : float
+        Threshold level for the refinement, relative to the maximum energy
+        within each window.
+    n_jobs : int
+        Number of worker threads. Speaker and mic are read and downsampled
+        concurrently. If 'None', one per signal.
 
     Returns
     -------
@@ -52,103 +88,544 @@ def detect_events(speaker_data, mic_data=None, interval=None, dfact=30,
     micFilt : 1D array of floats
         Filtered microphone signal.
     """
+    signals = {'speaker': speaker_data, 'mic': mic_data}
+    signals = {name: data for name, data in signals.items() if data is not None}
+    results = detect_events_multichannel(
+        signals=signals,
+        thresholds={'speaker': speaker_threshold, 'mic': mic_threshold},
+        masks={'mic': ['speaker']},   # Remove mic response to speaker
+        interval=interval,
+        dfact=dfact,
+        smooth_width=smooth_width,
+        direction=direction,
+        smooth_method=smooth_method,
+        verbose=verbose,
+        cache=cache,
+        refine=refine,
+        refine_window=refine_window,
+        refine_threshold=refine_threshold,
+        n_jobs=n_jobs
+    )
+    speakerDS, speakerEventDS, speakerFilt = results.get('speaker', (None, None, None))
+    micDS, micEventDS, micFilt = results.get('mic', (None, None, None))
 
-    # Downsampling Speaker ---------------------------------------------------
-
-    speakerDS, speakerEventDS, speakerFilt = None, None, None
+    return speakerDS, speakerEventDS, speakerFilt, micDS, micEventDS, micFilt
 
-    if speaker_data is not None:
-        if interval is None:
-            X = speaker_data.data[:]
-        else:
-            X = speaker_data.data[interval[0]:interval[1]]
-        fs = speaker_data.rate  # sampling rate
-        ds = fs / dfact
 
-        # Pad zeros to make signal length a power of 2, improves performance
-        nBins = X.shape[0]
-        extraBins = 2 ** (np.ceil(np.log2(nBins)).astype('int')) - nBins
-        extraZeros = np.zeros(extraBins)
-        X = np.append(X, extraZeros)
-        speakerDS = resample(X, ds, fs)
+def detect_events_multichannel(signals, thresholds, masks=None, interval=None,
+                               dfact=30, smooth_width=0.4, direction='both',
+                               smooth_method='median', verbose=False, cache=None,
+                               refine=False, refine_window=None,
+                               refine_threshold=0.1, n_jobs=None):
+    """
+    Automatically detects events in any number of analog signals, processing
+    them concurrently.
 
-        # Remove excess bins (because of zero padding on previous step)
-        excessBins = int(np.ceil(extraBins * ds / fs))
-        speakerDS = speakerDS[0:-excessBins]
+    Parameters
+    ----------
+    signals : dict
+        Name:Value pairs of signal names and 'pynwb.base.TimeSeries' objects,
+        e.g. {'speaker': nwb.stimulus['speaker1'],
+              'mic': nwb.acquisition['anin4']}
+    thresholds : dict or float
+        Name:Value pairs of signal names and threshold levels. A single
+        value is used for all signals.
+    masks : dict
+        Name:Value pairs of signal names and lists of other signal names.
+        Bins where any of the listed signals is above its own threshold are
+        zeroed before the named signal is smoothed, e.g. {'mic': ['speaker']}
+        removes the mic response to the speaker. Masks must not be circular.
+    interval : list of floats
+        Interval to be used [Start_bin, End_bin]. If 'None', the whole
+        signal is used.
+    dfact : dict or float
+        Name:Value pairs of signal names and downsampling factors, e.g. to
+        downsample signals recorded at different rates to the same rate. A
+        single value is used for all signals. Default 30.
+    smooth_width: float
+        Width scale for the smoothing filter (default = .4, decent for CVs).
+    direction : str
+        'up', 'down' or 'both'. See threshcross().
+    smooth_method : str
+        Smoothing filter, one of SMOOTHING_METHODS. Default 'median'.
+    verbose : bool
+        If True, prints the smoothing kernel size and its run time.
+    cache : EnvelopeCache
+        If given, downsampled signals and envelopes are stored in and
+        re-used from this cache.
+    refine : bool
+        If True, event boundaries are refined at full rate. Samples within
+        events of the masking signals are excluded. See refine_events().
+    refine_window : float
+        Half-width (seconds) of the refinement windows. If 'None', it is set
+        to smooth_width plus two downsampled bins.
+    refine_threshold : float
+        Threshold level for the refinement, relative to the maximum energy
+        within each window.
+    n_jobs : int
+        Number of worker threads. If 'None', one per signal (up to the
+        number of CPUs).
 
-        # Kernel size must be an odd number
-        speakerFilt = sgn.medfilt(
-            volume=np.diff(np.append(speakerDS, speakerDS[-1])) ** 2,
-            kernel_size=int((smooth_width * ds // 2) * 2 + 1)
+    Returns
+    -------
+    results : dict
+        Name:Value pairs of signal names and tuples (XDS, events, filt), with
+        the downsampled (and masked) signal, the event times in seconds and
+        the filtered signal.
+    """
+    if cache is None:
+        # Kept until the detection returns, each signal is read once
+        cache = EnvelopeCache(max_entries=len(signals))
+    if masks is None:
+        masks = {}
+    if not isinstance(thresholds, dict):
+        thresholds = {name: thresholds for name in signals}
+    dfacts = dfact if isinstance(dfact, dict) else {name: dfact for name in signals}
+    masks = {name: [src for src in sources if src in signals]
+             for name, sources in masks.items() if name in signals}
+    if n_jobs is None:
+        n_jobs = min(len(signals), os.cpu_count() or 1)
+    n_jobs = max(n_jobs, 1)
+
+    # Masking signals must be processed before the signals they mask
+    waves = []
+    done = set()
+    while len(done) < len(signals):
+        wave = [name for name in signals if name not in done and
+                all(src in done for src in masks.get(name, []))]
+        if len(wave) == 0:
+            raise ValueError('Circular masks between signals: {}'.format(
+                ', '.join(name for name in signals if name not in done)))
+        waves.append(wave)
+        done.update(wave)
+
+    results = {}
+    mask_keys = {}
+
+    def process(name):
+        data = signals[name]
+        dfact = dfacts[name]
+        XDS, ds = cache.downsampled(data, interval, dfact)
+        mask = None
+        if len(masks.get(name, [])) > 0:
+            mask_bins = []
+            for src in masks[name]:
+                src_filt = results[src][2]
+                src_ds = signals[src].rate / dfacts[src]
+                bins = np.where(src_filt > thresholds[src])[0]
+                if src_ds != ds:   # map bins between different sampling rates
+                    bins = np.round(bins * ds / src_ds).astype('int')
+                mask_bins.append(bins[bins < len(XDS)])
+            # Masking signals are themselves masked: their keys are nested, so
+            # that changes anywhere upstream change the envelope key
+            mask_key = tuple((signals[src].name, thresholds[src], mask_keys[src])
+                             for src in masks[name])
+            mask = (mask_key, np.unique(np.concatenate(mask_bins)))
+        mask_keys[name] = None if mask is None else mask[0]
+        filt = cache.envelope(
+            data=data,
+            interval=interval,
+            dfact=dfact,
+            smooth_width=smooth_width,
+            smooth_method=smooth_method,
+            mask=mask,
+            verbose=verbose,
+            downsampled=(XDS, ds)
         )
+        if mask is not None:
+            XDS = XDS.copy()
+            XDS[mask[1]] = 0
+        events = find_events(
+            filt=filt,
+            threshold=thresholds[name],
+            ds=ds,
+            direction=direction,
+            offset=0 if interval is None else interval[0] / data.rate
+        )
+        if refine and direction == 'both':
+            exclude = None
+            if len(masks.get(name, [])) > 0:
+                exclude = np.concatenate([results[src][1] for src in masks[name]])
+            events = refine_events(
+                data=data,
+                events=events,
+                window=refine_window or smooth_width + 2 * dfact / data.rate,
+                threshold=refine_threshold,
+                interval=interval,
+                exclude=exclude
+            )
+        return XDS, events, filt
+
+    if n_jobs == 1:
+        for wave in waves:
+            for name in wave:
+                results[name] = process(name)
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            # Read and downsample all signals at once, if the cache keeps
+            # them all, then smooth and detect in dependency order
+            if cache.max_entries >= len(signals):
+                list(executor.map(lambda name: cache.downsampled(signals[name], interval, dfacts[name]),
+                                  signals))
+            for wave in waves:
+                for name, out in zip(wave, executor.map(process, wave)):
+                    results[name] = out
+    return results
+
+
+def downsample_signal(data, interval=None, dfact=30):
+    """
+    Reads and downsamples an audio signal.
 
-        # Normalize the filtered signal.
-        speakerFilt /= np.max(np.abs(speakerFilt))
+    Parameters
+    ----------
+    data : 'pynwb.base.TimeSeries' object
+        Object containing the audio data.
+    interval : list of floats
+        Interval to be used [Start_bin, End_bin]. If 'None', the whole
+        signal is used.
+    dfact : float
+        Downsampling factor.
 
-        # Find threshold crossing times
-        stimBinsDS = threshcross(speakerFilt, speaker_threshold, direction)
+    Returns
+    -------
+    XDS : 1D array of floats
+        Downsampled signal.
+    ds : float
+        Sampling rate of the downsampled signal.
+    """
+    if interval is None:
+        X = data.data[:]
+    else:
+        X = data.data[interval[0]:interval[1]]
+    fs = data.rate  # sampling rate
+    ds = fs / dfact
+
+    # Pad zeros to make signal length a power of 2, improves performance
+    nBins = X.shape[0]
+    extraBins = 2 ** (np.ceil(np.log2(nBins)).astype('int')) - nBins
+    extraZeros = np.zeros(extraBins)
+    X = np.append(X, extraZeros)
+    XDS = resample(X, ds, fs)
+
+    # Remove excess bins (because of zero padding on previous step)
+    excessBins = int(np.ceil(extraBins * ds / fs))
+    XDS = XDS[0:-excessBins]
+    return XDS, ds
+
+
+def detection_envelope(XDS, ds, smooth_width=0.4, smooth_method='median',
+                       mask=None, verbose=False):
+    """
+    Smoothed and normalized energy envelope of a downsampled signal.
 
-        # Remove events that have a duration less than 0.1 s.
-        speaker_events = stimBinsDS.reshape((-1, 2))
-        rem_ind = np.where((speaker_events[:, 1] - speaker_events[:, 0]) < ds * 0.1)[0]
-        speaker_events = np.delete(speaker_events, rem_ind, axis=0)
-        stimBinsDS = speaker_events.reshape((-1))
+    Parameters
+    ----------
+    XDS : 1D array of floats
+        Downsampled signal.
+    ds : float
+        Sampling rate of the downsampled signal.
+    smooth_width: float
+        Width of the smoothing filter, in seconds.
+    smooth_method : str
+        Smoothing filter, one of SMOOTHING_METHODS.
+    mask : 1D array of ints
+        Bins of XDS to be zeroed before smoothing (e.g. mic bins during
+        speaker activity). If 'None', no bins are zeroed.
+    verbose : bool
+        If True, prints the smoothing kernel size and its run time.
 
-        # Transform bins to time
-        if interval is None:
-            speakerEventDS = (stimBinsDS / ds)
-        else:
-            speakerEventDS = (stimBinsDS / ds) + (interval[0] / fs)
+    Returns
+    -------
+    filt : 1D array of floats
+        Envelope normalized to a maximum absolute value of 1.
+    """
+    if mask is not None:
+        XDS = XDS.copy()
+        XDS[mask] = 0
+
+    kernel_size = smoothing_kernel_size(smooth_width, ds)
+    start = time.time()
+    filt = smooth_signal(
+        x=np.diff(np.append(XDS, XDS[-1])) ** 2,
+        kernel_size=kernel_size,
+        method=smooth_method
+    )
+    if verbose:
+        print('{} smoothing ({} bins) finished in {} seconds'.format(
+            smooth_method, kernel_size, time.time() - start))
+
+    # Normalize the filtered signal.
+    filt /= np.max(np.abs(filt))
+    return filt
+
+
+def find_events(filt, threshold, ds, direction='both', offset=0):
+    """
+    Event times from threshold crossings of a detection envelope.
 
-    # Downsampling Mic -------------------------------------------------------
+    Parameters
+    ----------
+    filt : 1D array of floats
+        Detection envelope.
+    threshold : float
+        Threshold level.
+    ds : float
+        Sampling rate of the envelope.
+    direction : str
+        'up', 'down' or 'both'. See threshcross().
+    offset : float
+        Time (seconds) of the first envelope bin.
 
-    micDS, micEventDS, micFilt = None, None, None
+    Returns
+    -------
+    events : 1D array of floats
+        Event times, in seconds.
+    """
+    # Find threshold crossing times
+    binsDS = threshcross(filt, threshold, direction)
 
-    if mic_data is not None:
+    # Remove events that have a duration less than 0.1 s.
+    events = binsDS.reshape((-1, 2))
+    rem_ind = np.where((events[:, 1] - events[:, 0]) < ds * 0.1)[0]
+    events = np.delete(events, rem_ind, axis=0)
+    binsDS = events.reshape((-1))
 
-        if interval is None:
-            X = mic_data.data[:]
-        else:
-            X = mic_data.data[interval[0]:interval[1]]
-        fs = mic_data.rate  # sampling rate
-        ds = fs / dfact
+    # Transform bins to time
+    return (binsDS / ds) + offset
 
-        # Pad zeros to make signal length a power of 2, improves performance
-        nBins = X.shape[0]
-        extraBins = 2 ** (np.ceil(np.log2(nBins)).astype('int')) - nBins
-        extraZeros = np.zeros(extraBins)
-        X = np.append(X, extraZeros)
-        micDS = resample(X, ds, fs)
 
-        # Remove excess bins (because of zero padding on previous step)
-        excessBins = int(np.ceil(extraBins * ds / fs))
-        micDS = micDS[0:-excessBins]
+def refine_events(data, events, window=0.1, threshold=0.1, smooth_width=0.005,
+                  interval=None, exclude=None):
+    """
+    Refines event start and stop times at the full sampling rate.
 
-        # Remove mic response to speaker
-        micDS[np.where(speakerFilt > speaker_threshold)[0]] = 0
-        micFilt = sgn.medfilt(volume=np.diff(np.append(micDS, micDS[-1])) ** 2,
-                              kernel_size=int(
-                                  (smooth_width * ds // 2) * 2 + 1))
+    For each boundary found on a downsampled signal, only a short window of
+    the original signal around it is read. Within that window, the energy
+    (squared first difference) is smoothed with a short boxcar and
+    normalized by its maximum. The refined start is the first sample above
+    threshold, the refined stop is the last one.
 
-        # Normalize the filtered signal.
-        micFilt /= np.max(np.abs(micFilt))
+    Parameters
+    ----------
+    data : 'pynwb.base.TimeSeries' object
+        Object containing the full rate audio data.
+    events : 1D array of floats
+        Event times (seconds) as [start_0, stop_0, start_1, stop_1, ...].
+    window : float
+        Half-width (seconds) of the window read around each boundary.
+    threshold : float
+        Threshold level, relative to the maximum energy within each window.
+    smooth_width : float
+        Width (seconds) of the boxcar used to smooth the energy.
+    interval : list of floats
+        Interval [Start_bin, End_bin] used for detection. Windows are not
+        extended beyond it. If 'None', the whole signal is used.
+    exclude : 1D array of floats
+        Event times of another signal, in the same format as events (e.g.
+        speaker events when refining mic events). Samples inside these
+        events are zeroed before the refinement.
 
-        # Find threshold crossing times
-        micBinsDS = threshcross(micFilt, mic_threshold, direction)
+    Returns
+    -------
+    refined : 1D array of floats
+        Refined event times, in seconds.
+    """
+    fs = data.rate
+    nBins = data.data.shape[0]
+    first_bin, last_bin = (0, nBins) if interval is None else (interval[0], min(interval[1], nBins))
+    pairs = np.asarray(events, dtype='float').reshape((-1, 2))
+    refined = pairs.copy()
+    kernel_size = max(int((smooth_width * fs // 2) * 2 + 1), 1)
+    if exclude is not None:
+        # Exclude events in bins, sorted by start, with the latest stop so far
+        # (events of several signals can overlap), for binary searches
+        exclude = (np.asarray(exclude, dtype='float').reshape((-1, 2)) * fs).astype('int')
+        exclude = exclude[np.argsort(exclude[:, 0], kind='mergesort')]
+        exclude_reach = np.maximum.accumulate(exclude[:, 1]) if len(exclude) else exclude[:, 1]
+
+    for ii, (start, stop) in enumerate(pairs):
+        # Windows never cross the neighboring events
+        lower = pairs[ii - 1, 1] if ii > 0 else first_bin / fs
+        upper = pairs[ii + 1, 0] if ii < len(pairs) - 1 else last_bin / fs
+        middle = (start + stop) / 2
+        for jj, (t0, t1) in enumerate([(max(start - window, lower), min(start + window, middle)),
+                                       (max(stop - window, middle), min(stop + window, upper))]):
+            b0 = int(np.clip(np.floor(t0 * fs), first_bin, last_bin))
+            b1 = int(np.clip(np.ceil(t1 * fs), first_bin, last_bin))
+            if b1 - b0 < 2:
+                continue
+            X = data.data[b0:b1].astype('float')
+            if exclude is not None:
+                # Only the exclude events overlapping [b0, b1)
+                first = np.searchsorted(exclude_reach, b0, side='right')
+                last = np.searchsorted(exclude[:, 0], b1, side='left')
+                for ex0, ex1 in exclude[first:last]:
+                    X[max(ex0 - b0, 0):max(ex1 - b0, 0)] = 0
+            energy = smooth_signal(np.diff(np.append(X, X[-1])) ** 2,
+                                   kernel_size=min(kernel_size, len(X) // 2 * 2 - 1),
+                                   method='boxcar')
+            if np.max(energy) <= 0:
+                continue
+            above = np.where(energy / np.max(energy) >= threshold)[0]
+            if jj == 0:
+                refined[ii, 0] = (b0 + above[0]) / fs
+            else:
+                refined[ii, 1] = (b0 + above[-1] + 1) / fs
 
-        # Remove events that have a duration less than 0.1 s.
-        mic_events = micBinsDS.reshape((-1, 2))
-        rem_ind = np.where((mic_events[:, 1] - mic_events[:, 0]) < ds * 0.1)[0]
-        mic_events = np.delete(mic_events, rem_ind, axis=0)
-        micBinsDS = mic_events.reshape((-1))
+    return refined.reshape((-1))
 
-        # Transform bins to time
-        if interval is None:
-            micEventDS = (micBinsDS / ds)
-        else:
-            micEventDS = (micBinsDS / ds) + (interval[0] / fs)
 
-    return speakerDS, speakerEventDS, speakerFilt, micDS, micEventDS, micFilt
+class EnvelopeCache:
+    """
+    Stores downsampled signals and detection envelopes, so that repeated
+    detections on the same data (e.g. while tuning thresholds) only re-run
+    the threshold crossing step.
+
+    Downsampled signals are keyed by (signal name, interval, dfact) and
+    envelopes additionally by (smooth_width, smooth_method, mask). The cache
+    can be shared between threads.
+
+    Parameters
+    ----------
+    max_entries : int
+        Maximum number of entries kept for each kind of array. Least
+        recently used entries are dropped first. If 0, nothing is stored.
+    """
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._downsampled = OrderedDict()
+        self._envelopes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._downsampled.clear()
+            self._envelopes.clear()
+
+    def _get(self, store, key):
+        with self._lock:
+            if key in store:
+                store.move_to_end(key)
+                return store[key]
+        return None
+
+    def _put(self, store, key, value):
+        if self.max_entries > 0:
+            with self._lock:
+                store[key] = value
+                while len(store) > self.max_entries:
+                    store.popitem(last=False)
+
+    def downsampled(self, data, interval=None, dfact=30):
+        """
+        Downsampled signal, see downsample_signal().
+
+        Returns
+        -------
+        XDS : 1D array of floats
+            Downsampled signal.
+        ds : float
+            Sampling rate of the downsampled signal.
+        """
+        interval_key = None if interval is None else tuple(interval)
+        key = (data.name, interval_key, dfact)
+        value = self._get(self._downsampled, key)
+        if value is None:
+            value = downsample_signal(data, interval, dfact)
+            self._put(self._downsampled, key, value)
+        return value
+
+    def envelope(self, data, interval=None, dfact=30, smooth_width=0.4,
+                 smooth_method='median', mask=None, verbose=False, downsampled=None):
+        """
+        Detection envelope, see detection_envelope().
+
+        Parameters
+        ----------
+        mask : tuple
+            (mask_key, mask_bins). The hashable mask_key identifies the mask
+            in the cache key (e.g. names and thresholds of the masking
+            signals), mask_bins are the bins to zero before smoothing.
+        downsampled : tuple
+            (XDS, ds), the signal already downsampled by the caller, used
+            instead of downsampled() if the envelope is not cached.
+        """
+        interval_key = None if interval is None else tuple(interval)
+        mask_key = None if mask is None else mask[0]
+        key = (data.name, interval_key, dfact, smooth_width, smooth_method, mask_key)
+        filt = self._get(self._envelopes, key)
+        if filt is None:
+            XDS, ds = downsampled or self.downsampled(data, interval, dfact)
+            filt = detection_envelope(
+                XDS=XDS,
+                ds=ds,
+                smooth_width=smooth_width,
+                smooth_method=smooth_method,
+                mask=None if mask is None else mask[1],
+                verbose=verbose
+            )
+            self._put(self._envelopes, key, filt)
+        return filt
+
+
+def smoothing_kernel_size(smooth_width, ds):
+    """
+    Smoothing kernel size, in bins, for a given width in seconds.
+
+    Parameters
+    ----------
+    smooth_width : float
+        Width of the smoothing filter, in seconds.
+    ds : float
+        Sampling rate of the signal to be smoothed.
+
+    Returns
+    -------
+    kernel_size : int
+        Kernel size. It is always an odd number.
+    """
+    return int((smooth_width * ds // 2) * 2 + 1)
+
+
+def smooth_signal(x, kernel_size, method='median'):
+    """
+    Smooths the energy of a signal with a sliding window.
+
+    Parameters
+    ----------
+    x : 1D array of floats
+        Signal energy (e.g. squared first difference of the audio).
+    kernel_size : int
+        Size of the sliding window, in bins. Must be odd.
+    method : str
+        'median': running median, same output as scipy.signal.medfilt but
+        computed with scipy.ndimage.median_filter, which is much faster.
+        'rms': moving root mean square.
+        'boxcar': moving average.
+        'medfilt': running median with scipy.signal.medfilt (slow, kept for
+        reference).
+
+    Returns
+    -------
+    out : 1D array of floats
+        Smoothed signal, same length as x.
+    """
+    x = np.asarray(x, dtype='float')
+    if method == 'median':
+        out = ndi.median_filter(x, size=kernel_size, mode='constant', cval=0.)
+    elif method == 'rms':
+        out = np.sqrt(np.maximum(
+            ndi.uniform_filter1d(x, size=kernel_size, mode='constant', cval=0.), 0.))
+    elif method == 'boxcar':
+        out = ndi.uniform_filter1d(x, size=kernel_size, mode='constant', cval=0.)
+    elif method == 'medfilt':
+        out = sgn.medfilt(volume=x, kernel_size=kernel_size)
+    else:
+        raise ValueError("Unknown smoothing method '{}'. Options are: {}".format(
+            method, ', '.join(SMOOTHING_METHODS)))
+    return out
 
 
 def threshcross(data, threshold=0, direction='up'):
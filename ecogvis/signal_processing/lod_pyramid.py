@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Min/max/mean level of detail (LOD) pyramids of long recordings, stored in a
+sidecar HDF5 file, for fast zoomed-out viewing.
+"""
+import os
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import h5py
+
+from ecogvis.signal_processing.scale_stats import ScaleStatsAccumulator, STAT_NAMES
+
+
+BASE_FACTOR = 64        # decimation factor of the finest pyramid level
+MIN_LEVEL_BINS = 512    # the coarsest level has at least this many bins
+BLOCK_BYTES = 8 * 2**20  # approximate size of each block read while building
+
+
+def sidecar_dir():
+    """
+    Directory of sidecar files. Defaults to '~/.ecogvis/sidecar', it can be
+    changed with the ECOGVIS_SIDECAR_DIR environment variable.
+    """
+    path = os.environ.get('ECOGVIS_SIDECAR_DIR', None)
+    if path is None:
+        path = Path.home() / '.ecogvis' / 'sidecar'
+    return Path(path)
+
+
+def sidecar_path(nwb_path, dataset_name):
+    """
+    Path of the sidecar file of a dataset in a NWB file. The name combines
+    the file name with a hash of its absolute path and of the dataset name,
+    so blocks with the same name in different directories do not collide.
+    """
+    nwb_path = Path(nwb_path).absolute()
+    key = str(nwb_path) + ':' + dataset_name
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]
+    return sidecar_dir() / '{}_{}.h5'.format(nwb_path.stem, digest)
+
+
+def pyramid_factors(n_samples, base_factor=BASE_FACTOR, min_bins=MIN_LEVEL_BINS):
+    """
+    Power-of-two decimation factors of the pyramid levels for a recording
+    with n_samples.
+    """
+    factors = []
+    factor = base_factor
+    while n_samples / factor >= min_bins:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def data_fingerprint(data, n_samples=256):
+    """
+    Hash of the shape and of a few samples at the start, middle and end of a
+    dataset. It identifies the data when the file modification time changes
+    without the data changing, e.g. when a file is opened in 'r+' mode.
+    """
+    n = data.shape[0]
+    digest = hashlib.sha1(str(tuple(data.shape)).encode('utf-8'))
+    for start in [0, max(n // 2 - n_samples // 2, 0), max(n - n_samples, 0)]:
+        digest.update(np.ascontiguousarray(data[start:start + n_samples]).tobytes())
+    return digest.hexdigest()
+
+
+def _reduce_block(block, factor):
+    """Min, max and mean over consecutive bins of factor samples."""
+    n_full = block.shape[0] // factor
+    binned = block[:n_full * factor].reshape((n_full, factor) + block.shape[1:])
+    mins, maxs, means = binned.min(1), binned.max(1), binned.mean(1)
+    if n_full * factor < block.shape[0]:  # last, partial, bin
+        rest = block[n_full * factor:]
+        mins = np.concatenate((mins, rest.min(0, keepdims=True)))
+        maxs = np.concatenate((maxs, rest.max(0, keepdims=True)))
+        means = np.concatenate((means, rest.mean(0, keepdims=True)))
+    return mins, maxs, means
+
+
+def build_pyramid(data, nwb_path, dataset_name=None, progress=None, stop=None):
+    """
+    Builds the min/max/mean pyramid of a dataset and stores it in its
+    sidecar file. The finest level is computed from the data in
+    blocks of consecutive samples, and each following level from the
+    previous one. Robust scale statistics of each channel are computed in
+    the same pass and stored with the pyramid, see ScaleStatsAccumulator.
+
+    Parameters
+    ----------
+    data : h5py dataset or array
+        Signal with dimensions (nSamples, nChannels).
+    nwb_path : str or path
+        Path of the NWB file the data belongs to.
+    dataset_name : str
+        Name of the dataset in the NWB file. Defaults to data.name.
+    progress : callable
+        Called with the fraction of the work done, from 0 to 1.
+    stop : callable
+        Returns True if the build should be abandoned.
+
+    Returns
+    -------
+    pyramid : LODPyramid or None
+        The new pyramid, or 'None' if the build was stopped or the recording
+        is too short for a pyramid.
+    """
+    dataset_name = dataset_name or data.name
+    n_samples, n_channels = data.shape
+    factors = pyramid_factors(n_samples)
+    if len(factors) == 0:
+        return None
+    path = sidecar_path(nwb_path, dataset_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    mtime = os.path.getmtime(str(nwb_path))
+    dtype = np.float32 if np.dtype(data.dtype).itemsize <= 4 else np.float64
+    block_size = BLOCK_BYTES // (n_channels * np.dtype(data.dtype).itemsize)
+    block_size = max(factors[0], block_size // factors[0] * factors[0])
+
+    with h5py.File(str(path), 'a') as f:
+        if 'pyramid' in f:
+            del f['pyramid']
+        grp = f.create_group('pyramid')
+        grp.attrs['nwb_path'] = str(Path(nwb_path).absolute())
+        grp.attrs['dataset_name'] = dataset_name
+        grp.attrs['mtime'] = mtime
+        grp.attrs['shape'] = data.shape
+        grp.attrs['fingerprint'] = data_fingerprint(data)
+        grp.attrs['complete'] = False
+        levels = []
+        for factor in factors:
+            n_bins = int(np.ceil(n_samples / factor))
+            level = grp.create_group('level_{}'.format(factor))
+            level.attrs['factor'] = factor
+            for stat in ['min', 'max', 'mean']:
+                level.create_dataset(stat, shape=(n_bins, n_channels), dtype=dtype,
+                                     chunks=(min(n_bins, 4096), min(n_channels, 64)))
+            levels.append(level)
+
+        # Finest level and scale statistics from the data
+        stats = ScaleStatsAccumulator(n_samples, n_channels)
+        for start in range(0, n_samples, block_size):
+            if stop is not None and stop():
+                del f['pyramid']
+                return None
+            block = data[start:start + block_size]
+            stats.add(block, start)
+            b0 = start // factors[0]
+            for stat, values in zip(['min', 'max', 'mean'], _reduce_block(block, factors[0])):
+                levels[0][stat][b0:b0 + values.shape[0]] = values
+            if progress is not None:
+                progress(0.9 * min(start + block_size, n_samples) / n_samples)
+        scale = grp.create_group('scale')
+        for stat, values in stats.result().items():
+            scale.create_dataset(stat, data=values)
+
+        # Each following level from the previous one
+        for previous, level in zip(levels[:-1], levels[1:]):
+            if stop is not None and stop():
+                del f['pyramid']
+                return None
+            n_bins = previous['min'].shape[0]
+            for start in range(0, n_bins, block_size):
+                b0 = start // 2
+                for stat, reduce in zip(['min', 'max', 'mean'], [0, 1, 2]):
+                    values = _reduce_block(previous[stat][start:start + block_size], 2)[reduce]
+                    level[stat][b0:b0 + values.shape[0]] = values
+        grp.attrs['complete'] = True
+    if progress is not None:
+        progress(1.)
+    return LODPyramid(nwb_path, dataset_name)
+
+
+def open_pyramid(nwb_path, dataset_name, data=None):
+    """
+    Opens the pyramid of a dataset in a NWB file from its sidecar file.
+
+    Parameters
+    ----------
+    nwb_path : str or path
+        Path of the NWB file the data belongs to.
+    dataset_name : str
+        Name of the dataset in the NWB file.
+    data : h5py dataset
+        If given and the NWB file was modified after the pyramid was built,
+        the pyramid is still used if the data fingerprint did not change.
+
+    Returns
+    -------
+    pyramid : LODPyramid or None
+        The pyramid, or 'None' if it does not exist, is incomplete or is
+        outdated.
+    """
+    path = sidecar_path(nwb_path, dataset_name)
+    if not path.is_file():
+        return None
+    mtime = os.path.getmtime(str(nwb_path))
+    try:
+        with h5py.File(str(path), 'r') as f:
+            if 'pyramid' not in f or not f['pyramid'].attrs['complete']:
+                return None
+            if 'scale' not in f['pyramid']:    # built by an older version
+                return None
+            attrs = dict(f['pyramid'].attrs)
+        if attrs['mtime'] != mtime:
+            if data is None or attrs['fingerprint'] != data_fingerprint(data):
+                return None
+            with h5py.File(str(path), 'a') as f:
+                f['pyramid'].attrs['mtime'] = mtime
+    except OSError:   # corrupted or being written by another process
+        return None
+    return LODPyramid(nwb_path, dataset_name)
+
+
+class LODPyramid:
+    """
+    Read access to a min/max/mean pyramid stored in a sidecar file.
+
+    Parameters
+    ----------
+    nwb_path : str or path
+        Path of the NWB file the pyramid belongs to.
+    dataset_name : str
+        Name of the dataset in the NWB file.
+    """
+    def __init__(self, nwb_path, dataset_name):
+        self.path = sidecar_path(nwb_path, dataset_name)
+        self.dataset_name = dataset_name
+        self.file = h5py.File(str(self.path), 'r')
+        self.group = self.file['pyramid']
+        self.shape = tuple(self.group.attrs['shape'])
+        self.levels = {}
+        for name, level in self.group.items():
+            if name.startswith('level_'):
+                self.levels[int(level.attrs['factor'])] = level
+        self.factors = sorted(self.levels.keys())
+        # Robust scale statistics of each channel, see ScaleStatsAccumulator
+        self.scale_stats = {stat: self.group['scale'][stat][()] for stat in STAT_NAMES}
+
+    def level_for(self, n_samples, n_bins):
+        """
+        Decimation factor of the coarsest level that still has at least
+        n_bins bins for a window of n_samples, or 'None' if the window is too
+        short for any level.
+        """
+        factors = [f for f in self.factors if n_samples / f >= n_bins]
+        if len(factors) == 0:
+            return None
+        return factors[-1]
+
+    def read(self, factor, start, stop, channels, stats=('min', 'max')):
+        """
+        Reads the bins of a level covering a window.
+
+        Parameters
+        ----------
+        factor : int
+            Decimation factor of the level.
+        start, stop : int
+            Window limits, in samples of the original data.
+        channels : array of int
+            Indices of the channels, in increasing order.
+        stats : tuple of str
+            Statistics to read, from 'min', 'max' and 'mean'.
+
+        Returns
+        -------
+        offset : int
+            Sample index of the first bin.
+        values : list of arrays
+            One array per statistic, with dimensions (nBins, len(channels)).
+        """
+        level = self.levels[factor]
+        b0 = start // factor
+        b1 = int(np.ceil(stop / factor))
+        # Read the contiguous span of channels and select from it in memory
+        channels = np.asarray(channels)
+        c0, c1 = channels[0], channels[-1] + 1
+        values = [level[stat][b0:b1, c0:c1][:, channels - c0] for stat in stats]
+        return b0 * factor, values
+
+    def close(self):
+        self.file.close()
@@ -1,9 +1,11 @@
 import numpy as np
 from scipy import signal as sgn
-from pynwb import NWBHDF5IO, ProcessingModule
+from pynwb import ProcessingModule
 from pynwb.ecephys import ElectricalSeries
 from ndx_spectrum import Spectrum
 
+from ecogvis.functions.nwb_io import open_nwb
+
 
 def psd_estimate(src_file, type):
     """
@@ -18,7 +20,7 @@ def psd_estimate(src_file, type):
     """
 
     # Open file
-    with NWBHDF5IO(src_file, mode='r+', load_namespaces=True) as io:
+    with open_nwb(src_file, 'r+', access='sweep') as io:
         nwb = io.read()
 
         # Source ElectricalSeries
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Dataset-like previews of processed signals, computed on the fly for the
+windows being read, so processing choices can be judged before running them
+on a whole recording.
+"""
+import numpy as np
+from scipy import signal
+
+from process_nwb.linenoise_notch import apply_linenoise_notch
+from process_nwb.wavelet_transform import gaussian
+from ecogvis.signal_processing.common_referencing import subtract_CAR
+from ecogvis.signal_processing.hilbert_transform import hilbert_transform
+from ecogvis.signal_processing import bands as default_bands
+
+
+TIME_BLOCK = 8192       # samples per tile, see PreprocessedPreview.chunks
+CHANNEL_BLOCK = 16      # channels per tile, see HighGammaPreview.chunks
+
+
+def default_high_gamma_bands():
+    """
+    Gaussian filters of the default high gamma bands, the same as in the
+    High Gamma dialog, as a [2, nBands] array of centers and sigmas (Hz).
+    """
+    return np.array([default_bands.chang_lab['cfs'][29:37],
+                     default_bands.chang_lab['sds'][29:37]])
+
+
+class PreprocessedPreview:
+    """
+    Raw signals referenced, notch and bandpass filtered on the fly.
+
+    It behaves like a read-only 2D h5py dataset: it has shape, dtype, name
+    and chunks attributes and can be sliced with [start:stop, c0:c1]. Each
+    read is processed with padding on both sides, so that filter transients
+    fall outside of it. Reads aligned to chunks, e.g. the tiles of a
+    TileCache, are processed once and cached there.
+
+    Parameters
+    ----------
+    data : h5py dataset or array
+        Raw signals, dimensions (nSamples, nChannels).
+    rate : float
+        Sampling rate, in Hz.
+    car : int or None
+        Number of channels per block of the common average reference, as in
+        subtract_CAR(). 'None' for no referencing.
+    notch : float or None
+        Line noise frequency, in Hz, removed with its harmonics. 'None' for
+        no notch filtering.
+    band : tuple of floats or None
+        Low and high cutoff frequencies, in Hz, of the bandpass filter.
+        Either can be 'None', for a highpass or lowpass filter. 'None' for no
+        bandpass filtering.
+    pad : int
+        Samples added on each side of the reads. Defaults to 1 second, or
+        3 periods of the low cutoff frequency if longer.
+    """
+    def __init__(self, data, rate, car=16, notch=60., band=None, pad=None):
+        self.data = data
+        self.rate = rate
+        self.car = car
+        self.notch = notch
+        self.band = band
+        self.shape = tuple(data.shape)
+        self.dtype = np.dtype('float32')
+        self.ndim = 2
+        # Channel chunks aligned with the CAR blocks, so each one is referenced on its own
+        self.chunks = (TIME_BLOCK, car or min(16, self.shape[1]))
+        if pad is None:
+            pad = int(rate)
+            if band is not None and band[0] is not None:
+                pad = max(pad, int(3 * rate / band[0]))
+        self.pad = pad
+        self.sos = None
+        if band is not None and (band[0] is not None or band[1] is not None):
+            nyquist = rate / 2.
+            if band[0] is not None and band[1] is not None:
+                self.sos = signal.butter(4, [band[0] / nyquist, band[1] / nyquist], btype='bandpass', output='sos')
+            elif band[0] is not None:
+                self.sos = signal.butter(4, band[0] / nyquist, btype='highpass', output='sos')
+            else:
+                self.sos = signal.butter(4, band[1] / nyquist, btype='lowpass', output='sos')
+        # Identifies the data and settings, e.g. in TileCache keys
+        self.name = '{}?car={}&notch={}&band={}'.format(getattr(data, 'name', id(data)), car, notch, band)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        rows, cols = key
+        start, stop, step = rows.indices(self.shape[0])
+        c0, c1, c_step = cols.indices(self.shape[1])
+        if step != 1 or c_step != 1:
+            raise ValueError('Only contiguous reads are supported.')
+        if stop <= start or c1 <= c0:
+            return np.zeros((max(stop - start, 0), max(c1 - c0, 0)), dtype=self.dtype)
+        # Whole CAR blocks, with padding
+        if self.car is not None:
+            g0, g1 = c0 // self.car * self.car, min(int(np.ceil(c1 / self.car)) * self.car, self.shape[1])
+        else:
+            g0, g1 = c0, c1
+        p0, p1 = max(start - self.pad, 0), min(stop + self.pad, self.shape[0])
+        X = np.asarray(self.data[p0:p1, g0:g1], dtype='float64')
+        X = self.process(X)
+        return X[start - p0:stop - p0, c0 - g0:c1 - g0].astype(self.dtype)
+
+    def process(self, X):
+        """
+        Processes a block of signals.
+
+        Parameters
+        ----------
+        X : array
+            Signals, dimensions (nSamples, nChannels). If referencing is on,
+            channels are whole CAR blocks.
+
+        Returns
+        -------
+        X : array
+            Processed signals, same dimensions.
+        """
+        if self.car is not None:
+            X = subtract_CAR(X.T, b_size=self.car).T
+        if self.notch == 60.:
+            # Default of apply_linenoise_notch, as in processing_data
+            X = apply_linenoise_notch(X, self.rate)
+        elif self.notch is not None:
+            X = apply_linenoise_notch(X, self.rate, noise_hz=self.notch)
+        if self.sos is not None and X.shape[0] > 3 * (2 * len(self.sos) + 1):
+            X = signal.sosfiltfilt(self.sos, X, axis=0)
+        return X
+
+
+class HighGammaPreview:
+    """
+    High gamma power computed on the fly, as in high_gamma_estimation(): the
+    average over bands of the amplitude of the Hilbert transform with
+    Gaussian filters.
+
+    It behaves like a read-only 2D h5py dataset, as PreprocessedPreview,
+    and each read is processed with padding on both sides.
+
+    Parameters
+    ----------
+    data : h5py dataset or dataset-like
+        Preprocessed signals, dimensions (nSamples, nChannels), e.g. a
+        PreprocessedPreview of raw signals.
+    rate : float
+        Sampling rate, in Hz.
+    bands_vals : [2, nBands] array
+        Gaussian filters centers and sigmas, in Hz. Defaults to
+        default_high_gamma_bands(). Bands above the Nyquist frequency are
+        left out.
+    pad : int
+        Samples added on each side of the reads. Defaults to 1 second.
+    """
+    def __init__(self, data, rate, bands_vals=None, pad=None):
+        self.data = data
+        self.rate = rate
+        if bands_vals is None:
+            bands_vals = default_high_gamma_bands()
+        bands_vals = np.asarray(bands_vals)
+        self.bands_vals = bands_vals[:, bands_vals[0] < rate / 2.]
+        self.shape = tuple(data.shape)
+        self.dtype = np.dtype('float32')
+        self.ndim = 2
+        self.chunks = (TIME_BLOCK, min(CHANNEL_BLOCK, self.shape[1]))
+        self.pad = int(rate) if pad is None else pad
+        # Identifies the data and settings, e.g. in TileCache keys
+        bands_str = ','.join('{:.1f}/{:.1f}'.format(*b) for b in self.bands_vals.T)
+        self.name = '{}?high_gamma={}'.format(getattr(data, 'name', id(data)), bands_str)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        rows, cols = key
+        start, stop, step = rows.indices(self.shape[0])
+        c0, c1, c_step = cols.indices(self.shape[1])
+        if step != 1 or c_step != 1:
+            raise ValueError('Only contiguous reads are supported.')
+        if stop <= start or c1 <= c0:
+            return np.zeros((max(stop - start, 0), max(c1 - c0, 0)), dtype=self.dtype)
+        p0, p1 = max(start - self.pad, 0), min(stop + self.pad, self.shape[0])
+        X = np.asarray(self.data[p0:p1, c0:c1])
+        return self.process(X)[start - p0:stop - p0]
+
+    def process(self, X):
+        """
+        High gamma power of a block of signals, scaled for a recording of
+        self.shape[0] samples.
+
+        Parameters
+        ----------
+        X : array
+            Signals, dimensions (nSamples, nChannels).
+
+        Returns
+        -------
+        HG : array
+            High gamma power, same dimensions.
+        """
+        Xch = (X.T * 1e6).astype('float32')     # 1e6 scaling helps with numerical accuracy
+        HG = np.zeros(Xch.shape, dtype='float32')
+        if self.bands_vals.shape[1] == 0:
+            return HG.T
+        X_fft_h = None
+        for bp0, bp1 in self.bands_vals.T:
+            kernel = gaussian(Xch.shape[-1], self.rate, bp0, bp1)
+            X_analytic, X_fft_h = hilbert_transform(Xch, self.rate, kernel, phase=None, X_fft_h=X_fft_h)
+            HG += abs(X_analytic).astype('float32')
+        # The filters have unit norm, which grows with the square root of the
+        # number of samples: scale as if the whole recording was transformed
+        # at once, so that values match high_gamma_estimation()
+        HG *= np.sqrt(Xch.shape[-1] / self.shape[0]) / self.bands_vals.shape[1]
+        return HG.T
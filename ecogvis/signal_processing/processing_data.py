@@ -5,10 +5,11 @@ import os
 import numpy as np
 import warnings
 
-from pynwb import NWBHDF5IO, ProcessingModule
+from pynwb import ProcessingModule
 from pynwb.ecephys import LFP, ElectricalSeries
 from pynwb.core import DynamicTable, VectorData
 from pynwb.misc import DecompositionSeries
+from hdmf.backends.hdf5 import H5DataIO
 
 from ecogvis.signal_processing.hilbert_transform import hilbert_transform
 from process_nwb.wavelet_transform import gaussian
@@ -16,6 +17,7 @@ from process_nwb.resample import resample
 from process_nwb.linenoise_notch import apply_linenoise_notch
 from ecogvis.signal_processing.common_referencing import subtract_CAR
 from ecogvis.functions.nwb_copy_file import nwb_copy_file
+from ecogvis.functions.nwb_io import open_nwb, chunk_stats
 
 
 def processing_data(path, subject, blocks, mode=None, config=None, new_file=''):
@@ -69,7 +71,7 @@ def make_new_nwb(old_file, new_file, cp_objs=None):
         }
 
     # Open original signal file
-    with NWBHDF5IO(old_file, 'r', load_namespaces=True) as io:
+    with open_nwb(old_file, 'r') as io:
         nwb_old = io.read()
 
         if ('acquisition' in cp_objs) and \
@@ -121,7 +123,7 @@ def preprocess_raw_data(block_path, config):
     block_name = os.path.splitext(block_path)[0]
     start = time.time()
 
-    with NWBHDF5IO(block_path, 'r+', load_namespaces=True) as io:
+    with open_nwb(block_path, 'r+', access='sweep') as io:
         nwb = io.read()
 
         # Storage of processed signals on NWB file ----------------------------
@@ -166,12 +168,17 @@ def preprocess_raw_data(block_path, config):
                 X = np.zeros((source.data.shape[1], T))
 
                 # One channel at a time, to improve memory usage for long signals
+                stats = chunk_stats(source.data)
                 for ch in np.arange(nChannels):
                     # 1e6 scaling helps with numerical accuracy
                     Xch = source.data[:, ch] * 1e6
+                    if stats is not None:
+                        stats.record(source.data.shape, (slice(None), ch))
                     X[ch, :] = resample(Xch, rate, source.rate)
                 print('Downsampling finished in {} seconds'.format(
                     time.time() - start))
+                if stats is not None:
+                    print('Raw data: ' + str(stats))
             else:  # No downsample
                 rate = source.rate
                 X = source.data[()].T * 1e6
@@ -369,7 +376,7 @@ def spectral_decomposition(block_path, bands_vals):
     band_param_0 = bands_vals[0, :]
     band_param_1 = bands_vals[1, :]
 
-    with NWBHDF5IO(block_path, 'r+', load_namespaces=True) as io:
+    with open_nwb(block_path, 'r+', access='sweep') as io:
         nwb = io.read()
         lfp = nwb.processing['ecephys'].data_interfaces['LFP'].electrical_series['preprocessed']
         rate = lfp.rate
@@ -382,8 +389,11 @@ def spectral_decomposition(block_path, bands_vals):
         # Apply Hilbert transform ---------------------------------------------
         print('Running Spectral Decomposition...')
         start = time.time()
+        stats = chunk_stats(lfp.data)
         for ch in np.arange(nChannels):
             Xch = lfp.data[:, ch] * 1e6       # 1e6 scaling helps with numerical accuracy
+            if stats is not None:
+                stats.record(lfp.data.shape, (slice(None), ch))
             Xch = Xch.reshape(1, -1)
             Xch = Xch.astype('float32')     # signal (nChannels,nSamples)
             X_fft_h = None
@@ -392,6 +402,8 @@ def spectral_decomposition(block_path, bands_vals):
                 X_analytic, X_fft_h = hilbert_transform(Xch, rate, kernel, phase=None, X_fft_h=X_fft_h)
                 Xp[ii, ch, :] = abs(X_analytic).astype('float32')
         print('Spectral Decomposition finished in {} seconds'.format(time.time() - start))
+        if stats is not None:
+            print('Preprocessed data: ' + str(stats))
 
         # data: (ndarray) dims: num_times * num_channels * num_bands
         Xp = np.swapaxes(Xp, 0, 2)
@@ -414,9 +426,11 @@ def spectral_decomposition(block_path, bands_vals):
             columns=[band_param_0V, band_param_1V],
             colnames=['filter_param_0', 'filter_param_1']
         )
+        # One band per chunk, so that each band can be read on its own
+        chunks = (min(nSamples, 4096), min(nChannels, 16), 1)
         decs = DecompositionSeries(
             name='DecompositionSeries',
-            data=Xp,
+            data=H5DataIO(Xp, chunks=chunks),
             description='Analytic amplitude estimated with Hilbert transform.',
             metric='amplitude',
             unit='V',
@@ -459,7 +473,7 @@ def high_gamma_estimation(block_path, bands_vals, new_file=''):
     band_param_0 = bands_vals[0, :]
     band_param_1 = bands_vals[1, :]
 
-    with NWBHDF5IO(block_path, 'r+', load_namespaces=True) as io:
+    with open_nwb(block_path, 'r' if new_file else 'r+', access='sweep') as io:
         nwb = io.read()
         lfp = nwb.processing['ecephys'].data_interfaces['LFP'].electrical_series['preprocessed']
         rate = lfp.rate
@@ -472,8 +486,11 @@ def high_gamma_estimation(block_path, bands_vals, new_file=''):
         # Apply Hilbert transform ---------------------------------------------
         print('Running High Gamma estimation...')
         start = time.time()
+        stats = chunk_stats(lfp.data)
         for ch in np.arange(nChannels):
             Xch = lfp.data[:, ch] * 1e6       # 1e6 scaling helps with numerical accuracy
+            if stats is not None:
+                stats.record(lfp.data.shape, (slice(None), ch))
             Xch = Xch.reshape(1, -1)
             Xch = Xch.astype('float32')     # signal (nChannels,nSamples)
             X_fft_h = None
@@ -483,6 +500,8 @@ def high_gamma_estimation(block_path, bands_vals, new_file=''):
                     Xch, rate, kernel, phase=None, X_fft_h=X_fft_h)
                 Xp[ii, ch, :] = abs(X_analytic).astype('float32')
         print('High Gamma estimation finished in {} seconds'.format(time.time() - start))
+        if stats is not None:
+            print('Preprocessed data: ' + str(stats))
 
         # data: (ndarray) dims: num_times * num_channels * num_bands
         Xp = np.swapaxes(Xp, 0, 2)
@@ -520,7 +539,7 @@ def high_gamma_estimation(block_path, bands_vals, new_file=''):
             io.write(nwb)
             print('High Gamma power saved in ' + block_path)
         else:  # on new file
-            with NWBHDF5IO(new_file, 'r+', load_namespaces=True) as io_new:
+            with open_nwb(new_file, 'r+') as io_new:
                 nwb_new = io_new.read()
                 # make electrodes table
                 nElecs = HG.shape[1]
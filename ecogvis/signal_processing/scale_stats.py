@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Robust per-channel scale statistics of long recordings, for stable vertical
+scaling of the traces.
+"""
+import numpy as np
+
+
+STAT_SAMPLES = 16384    # samples per channel the statistics are computed from
+BLOCK_BYTES = 8 * 2**20  # approximate size of each block read
+MAD_TO_SIGMA = 1.4826   # standard deviation of a normal signal over its MAD
+STAT_NAMES = ['median', 'mad', 'p01', 'p99']
+
+
+class ScaleStatsAccumulator:
+    """
+    Collects an evenly spaced subsample of a recording, one block of
+    consecutive samples at a time, and computes robust statistics of each
+    channel from it.
+
+    Parameters
+    ----------
+    n_samples : int
+        Number of samples of the recording.
+    n_channels : int
+        Number of channels of the recording.
+    max_samples : int
+        Maximum number of samples per channel kept.
+    """
+    def __init__(self, n_samples, n_channels, max_samples=STAT_SAMPLES):
+        self.stride = max(1, int(np.ceil(n_samples / max_samples)))
+        self.n_channels = n_channels
+        self.samples = []
+
+    def add(self, block, start):
+        """
+        Adds a block of consecutive samples.
+
+        Parameters
+        ----------
+        block : array
+            Data with dimensions (nSamples, nChannels).
+        start : int
+            Index of the first sample of the block in the recording.
+        """
+        first = -start % self.stride
+        self.samples.append(np.asarray(block[first::self.stride], dtype='float64'))
+
+    def result(self):
+        """
+        Returns
+        -------
+        stats : dict
+            Arrays with one value per channel: 'median', 'mad' (median
+            absolute deviation from the median), 'p01' and 'p99' (1st and 99th
+            percentiles).
+        """
+        if len(self.samples) == 0:
+            return {name: np.zeros(self.n_channels) for name in STAT_NAMES}
+        samples = np.concatenate(self.samples, axis=0)
+        median = np.median(samples, axis=0)
+        return {
+            'median': median,
+            'mad': np.median(np.abs(samples - median), axis=0),
+            'p01': np.percentile(samples, 1, axis=0),
+            'p99': np.percentile(samples, 99, axis=0),
+        }
+
+
+def robust_scale_stats(data, max_samples=STAT_SAMPLES):
+    """
+    Robust statistics of each channel of a recording, from a subsample of at
+    most max_samples per channel, see ScaleStatsAccumulator.
+
+    Parameters
+    ----------
+    data : h5py dataset or array
+        Signal with dimensions (nSamples, nChannels).
+    max_samples : int
+        Maximum number of samples per channel used.
+
+    Returns
+    -------
+    stats : dict
+        Arrays with one value per channel: 'median', 'mad', 'p01' and 'p99'.
+    """
+    n_samples, n_channels = data.shape
+    acc = ScaleStatsAccumulator(n_samples, n_channels, max_samples)
+    block_size = max(1, BLOCK_BYTES // (n_channels * np.dtype(data.dtype).itemsize))
+    for start in range(0, n_samples, block_size):
+        acc.add(data[start:start + block_size], start)
+    return acc.result()
+
+
+def robust_sigma(stats):
+    """
+    Robust estimate of the standard deviation of each channel, from its
+    median absolute deviation. Channels with a MAD of zero (e.g. mostly
+    flat) fall back to their 1-99 percentile range.
+    """
+    sigma = MAD_TO_SIGMA * stats['mad']
+    spread = (stats['p99'] - stats['p01']) / 4.65   # 1-99 percentiles of a normal signal
+    return np.where(sigma > 0, sigma, spread)
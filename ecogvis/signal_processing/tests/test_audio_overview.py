@@ -0,0 +1,31 @@
+import numpy as np
+from ecogvis.signal_processing.audio_overview import AudioOverview
+
+
+def test_audio_overview():
+    np.random.seed(0)
+    rate = 16000.
+    data = np.random.randn(64 * 512 * 4 + 100)
+    data[70000] = 20.
+    data[-1] = -20.
+    overview = AudioOverview(data, rate)
+    assert overview.factors == [64, 128, 256]
+    assert overview.min == -20. and overview.max == 20.
+    n_full = len(data) // 128 * 128
+    expected = np.append(data[:n_full].reshape(-1, 128).min(1), data[n_full:].min())
+    np.testing.assert_array_equal(overview.mins[128], expected)
+
+    # Whole recording from the coarsest level, peaks kept
+    x, y = overview.window(0, len(data) / rate, 500)
+    assert len(y) == 2 * len(overview.mins[256])
+    assert y.max() == 20. and y.min() == -20.
+    assert x[0] == 0 and np.all(np.diff(x) > 0)
+
+    # Short windows from the data itself
+    x, y = overview.window(1., 1.01, 500)
+    np.testing.assert_array_equal(y, data[16000:16161])
+    np.testing.assert_allclose(x, np.arange(16000, 16161) / rate)
+
+    # Windows beyond the end of the recording are empty
+    x, y = overview.window(100., 101., 500)
+    assert len(x) == 0 and len(y) == 0
@@ -0,0 +1,68 @@
+import numpy as np
+from datetime import datetime
+from dateutil.tz import tzlocal
+from pynwb import NWBFile, NWBHDF5IO, TimeSeries
+from ecogvis.signal_processing.batch_detect_events import batch_detect_events, load_config
+import os
+
+
+def create_audio_nwbfile(path, onsets, fs=8000., mic_fs=8000., duration=6.):
+    t = np.arange(int(duration * fs)) / fs
+    t_mic = np.arange(int(duration * mic_fs)) / mic_fs
+    rng = np.random.RandomState(0)
+    speaker = rng.randn(len(t)) * 0.001
+    mic = rng.randn(len(t_mic)) * 0.001
+    for onset in onsets:
+        on = (t >= onset) & (t < onset + 0.4)
+        speaker[on] += np.sin(2 * np.pi * 300 * t[on])
+        on = (t_mic >= onset + 1) & (t_mic < onset + 1.3)
+        mic[on] += np.sin(2 * np.pi * 200 * t_mic[on])
+    nwbfile = NWBFile('description', 'id', datetime.now(tzlocal()))
+    nwbfile.add_stimulus(TimeSeries(name='speaker1', data=speaker, unit='V', rate=fs))
+    nwbfile.add_acquisition(TimeSeries(name='microphone', data=mic, unit='V', rate=mic_fs))
+    with NWBHDF5IO(path, 'w') as io:
+        io.write(nwbfile)
+
+
+def test_batch_detect_events(tmpdir):
+    paths = [os.path.join(str(tmpdir), 'EC1_B{}.nwb'.format(i)) for i in [1, 2]]
+    create_audio_nwbfile(paths[0], onsets=[1., 3.])
+    create_audio_nwbfile(paths[1], onsets=[0.5, 2.5, 4.], mic_fs=16000.)   # mic at another rate
+    broken_path = os.path.join(str(tmpdir), 'EC1_B3.nwb')
+    with open(broken_path, 'w') as f:
+        f.write('not an HDF5 file')
+    config_file = os.path.join(str(tmpdir), 'config.yml')
+    with open(config_file, 'w') as f:
+        f.write('downsample_rate: 800\nrefine: true\nthresholds: {speaker: 0.05, mic: 0.05}\n')
+    assert load_config(config_file)['smooth_width'] == 0.4
+    partial_file = os.path.join(str(tmpdir), 'partial.yml')
+    with open(partial_file, 'w') as f:
+        f.write('thresholds: {speaker: 0.2}\n')
+    assert load_config(partial_file)['thresholds'] == {'speaker': 0.2, 'mic': 0.1}
+    assert load_config()['thresholds'] == {'speaker': 0.05, 'mic': 0.1}
+
+    report_path = os.path.join(str(tmpdir), 'report.csv')
+    report = batch_detect_events([str(tmpdir)], config=config_file, n_jobs=2,
+                                 report_path=report_path)
+    assert os.path.isfile(report_path)
+    # A broken file is reported and does not stop the others
+    assert list(report['file'].unique()) == paths + [broken_path]
+    status = report.set_index('file')['status']
+    assert status[broken_path] == 'failed'
+    assert list(status[paths[1]]) == ['ok', 'ok']
+    counts = report.set_index(['file', 'signal'])['n_events']
+    assert counts[(paths[0], 'speaker')] == 2
+    assert counts[(paths[1], 'speaker')] == 3
+    assert counts[(paths[1], 'mic')] == 3
+
+    with NWBHDF5IO(paths[1], 'r') as io:
+        nwbfile = io.read()
+        starts = nwbfile.intervals['TimeIntervals_speaker']['start_time'].data[:]
+        np.testing.assert_allclose(starts, [0.5, 2.5, 4.], atol=0.01)
+        assert len(nwbfile.intervals['TimeIntervals_mic']) == 3
+        starts = nwbfile.intervals['TimeIntervals_mic']['start_time'].data[:]
+        np.testing.assert_allclose(starts, [1.5, 3.5, 5.], atol=0.01)
+
+    # Files with existing intervals are skipped
+    report = batch_detect_events(paths, config=config_file)
+    assert list(report['status']) == ['intervals exist', 'intervals exist']
@@ -0,0 +1,43 @@
+import numpy as np
+from ecogvis.signal_processing.decimation import minmax_decimate, interleave_minmax
+
+
+def test_minmax_decimate():
+    np.random.seed(0)
+    data = np.random.randn(10007, 3)
+    data[5000, 1] = 100.
+    data[7000, 2] = -100.
+
+    x, out = minmax_decimate(data, n_bins=500, offset=20)
+    bin_size = int(np.ceil(data.shape[0] / 500))
+    assert out.shape[1] == 3
+    assert out.shape[0] == 2 * int(np.ceil(data.shape[0] / bin_size))
+    assert len(x) == out.shape[0]
+    assert x[0] == 20
+    # Peaks are kept and global extremes are the same
+    np.testing.assert_array_equal(out.max(0), data.max(0))
+    np.testing.assert_array_equal(out.min(0), data.min(0))
+    # Extremes of each bin appear in order of occurrence
+    first = data[:bin_size, 0]
+    expected = sorted([first.min(), first.max()],
+                      key=lambda v: np.where(first == v)[0][0])
+    np.testing.assert_array_equal(out[:2, 0], expected)
+
+
+def test_minmax_decimate_short_and_1d():
+    data = np.arange(50.)
+    x, out = minmax_decimate(data, n_bins=100, offset=10)
+    np.testing.assert_array_equal(out, data)
+    np.testing.assert_array_equal(x, np.arange(10, 60))
+
+    x, out = minmax_decimate(np.sin(np.arange(4000) / 50.), n_bins=100)
+    assert out.ndim == 1
+    assert len(x) == len(out) == 200
+
+
+def test_interleave_minmax():
+    mins = np.array([[0., 1.], [2., 3.]])
+    maxs = mins + 10
+    x, out = interleave_minmax(mins, maxs, bin_size=4, offset=8)
+    np.testing.assert_array_equal(x, [8, 10, 12, 14])
+    np.testing.assert_array_equal(out[:, 0], [0, 10, 2, 12])
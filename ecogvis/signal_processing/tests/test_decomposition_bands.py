@@ -0,0 +1,54 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+from ecogvis.signal_processing.decomposition_bands import DecompositionBands, band_power_image
+
+
+class CountingData:
+    """Array wrapper that counts reads and the bands they select."""
+    def __init__(self, array, chunks=None):
+        self.array = array
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self.chunks = chunks
+        self.name = 'data'
+        self.reads = []
+
+    def __getitem__(self, item):
+        self.reads.append(item[2])
+        return self.array[item]
+
+
+def test_decomposition_bands():
+    array = np.random.rand(5000, 10, 6).astype('float32')
+
+    # Bands chunked together: other bands of the chunk come from the slab
+    data = CountingData(array, chunks=(1000, 10, 3))
+    bands = DecompositionBands(data)
+    band = bands.band(1)
+    assert band is bands.band(1)
+    assert band.shape == (5000, 10) and band.chunks == (1000, 10)
+    assert band.name != bands.band(2).name
+    assert_array_equal(band[100:900, 2:5], array[100:900, 2:5, 1])
+    assert_array_equal(bands.band(2)[100:900, 2:5], array[100:900, 2:5, 2])
+    assert_array_equal(bands.band(0)[100:900, 2:5], array[100:900, 2:5, 0])
+    assert data.reads == [slice(0, 3)]
+    assert_array_equal(bands.band(4)[100:900, 2:5], array[100:900, 2:5, 4])
+    assert data.reads == [slice(0, 3), slice(3, 6)]
+
+    # One band per chunk, or no chunks: only the band is read
+    data = CountingData(array)
+    bands = DecompositionBands(data)
+    assert_array_equal(bands.band(5)[:, :], array[:, :, 5])
+    assert data.reads == [5]
+
+
+def test_band_power_image():
+    power = np.ones((1000, 2, 3))
+    power[:, :, 2] *= 10            # higher power in a band is normalized away
+    power[500:, 1, 0] *= 4          # response of one band of one channel
+    bin_size, image = band_power_image(power, n_bins=100)
+    assert bin_size == 10 and image.shape == (100, 6)
+    np.testing.assert_allclose(image[:, [1, 2, 4, 5]], 0)
+    np.testing.assert_allclose(image[:, 0], 0)
+    np.testing.assert_allclose(image[:50, 3], 0)
+    np.testing.assert_allclose(image[50:, 3], 2)
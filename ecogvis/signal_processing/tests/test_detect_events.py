@@ -1,7 +1,11 @@
 import numpy as np
+import pytest
 from pynwb import TimeSeries
-from ecogvis.signal_processing.detect_events import detect_events, threshcross
+from ecogvis.signal_processing.detect_events import (detect_events, threshcross, smooth_signal,
+                                                     refine_events, detect_events_multichannel,
+                                                     EnvelopeCache)
 from scipy.io import wavfile
+import scipy.signal as sgn
 import os
 
 
@@ -44,3 +48,148 @@ def test_threshcross():
     out = threshcross(data, threshold=0.08)
     out_expected = np.array([2, 7, 9, 11, 14, 23, 25, 27, 31, 33, 40, 45, 49])
     np.testing.assert_equal(out, out_expected)
+
+
+def test_smooth_signal():
+    np.random.seed(0)
+    x = np.random.randn(5000) ** 2
+
+    # Fast running median gives the same output as scipy.signal.medfilt
+    out = smooth_signal(x, kernel_size=101, method='median')
+    np.testing.assert_array_almost_equal(out, sgn.medfilt(x, kernel_size=101))
+
+    boxcar = smooth_signal(x, kernel_size=101, method='boxcar')
+    rms = smooth_signal(x, kernel_size=101, method='rms')
+    assert boxcar.shape == x.shape
+    np.testing.assert_array_almost_equal(rms, np.sqrt(boxcar))
+    np.testing.assert_almost_equal(boxcar[2500], np.mean(x[2450:2551]))
+
+    with pytest.raises(ValueError):
+        smooth_signal(x, kernel_size=101, method='unknown')
+
+
+def test_envelope_cache():
+    fs = 8000.
+    t = np.arange(int(6 * fs)) / fs
+    x = np.random.RandomState(0).randn(len(t)) * 0.001
+    x[(t > 1) & (t < 1.5)] += np.sin(2 * np.pi * 300 * t[(t > 1) & (t < 1.5)])
+    x[(t > 3) & (t < 3.4)] += np.sin(2 * np.pi * 300 * t[(t > 3) & (t < 3.4)])
+    speaker_data = TimeSeries(name='speaker_data', data=x, unit='m', starting_time=0.0, rate=fs)
+
+    cache = EnvelopeCache()
+    out_cached = detect_events(speaker_data, interval=[0, len(t)], dfact=10, cache=cache)
+    filt = cache.envelope(speaker_data, interval=[0, len(t)], dfact=10)
+    assert filt is out_cached[2]
+
+    # Changing the threshold re-uses the stored envelope
+    out_cached = detect_events(speaker_data, interval=[0, len(t)], dfact=10,
+                               speaker_threshold=0.1, cache=cache)
+    out = detect_events(speaker_data, interval=[0, len(t)], dfact=10, speaker_threshold=0.1)
+    assert out_cached[2] is filt
+    np.testing.assert_array_almost_equal(out_cached[1], out[1])
+    assert len(out[1]) == 4
+
+
+def test_signals_read_once(monkeypatch):
+    import ecogvis.signal_processing.detect_events as detect_events_module
+    fs = 8000.
+    t = np.arange(int(4 * fs)) / fs
+    x = np.random.RandomState(0).randn(len(t)) * 0.001
+    x[(t > 1) & (t < 1.5)] += np.sin(2 * np.pi * 300 * t[(t > 1) & (t < 1.5)])
+    speaker_data = TimeSeries(name='speaker_data', data=x, unit='m', starting_time=0.0, rate=fs)
+    mic_data = TimeSeries(name='mic_data', data=x[::-1].copy(), unit='m', starting_time=0.0, rate=fs)
+
+    calls = []
+    downsample_signal = detect_events_module.downsample_signal
+
+    def counting_downsample_signal(data, *args, **kwargs):
+        calls.append(data.name)
+        return downsample_signal(data, *args, **kwargs)
+
+    monkeypatch.setattr(detect_events_module, 'downsample_signal', counting_downsample_signal)
+    # Without a cache, and with one that stores nothing
+    for cache in [None, EnvelopeCache(max_entries=0)]:
+        for n_jobs in [1, 2]:
+            calls.clear()
+            detect_events(speaker_data, mic_data, dfact=10, cache=cache, n_jobs=n_jobs)
+            assert sorted(calls) == ['mic_data', 'speaker_data']
+
+
+def test_refine_events():
+    fs = 8000.
+    t = np.arange(int(6 * fs)) / fs
+    x = np.random.RandomState(0).randn(len(t)) * 0.001
+    true_events = np.array([1., 1.5, 3., 3.4])
+    for start, stop in true_events.reshape((-1, 2)):
+        on = (t >= start) & (t < stop)
+        x[on] += np.sin(2 * np.pi * 300 * t[on])
+    speaker_data = TimeSeries(name='speaker_data', data=x, unit='m', starting_time=0.0, rate=fs)
+
+    # Heavy decimation gives coarse boundaries, refinement recovers them
+    _, coarse, _, _, _, _ = detect_events(speaker_data, dfact=200)
+    _, refined, _, _, _, _ = detect_events(speaker_data, dfact=200, refine=True)
+    assert np.max(np.abs(refined - true_events)) < 0.005
+    assert np.max(np.abs(refined - true_events)) < np.max(np.abs(coarse - true_events))
+
+    refined_direct = refine_events(speaker_data, coarse, window=0.5)
+    np.testing.assert_array_almost_equal(refined_direct, refined, decimal=3)
+
+    # Excluded samples are zeroed, whatever the order and overlaps of the exclude events
+    exclude = np.array([[3.3, 3.5], [0.2, 0.3], [0.9, 1.2], [1.0, 1.1], [4.5, 5.]])
+    refined_excluded = refine_events(speaker_data, coarse, window=0.5, exclude=exclude.ravel())
+    zeroed = x.copy()
+    for ex0, ex1 in exclude:
+        zeroed[int(ex0 * fs):int(ex1 * fs)] = 0
+    zeroed_data = TimeSeries(name='zeroed', data=zeroed, unit='m', starting_time=0.0, rate=fs)
+    np.testing.assert_array_equal(refined_excluded, refine_events(zeroed_data, coarse, window=0.5))
+    assert refined_excluded[0] > 1.1 and refined_excluded[3] < 3.31
+
+
+def test_detect_events_multichannel():
+    fs = 8000.
+    t = np.arange(int(6 * fs)) / fs
+    rng = np.random.RandomState(0)
+    signals = {}
+    for name, onsets in zip(['anin1', 'anin2', 'anin3'], [[1., 3.], [2., 4.], [1.5, 4.5]]):
+        x = rng.randn(len(t)) * 0.001
+        for onset in onsets:
+            on = (t >= onset) & (t < onset + 0.4)
+            x[on] += np.sin(2 * np.pi * 300 * t[on])
+        signals[name] = TimeSeries(name=name, data=x, unit='m', starting_time=0.0, rate=fs)
+    # anin2 picks up the anin1 events
+    signals['anin2'].data[:] += 0.5 * signals['anin1'].data[:]
+
+    masks = {'anin2': ['anin1']}
+    results = detect_events_multichannel(signals, thresholds=0.05, masks=masks, dfact=10, n_jobs=3)
+    sequential = detect_events_multichannel(signals, thresholds=0.05, masks=masks, dfact=10, n_jobs=1)
+    assert set(results.keys()) == {'anin1', 'anin2', 'anin3'}
+    for name in results:
+        np.testing.assert_array_almost_equal(results[name][1], sequential[name][1])
+    assert len(results['anin2'][1]) == 4
+    np.testing.assert_allclose(results['anin2'][1][::2], [2., 4.], atol=0.1)
+
+    with pytest.raises(ValueError):
+        detect_events_multichannel(signals, thresholds=0.05, dfact=10,
+                                   masks={'anin1': ['anin2'], 'anin2': ['anin1']})
+
+    # Chained masks: thresholds of anin1 change the mask of anin3 through anin2
+    signals['anin3'].data[:] += 0.5 * signals['anin2'].data[:]
+    masks = {'anin2': ['anin1'], 'anin3': ['anin2']}
+    cache = EnvelopeCache()
+    for threshold in [0.05, 0.9]:
+        thresholds = {'anin1': threshold, 'anin2': 0.05, 'anin3': 0.05}
+        cached = detect_events_multichannel(signals, thresholds=thresholds, masks=masks,
+                                            dfact=10, cache=cache)
+        fresh = detect_events_multichannel(signals, thresholds=thresholds, masks=masks, dfact=10)
+        for name in fresh:
+            np.testing.assert_array_equal(cached[name][2], fresh[name][2])
+
+    # Signals at different rates, downsampled to the same rate
+    signals = {'anin1': signals['anin1'],
+               'half': TimeSeries(name='half', data=signals['anin1'].data[::2].copy(), unit='m',
+                                  starting_time=0.0, rate=fs / 2)}
+    results = detect_events_multichannel(signals, thresholds=0.05, dfact=10)
+    per_signal = detect_events_multichannel(signals, thresholds=0.05, dfact={'anin1': 10, 'half': 5})
+    assert len(results['half'][0]) == len(t) // 20
+    assert len(per_signal['half'][0]) == len(t) // 10 == len(per_signal['anin1'][0])
+    np.testing.assert_allclose(per_signal['half'][1], per_signal['anin1'][1], atol=0.01)
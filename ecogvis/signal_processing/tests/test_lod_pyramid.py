@@ -0,0 +1,58 @@
+import os
+import numpy as np
+from ecogvis.signal_processing.lod_pyramid import (build_pyramid, open_pyramid, pyramid_factors,
+                                                   sidecar_path)
+
+
+def test_pyramid_factors():
+    assert pyramid_factors(64 * 512 - 1) == []
+    assert pyramid_factors(64 * 512 * 4) == [64, 128, 256]
+
+
+def test_build_and_open_pyramid(tmpdir, monkeypatch):
+    monkeypatch.setenv('ECOGVIS_SIDECAR_DIR', str(tmpdir.join('sidecar')))
+    nwb_path = str(tmpdir.join('EC1_B1.nwb'))
+    open(nwb_path, 'w').close()
+    np.random.seed(0)
+    data = np.random.randn(64 * 512 * 2 + 100, 4).astype('float32')
+    data[1000, 2] = 50.
+
+    pyramid = build_pyramid(data, nwb_path, dataset_name='/acquisition/raw/data')
+    assert pyramid.factors == [64, 128]
+    assert sidecar_path(nwb_path, '/acquisition/raw/data').is_file()
+
+    # Finest level against direct computation, including the last partial bin
+    offset, (mins, maxs, means) = pyramid.read(64, 0, data.shape[0], np.arange(4),
+                                               stats=('min', 'max', 'mean'))
+    assert offset == 0
+    assert mins.shape == (1024 + 2, 4)
+    np.testing.assert_allclose(mins[:1024], data[:65536].reshape(1024, 64, 4).min(1))
+    np.testing.assert_allclose(maxs[-1], data[65600:].max(0))
+    np.testing.assert_allclose(means[:1024], data[:65536].reshape(1024, 64, 4).mean(1), rtol=1e-5)
+    # Coarser level from the finer one, subset of channels
+    offset, (maxs,) = pyramid.read(128, 1000, 3000, np.array([1, 2]), stats=('max',))
+    assert offset == 896
+    np.testing.assert_allclose(maxs[0], data[896:1024, 1:3].max(0))
+    assert maxs[0, 1] == 50.
+    assert pyramid.level_for(64 * 1000, 500) == 128
+    assert pyramid.level_for(64 * 100, 500) is None
+    # Scale statistics from the same pass
+    np.testing.assert_allclose(pyramid.scale_stats['median'], np.median(data[::5], axis=0))
+    pyramid.close()
+
+    # Reused while unchanged, outdated when the file changes
+    pyramid = open_pyramid(nwb_path, '/acquisition/raw/data')
+    assert pyramid is not None
+    pyramid.close()
+    os.utime(nwb_path, (0, 0))
+    assert open_pyramid(nwb_path, '/acquisition/raw/data') is None
+    pyramid = open_pyramid(nwb_path, '/acquisition/raw/data', data=data)
+    assert pyramid is not None
+    pyramid.close()
+    data[0, 0] += 1
+    os.utime(nwb_path, (1, 1))
+    assert open_pyramid(nwb_path, '/acquisition/raw/data', data=data) is None
+
+    # Cancelled builds leave no pyramid behind
+    assert build_pyramid(data, nwb_path, dataset_name='/acquisition/raw/data', stop=lambda: True) is None
+    assert open_pyramid(nwb_path, '/acquisition/raw/data') is None
@@ -0,0 +1,70 @@
+import numpy as np
+from ecogvis.signal_processing.common_referencing import subtract_CAR
+from ecogvis.signal_processing.preview import PreprocessedPreview, HighGammaPreview
+
+
+def test_preprocessed_preview():
+    np.random.seed(0)
+    rate = 1000.
+    t = np.arange(20000) / rate
+    common = np.sin(2 * np.pi * 60 * t)[:, np.newaxis]
+    data = (np.random.randn(20000, 20) + common).astype('float32')
+    data[:, 16:] += 5 * np.sin(2 * np.pi * 3 * t)[:, np.newaxis]
+
+    # Referencing only, equal to subtract_CAR on the whole recording
+    preview = PreprocessedPreview(data, rate, car=16, notch=None)
+    assert preview.shape == (20000, 20) and preview.chunks == (8192, 16)
+    expected = subtract_CAR(data.T.astype('float64'), b_size=16).T
+    np.testing.assert_allclose(preview[5000:6000, 3:18], expected[5000:6000, 3:18], atol=1e-5)
+
+    # Windows match the whole recording processed at once, away from its edges
+    preview = PreprocessedPreview(data, rate, car=16, notch=60., band=(1., 200.))
+    whole = preview.process(data.astype('float64'))
+    window = preview[8000:9000, 0:20]
+    assert window.dtype == np.float32
+    np.testing.assert_allclose(window, whole[8000:9000], atol=0.05 * np.std(whole))
+
+    # Line noise is removed without referencing
+    window = PreprocessedPreview(data, rate, car=None, notch=60.)[8000:9000, 0:1]
+    freqs = np.fft.rfftfreq(1000, 1 / rate)
+    before = np.abs(np.fft.rfft(data[8000:9000, 0]))[freqs == 60]
+    after = np.abs(np.fft.rfft(window[:, 0]))[freqs == 60]
+    assert after < 0.05 * before
+
+    # Different settings are different datasets
+    assert preview.name != PreprocessedPreview(data, rate, car=None).name
+
+
+def test_high_gamma_preview():
+    np.random.seed(0)
+    rate = 250.
+    t = np.arange(8000) / rate
+    data = 1e-6 * np.random.randn(8000, 4)
+    data[4000:5000, 1] += 1e-5 * np.sin(2 * np.pi * 100 * t[4000:5000])   # burst of high gamma
+    preview = HighGammaPreview(data, rate)
+    assert preview.bands_vals.shape[1] == 6      # the last 2 bands are above Nyquist
+    whole = preview.process(data)
+    window = preview[3000:6000, 1:3]
+    assert window.shape == (3000, 2) and window.dtype == np.float32
+    np.testing.assert_allclose(window, whole[3000:6000, 1:3], rtol=1e-2, atol=1e-2 * whole.max())
+    assert window[1000:2000, 0].mean() > 5 * window[:500, 0].mean()
+    assert window[1000:2000, 0].mean() > 5 * window[1000:2000, 1].mean()
+
+
+def test_preprocessed_preview_notch():
+    np.random.seed(0)
+    rate = 1000.
+    t = np.arange(10000) / rate
+    line = np.sin(2 * np.pi * 60 * t) + .5 * np.sin(2 * np.pi * 180 * t)
+    data = (.1 * np.random.randn(10000, 2) + line[:, np.newaxis]).astype('float32')
+    preview = PreprocessedPreview(data, rate, car=None, notch=60.)
+    window = preview[4000:6000, 0:2]
+    assert window.shape == (2000, 2) and window.dtype == np.float32
+    freqs = np.fft.rfftfreq(2000, 1 / rate)
+    before = np.abs(np.fft.rfft(data[4000:6000], axis=0))
+    after = np.abs(np.fft.rfft(window, axis=0))
+    for f in [60, 180]:
+        assert np.all(after[freqs == f] < 0.05 * before[freqs == f])
+    # Away from the line noise, signals are kept
+    residual = window - (data[4000:6000] - line[4000:6000, np.newaxis])
+    assert np.all(np.std(residual, axis=0) < 0.2 * np.std(data[4000:6000] - line[4000:6000, np.newaxis], axis=0))
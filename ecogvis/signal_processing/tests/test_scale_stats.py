@@ -0,0 +1,29 @@
+import numpy as np
+from ecogvis.signal_processing.scale_stats import (ScaleStatsAccumulator, robust_scale_stats,
+                                                   robust_sigma)
+
+
+def test_scale_stats_blocks_and_outliers():
+    np.random.seed(0)
+    data = np.random.randn(100000, 3) * np.array([1., 10., 0.])
+    data[::1000, 0] = 1e4      # artifacts barely change the robust scale
+    stats = robust_scale_stats(data, max_samples=10000)
+    assert stats['mad'].shape == (3,)
+    sigma = robust_sigma(stats)
+    np.testing.assert_allclose(sigma[:2], [1., 10.], rtol=0.05)
+    assert sigma[2] == 0.
+
+    # Blocks of any size give the statistics of the same subsample
+    acc = ScaleStatsAccumulator(100000, 3, max_samples=10000)
+    for start in range(0, 100000, 777):
+        acc.add(data[start:start + 777], start)
+    for name, values in acc.result().items():
+        np.testing.assert_array_equal(values, stats[name])
+    np.testing.assert_array_equal(stats['median'], np.median(data[::10], axis=0))
+
+
+def test_robust_sigma_flat_channels():
+    data = np.zeros((1000, 1))
+    data[::10] = 1.     # MAD is zero, the 1-99 percentile range is not
+    sigma = robust_sigma(robust_scale_stats(data))
+    assert sigma[0] > 0
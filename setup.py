@@ -38,6 +38,10 @@ setup(
         'ndx-icephys-meta',
         'ndx-hierarchical-behavioral-data'],
     entry_points={
-        'console_scripts': ['ecogvis=ecogvis.ecogvis:cmd_line_shortcut'],
+        'console_scripts': [
+            'ecogvis=ecogvis.ecogvis:cmd_line_shortcut',
+            'ecogvis-detect-events=ecogvis.signal_processing.batch_detect_events:cmd_line_shortcut',
+            'ecogvis-live-writer=ecogvis.functions.live_follow:cmd_line_shortcut',
+        ],
     }
 )